@@ -2,19 +2,56 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from threading import Lock, get_native_id
 from typing import Optional
-from app.schemas import TokenData, UserInDB
-from app.database import SessionLocal, get_db
+from app.cache import LRUCache
+from app.schemas import TokenData
+from app.database import SessionRunner, get_read_runner
+from app.metrics import Gauge, registry
 from app.models import User
+import asyncio
+import hashlib
+import logging
 import os
+import sys
+import time
 
 # Security settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Resolved principals are cached per process so most requests skip the users
+# table. Tokens map to their subject until they expire; subjects map to a
+# Principal until the TTL passes or invalidate_principal() is called.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+_token_subjects = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE)
+_principals = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Password hashing. Changing BCRYPT_ROUNDS makes existing hashes "need
+# update", and they are transparently rehashed on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hashing is CPU-bound: fewer workers than cores, at a lower scheduling
+# priority (Linux only; 0 disables), so request threads keep getting the CPU
+# during a login burst and it is the hashing queue that grows instead.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, min(2, (os.cpu_count() or 1) - 1)))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+PASSWORD_HASH_NICE = int(os.getenv("PASSWORD_HASH_NICE", "10"))
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 def verify_password(plain_password: str, hashed_password: str):
@@ -23,6 +60,131 @@ def verify_password(plain_password: str, hashed_password: str):
 def get_password_hash(password: str):
     return pwd_context.hash(password)
 
+class PasswordHasherBusy(Exception):
+    pass
+
+def _lower_thread_priority(nice: int):
+    # On Linux a thread id is a valid PRIO_PROCESS target and only changes
+    # that thread; elsewhere it would name a process, so it is left alone
+    if nice and sys.platform.startswith("linux"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, get_native_id(), nice)
+        except OSError as exc:
+            logger.warning("Could not lower the password hashing thread priority: %s", exc)
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool so hashing never occupies
+    the request threadpool or the event loop. At most `workers` hashes run at
+    once and at most `queue_limit` are admitted; beyond that callers get
+    PasswordHasherBusy instead of queueing without bound."""
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        queue_limit: int = PASSWORD_HASH_QUEUE_LIMIT,
+        nice: int = PASSWORD_HASH_NICE
+    ):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="password-hash",
+            initializer=_lower_thread_priority,
+            initargs=(nice,)
+        )
+        self._lock = Lock()
+        self._admitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._admitted >= self.queue_limit:
+                self._rejected += 1
+                raise PasswordHasherBusy()
+            self._admitted += 1
+        submitted_at = time.perf_counter()
+
+        def task():
+            waited = time.perf_counter() - submitted_at
+            with self._lock:
+                self._queue_wait_total += waited
+                self._queue_wait_max = max(self._queue_wait_max, waited)
+            return fn(*args)
+
+        try:
+            return await asyncio.wrap_future(self._executor.submit(task))
+        finally:
+            with self._lock:
+                self._admitted -= 1
+                self._completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": min(self._admitted, self.workers),
+                "queued": max(self._admitted - self.workers, 0),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "queue_wait_avg_seconds": self._queue_wait_total / self._completed if self._completed else 0.0,
+                "queue_wait_max_seconds": self._queue_wait_max,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+password_hasher = PasswordHasher()
+
+registry.add(Gauge(
+    "password_hash_in_flight", "Password hashes running now.",
+    lambda: password_hasher.stats()["in_flight"]
+))
+registry.add(Gauge(
+    "password_hash_queued", "Password hashes waiting for a worker.",
+    lambda: password_hasher.stats()["queued"]
+))
+registry.add(Gauge(
+    "password_hash_queue_wait_avg_seconds", "Mean time a hash has waited for a worker.",
+    lambda: password_hasher.stats()["queue_wait_avg_seconds"]
+))
+registry.add(Gauge(
+    "password_hash_queue_wait_max_seconds", "Longest time a hash has waited for a worker.",
+    lambda: password_hasher.stats()["queue_wait_max_seconds"]
+))
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    """Return (verified, new_hash); new_hash is set when the stored hash was
+    made with a different cost and should be replaced."""
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by request handlers; an immutable
+    snapshot rather than a live ORM row."""
+    id: int
+    username: str
+    email: str
+    is_active: bool = True
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, username=user.username, email=user.email)
+
+def invalidate_principal(username: Optional[str] = None):
+    """Drop the cached principal for `username`, or every cached principal."""
+    if username is None:
+        _principals.clear()
+        _token_subjects.clear()
+    else:
+        _principals.pop(username)
+
 def get_user(db, username: str):
     return db.query(User).filter(User.username == username).first()
 
@@ -32,6 +194,30 @@ def authenticate_user(db, username: str, password: str):
         return False
     return user
 
+def load_credentials(db, username: str):
+    # Fetch plain column values and end the transaction straight away so no
+    # pooled connection is held while the password is being hashed.
+    row = db.query(User.id, User.username, User.hashed_password).filter(
+        User.username == username
+    ).first()
+    db.rollback()
+    return row
+
+def _store_password_hash(db, user_id: int, hashed_password: str):
+    db.query(User).filter(User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+
+async def authenticate_user_async(db: SessionRunner, username: str, password: str):
+    user = await db.run(load_credentials, username)
+    if not user:
+        return False
+    verified, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not verified:
+        return False
+    if new_hash:
+        await db.run(_store_password_hash, user.id, new_hash)
+    return user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -42,27 +228,53 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
+def _token_subject(token: str) -> Optional[str]:
+    key = hashlib.sha256(token.encode()).hexdigest()
+    subject = _token_subjects.get(key)
+    if subject is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        subject = payload.get("sub")
+        if subject is None:
+            return None
+        ttl = PRINCIPAL_CACHE_TTL_SECONDS
+        if "exp" in payload:
+            # exp is seconds since the epoch; time.time() is too, in any local zone
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            _token_subjects.set(key, subject, ttl=ttl)
+    return subject
+
+def token_subject(token: str) -> Optional[str]:
+    """Subject of a valid token, or None; no database access."""
+    try:
+        return _token_subject(token)
+    except JWTError:
+        return None
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: SessionRunner = Depends(get_read_runner)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        username = _token_subject(token)
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
     
-    user = get_user(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+    principal = _principals.get(token_data.username)
+    if principal is None:
+        user = await db.run(get_user, token_data.username)
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        _principals.set(principal.username, principal)
+    return principal
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
-    if not current_user:
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)):
+    if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
\ No newline at end of file
@@ -0,0 +1,38 @@
+from fastapi import Request, Response
+from typing import Optional
+
+# Past versions of an event never change; clients may keep them for good.
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Calendars change; clients may store responses but must revalidate them.
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+def weak_etag(*parts) -> str:
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+def _tags(header: Optional[str]):
+    return [_opaque(tag.strip()) for tag in (header or "").split(",") if tag.strip()]
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the request's If-None-Match already names `etag` (weak
+    comparison, as RFC 7232 prescribes for If-None-Match)."""
+    tags = _tags(request.headers.get("if-none-match"))
+    return "*" in tags or _opaque(etag) in tags
+
+def if_match_header(request: Request) -> Optional[list]:
+    """Entity tags listed in If-Match, or None when the header is absent."""
+    header = request.headers.get("if-match")
+    return None if header is None else _tags(header)
+
+def set_cache_headers(response: Response, etag: str, cache_control: Optional[str] = None):
+    response.headers["ETag"] = etag
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+
+def not_modified(etag: str, cache_control: Optional[str] = None) -> Response:
+    response = Response(status_code=304)
+    set_cache_headers(response, etag, cache_control)
+    return response
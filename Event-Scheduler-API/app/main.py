@@ -1,8 +1,13 @@
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
-from app.routers import auth, events, sharing, history
-from app.database import engine, Base
+from app.routers import auth, events, sharing, history, notifications
+from app.database import ExportsBusy, engine, Base, dispose_engines
+from app.metrics import MetricsMiddleware, render_metrics
+from app.query_budget import QueryBudgetExceeded
+from app.ratelimit import RateLimitMiddleware
+from app.services.history_recorder import close_history_recorder
 import os
 
 Base.metadata.create_all(bind=engine)
@@ -15,6 +20,10 @@ app = FastAPI(
     redoc_url="/api/redoc",
 )
 
+# Added before CORS so that CORS stays outermost and 429/503 responses still
+# carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # CORS settings
 app.add_middleware(
     CORSMiddleware,
@@ -24,11 +33,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so rejected and CORS preflight requests are measured too
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(events.router, prefix="/api/events", tags=["Events"])
 app.include_router(sharing.router, prefix="/api/events", tags=["Sharing"])
 app.include_router(history.router, prefix="/api/events", tags=["History"])
+app.include_router(notifications.router, prefix="/api/notifications", tags=["Notifications"])
+
+@app.exception_handler(QueryBudgetExceeded)
+async def query_budget_exceeded(request, exc: QueryBudgetExceeded):
+    # Only raised with QUERY_BUDGET_MODE=raise; statements carry no parameters
+    return JSONResponse(status_code=500, content={"detail": str(exc), "statements": exc.statements})
+
+@app.exception_handler(ExportsBusy)
+async def exports_busy(request, exc: ExportsBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many exports in progress, retry shortly"},
+        headers={"Retry-After": "5"},
+    )
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Queued history rows are written before the engines go away
+    await close_history_recorder()
+    await dispose_engines()
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,333 @@
+"""Per-request instrumentation and a Prometheus text endpoint.
+
+MetricsMiddleware opens a RequestStats for every HTTP request in a context
+variable. The engine hooks installed by instrument_engine (see database.py)
+add each SQL statement's count and duration and each commit to it; the
+variable follows the request into threadpool calls and async sessions.
+InstrumentedRoute marks when the endpoint returned, so the time after that,
+spent validating and rendering the response, counts as serialization.
+
+Per route (the path template, such as "GET /api/events/{event_id}") this
+gives request latency, queries per request, DB and serialization time and
+commits, plus a process-wide histogram of statement durations by operation.
+render_metrics() writes them in the Prometheus text format.
+
+With SLOW_REQUEST_MS set, requests slower than that are logged together
+with the SQL they ran (statements only, never parameters), which is how
+hot paths such as repeated permission joins show up.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from app.query_budget import QUERY_BUDGET_MODE, QueryBudget
+import asyncio
+import functools
+import logging
+import os
+import time
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))  # 0 disables the slow log
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+QUERY_DURATION_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+logger = logging.getLogger(__name__)
+
+class RequestStats:
+    def __init__(self, keep_statements: bool = False):
+        self.queries = 0
+        self.commits = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.endpoint_done: Optional[float] = None
+        self.statements: Optional[List[Tuple[float, str]]] = [] if keep_statements else None
+
+    def record_query(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        if self.statements is not None and len(self.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+            self.statements.append((seconds, statement))
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        # Per label set: a count per bucket (non-cumulative), then sum and count
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for labels, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {series[-2]:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {series[-1]}")
+        return lines
+
+class Gauge:
+    """A value read from `collect()` each time the metrics are rendered."""
+
+    def __init__(self, name: str, help: str, collect: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.collect():g}"]
+
+class Registry:
+    """Metric families, updated under one lock from any thread."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = Counter("http_requests_total", "HTTP requests by route and status.", ("route", "status"))
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Time until the last response byte.", LATENCY_BUCKETS, ("route",)
+        )
+        self.db_time = Histogram(
+            "http_request_db_seconds", "Time spent in SQL statements per request.", LATENCY_BUCKETS, ("route",)
+        )
+        self.serialize_time = Histogram(
+            "http_request_serialization_seconds",
+            "Time from the endpoint returning to the response being ready.",
+            LATENCY_BUCKETS,
+            ("route",)
+        )
+        self.queries = Histogram(
+            "http_request_queries", "SQL statements executed per request.", QUERY_COUNT_BUCKETS, ("route",)
+        )
+        self.commits = Counter("http_request_commits_total", "Transactions committed by requests.", ("route",))
+        self.query_time = Histogram(
+            "db_query_duration_seconds",
+            "Duration of every SQL statement, including background work.",
+            QUERY_DURATION_BUCKETS,
+            ("operation",)
+        )
+        self.slow_requests = Counter("http_slow_requests_total", "Requests over SLOW_REQUEST_MS.", ("route",))
+        # Families other modules register, such as the password hasher's gauges
+        self.extra = []
+
+    def add(self, family):
+        with self.lock:
+            self.extra.append(family)
+
+    def families(self):
+        return (
+            self.requests,
+            self.latency,
+            self.db_time,
+            self.serialize_time,
+            self.queries,
+            self.commits,
+            self.query_time,
+            self.slow_requests,
+            *self.extra,
+        )
+
+    def record_request(self, route: str, status: int, seconds: float, stats: RequestStats):
+        with self.lock:
+            self.requests.inc(route, str(status))
+            self.latency.observe(seconds, route)
+            self.db_time.observe(stats.db_seconds, route)
+            self.serialize_time.observe(stats.serialize_seconds, route)
+            self.queries.observe(stats.queries, route)
+            if stats.commits:
+                self.commits.inc(route, amount=stats.commits)
+
+    def record_query(self, operation: str, seconds: float):
+        with self.lock:
+            self.query_time.observe(seconds, operation)
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [line for family in self.families() for line in family.render()]
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def render_metrics() -> str:
+    return registry.render()
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+def instrument_engine(sync_engine):
+    """Count and time every statement and commit on `sync_engine` (for an
+    AsyncEngine, pass its .sync_engine)."""
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, which is dropped if the statement fails
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - context._metrics_started
+        registry.record_query(_operation(statement), seconds)
+        stats = _current.get()
+        if stats is not None:
+            stats.record_query(statement, seconds)
+
+    @event.listens_for(sync_engine, "commit")
+    def _commit(conn):
+        stats = _current.get()
+        if stats is not None:
+            stats.commits += 1
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that notes when the endpoint returns, splitting handler time
+    into the endpoint (dependencies, logic, queries) and serialization. It
+    also enforces the endpoint's query budget, if it declares one."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if METRICS_ENABLED and asyncio.iscoroutinefunction(endpoint):
+            original = endpoint
+
+            @functools.wraps(original)
+            async def endpoint(*args, **kwargs):
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    stats = _current.get()
+                    if stats is not None:
+                        stats.endpoint_done = time.perf_counter()
+
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        budget = getattr(self.endpoint, "query_budget", None)
+        if budget is not None and QUERY_BUDGET_MODE != "off":
+            handler = self._budgeted(handler, budget)
+        if not METRICS_ENABLED:
+            return handler
+
+        async def instrumented_handler(request):
+            response = await handler(request)
+            stats = _current.get()
+            if stats is not None and stats.endpoint_done is not None:
+                stats.serialize_seconds += time.perf_counter() - stats.endpoint_done
+            return response
+
+        return instrumented_handler
+
+    def _budgeted(self, handler, budget: int):
+        name = f"{','.join(sorted(self.methods))} {self.path}"
+
+        async def budgeted_handler(request):
+            with QueryBudget(budget, name):
+                return await handler(request)
+
+        return budgeted_handler
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return f"{scope['method']} {path}" if path else f"{scope['method']} unmatched"
+
+def _log_slow_request(route: str, seconds: float, stats: RequestStats):
+    with registry.lock:
+        registry.slow_requests.inc(route)
+    statements = "".join(
+        f"\n  {duration * 1000:8.2f}ms  {' '.join(statement.split())}"
+        for duration, statement in stats.statements or ()
+    )
+    logger.warning(
+        "Slow request %s: %.1fms, %d queries in %.1fms, serialization %.1fms, %d commits%s",
+        route,
+        seconds * 1000,
+        stats.queries,
+        stats.db_seconds * 1000,
+        stats.serialize_seconds * 1000,
+        stats.commits,
+        statements
+    )
+
+class MetricsMiddleware:
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_seconds = slow_request_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if not METRICS_ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(keep_statements=self.slow_request_seconds > 0)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def measured_send(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Event streams stay open by design; they are never "slow"
+                streaming = any(
+                    key == b"content-type" and value.startswith(b"text/event-stream")
+                    for key, value in message.get("headers") or ()
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, measured_send)
+        finally:
+            _current.reset(token)
+            seconds = time.perf_counter() - started
+            route = route_label(scope)
+            registry.record_request(route, status, seconds, stats)
+            if self.slow_request_seconds and seconds >= self.slow_request_seconds and not streaming:
+                _log_slow_request(route, seconds, stats)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, JSON, Enum, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from enum import Enum as PyEnum
@@ -17,6 +17,7 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    calendar_version = Column(Integer, default=0, nullable=False)  # bumped when any visible event changes
     
     permissions = relationship("EventPermission", back_populates="user")
     changes = relationship("EventChange", back_populates="user")
@@ -35,22 +36,34 @@ class Event(Base):
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, default=0, nullable=False)  # latest EventChange.version
     
     permissions = relationship("EventPermission", back_populates="event")
     changes = relationship("EventChange", back_populates="event")
 
+    __table_args__ = (
+        Index("ix_events_start_time_id", "start_time", "id"),
+        # History outlives its event, so ids must never be handed out again
+        {"sqlite_autoincrement": True},
+    )
+
 class EventPermission(Base):
     __tablename__ = "event_permissions"
     
     id = Column(Integer, primary_key=True, index=True)
-    event_id = Column(Integer, ForeignKey("events.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
+    event_id = Column(Integer, ForeignKey("events.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     role = Column(Enum(UserRole), default=UserRole.VIEWER)
     granted_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="permissions")
     event = relationship("Event", back_populates="permissions")
 
+    __table_args__ = (
+        # One role per user and event; also the conflict target for bulk upserts
+        Index("ix_event_permissions_event_id_user_id", "event_id", "user_id", unique=True),
+    )
+
 class EventChange(Base):
     __tablename__ = "event_changes"
     
@@ -60,7 +73,12 @@ class EventChange(Base):
     version = Column(Integer)
     change_type = Column(String)  # 'create', 'update', 'delete', 'permission_change'
     changes = Column(JSON)  # Stores the diff
+    snapshot = Column(JSON(none_as_null=True), nullable=True)  # Full state, every HISTORY_SNAPSHOT_INTERVAL versions
     changed_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="changes")
-    event = relationship("Event", back_populates="changes")
\ No newline at end of file
+    event = relationship("Event", back_populates="changes")
+
+    __table_args__ = (
+        Index("ix_event_changes_event_id_version", "event_id", "version", unique=True),
+    )
\ No newline at end of file
@@ -0,0 +1,41 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Tuple
+import json
+
+# Cursors are opaque to clients: a urlsafe-base64 JSON object tagged with the
+# listing it belongs to, holding the sort key of the last row returned.
+
+def encode_cursor(kind: str, **key) -> str:
+    payload = json.dumps({"kind": kind, **key}, separators=(",", ":"), default=str)
+    return urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(kind: str, token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(payload, dict) or payload.get("kind") != kind:
+        raise ValueError("Cursor does not belong to this listing")
+    return payload
+
+def encode_event_cursor(start_time: datetime, event_id: int) -> str:
+    return encode_cursor("events", start=start_time.isoformat(), id=event_id)
+
+def decode_event_cursor(token: str) -> Tuple[datetime, int]:
+    payload = decode_cursor("events", token)
+    try:
+        return datetime.fromisoformat(payload["start"]), int(payload["id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Malformed cursor")
+
+def encode_history_cursor(version: int) -> str:
+    return encode_cursor("history", version=version)
+
+def decode_history_cursor(token: str) -> int:
+    payload = decode_cursor("history", token)
+    try:
+        return int(payload["version"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Malformed cursor")
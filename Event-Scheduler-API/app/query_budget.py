@@ -0,0 +1,182 @@
+"""Query budgets: a ceiling on the SQL statements a block or request runs.
+
+    with QueryBudget(3, "load calendar"):
+        ...
+
+    @QueryBudget(3)
+    async def load_calendar(...):
+        ...
+
+Endpoints declare a budget with @route_budget(n), placed under the router
+decorator. InstrumentedRoute (see metrics) then counts every statement the
+request runs, including its dependencies and the response serialization,
+which is where a lazy-loaded relationship read by an orm_mode schema turns
+into one query per row.
+
+QUERY_BUDGET_MODE decides what an overrun does: "warn" (the default) logs
+the statements, "raise" raises QueryBudgetExceeded, which fails the request
+with a 500 (used by tests and the benchmark suite), and "off" disables the
+checks. In "raise" mode a commit over budget is refused, so the failed
+request has written nothing; an overrun noticed only after a commit is
+logged instead, as the request's writes already stand. Statements and
+commits are counted by hooks on the engines (see database.py).
+
+Work whose size is only known inside the request, such as a batch insert
+split into chunks, declares its extra statements with extend_budget().
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.exceptions import HTTPException
+from typing import List, Optional, Tuple
+import asyncio
+import functools
+import logging
+import os
+
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn").lower()  # warn, raise or off
+QUERY_BUDGET_MAX_STATEMENTS = int(os.getenv("QUERY_BUDGET_MAX_STATEMENTS", "50"))
+
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, name: str, budget: int, queries: int, statements: List[str]):
+        super().__init__(f"{name} ran {queries} queries, over its budget of {budget}")
+        self.name = name
+        self.budget = budget
+        self.queries = queries
+        self.statements = statements
+
+class QueryCounter:
+    def __init__(self, budget: Optional["QueryBudget"] = None):
+        self.queries = 0
+        self.commits = 0
+        # Statements allowed on top of the budget by extend_budget()
+        self.extended = 0
+        self.statements: List[str] = []
+        # The budget enforced on this counter, if any
+        self.budget = budget
+
+    def record(self, statement: str):
+        self.queries += 1
+        if len(self.statements) < QUERY_BUDGET_MAX_STATEMENTS:
+            self.statements.append(" ".join(statement.split()))
+
+# Every counter open in the current context; nested blocks all see a statement
+_counters: ContextVar[Tuple[QueryCounter, ...]] = ContextVar("query_counters", default=())
+
+@contextmanager
+def count_queries():
+    """Count the statements run in this block, including threadpool calls
+    made from it, without enforcing anything."""
+    counter = QueryCounter()
+    token = _counters.set(_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+def extend_budget(statements: int):
+    """Let every budget open around this call run `statements` more, for
+    work that grows with the request (one INSERT per chunk, say)."""
+    for counter in _counters.get():
+        counter.extended += statements
+
+def count_engine_queries(sync_engine):
+    """Feed statements and commits on `sync_engine` to the open counters
+    (for an AsyncEngine, pass its .sync_engine)."""
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        for counter in _counters.get():
+            counter.record(statement)
+
+    @event.listens_for(sync_engine, "commit")
+    def _commit(conn):
+        for counter in _counters.get():
+            counter.commits += 1
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    # Raising here leaves the session's transaction open, to be rolled back,
+    # rather than failing a request whose writes already stand
+    for counter in _counters.get():
+        if counter.budget is not None:
+            counter.budget.check_commit()
+
+class QueryBudget:
+    """Context manager and decorator that fails when the block, or each call
+    of the decorated function, runs more than `budget` statements."""
+
+    def __init__(self, budget: int, name: Optional[str] = None, mode: Optional[str] = None):
+        self.budget = budget
+        self.name = name
+        self.mode = mode or QUERY_BUDGET_MODE
+        self.counter: Optional[QueryCounter] = None
+        self._token = None
+
+    def __enter__(self) -> QueryCounter:
+        self.counter = QueryCounter(self)
+        self._token = _counters.set(_counters.get() + (self.counter,))
+        return self.counter
+
+    @property
+    def limit(self) -> int:
+        return self.budget + self.counter.extended
+
+    def _error(self) -> QueryBudgetExceeded:
+        counter = self.counter
+        return QueryBudgetExceeded(self.name or "block", self.limit, counter.queries, counter.statements)
+
+    def check_commit(self):
+        """Called before each commit in the block: in "raise" mode, refuse to
+        commit once over budget."""
+        if self.mode == "raise" and self.counter.queries > self.limit:
+            raise self._error()
+
+    def __exit__(self, exc_type, exc, tb):
+        _counters.reset(self._token)
+        counter = self.counter
+        if counter.queries <= self.limit or self.mode == "off":
+            return False
+        if isinstance(exc, QueryBudgetExceeded) and exc.name == (self.name or "block"):
+            # Already raised by check_commit
+            return False
+        error = self._error()
+        # An HTTP error response is still a response that ran these queries;
+        # anything else is left to propagate as it is. Once the block has
+        # committed, failing it would only hide writes that were made.
+        if (
+            self.mode == "raise"
+            and not counter.commits
+            and (exc_type is None or issubclass(exc_type, HTTPException))
+        ):
+            raise error from exc
+        logger.warning("%s:%s", error, "".join(f"\n  {statement}" for statement in counter.statements))
+        return False
+
+    def __call__(self, func):
+        name = self.name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with QueryBudget(self.budget, name, self.mode):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with QueryBudget(self.budget, name, self.mode):
+                    return func(*args, **kwargs)
+        return wrapper
+
+def route_budget(budget: int):
+    """Declare how many statements one request to the decorated endpoint may
+    run; InstrumentedRoute enforces it."""
+
+    def decorator(endpoint):
+        endpoint.query_budget = budget
+        return endpoint
+
+    return decorator
@@ -0,0 +1,217 @@
+"""Token-bucket rate limiting and adaptive load shedding, as ASGI middleware.
+
+Each client (the JWT subject when a valid bearer token is present, the
+client address otherwise) has a bucket holding up to RATE_LIMIT_BURST
+tokens that refills at RATE_LIMIT_PER_SECOND. A request takes its route's
+cost from the bucket (RATE_LIMIT_COSTS; batch writes and logins cost more)
+or is answered 429 with Retry-After.
+
+Load shedding follows CoDel: if even the fastest request of an interval
+waited longer than SHED_TARGET_MS for its response to start, requests are
+queueing faster than they are served, and new ones get 503 with
+Retry-After until latency recovers.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+from app.auth import token_subject
+import json
+import math
+import os
+import time
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "60"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0").lower() in ("1", "true", "yes")
+
+SHED_ENABLED = os.getenv("SHED_ENABLED", "1").lower() in ("1", "true", "yes")
+SHED_TARGET_MS = float(os.getenv("SHED_TARGET_MS", "500"))
+SHED_INTERVAL_MS = float(os.getenv("SHED_INTERVAL_MS", "1000"))
+SHED_RETRY_AFTER_SECONDS = int(os.getenv("SHED_RETRY_AFTER_SECONDS", "1"))
+
+# "METHOD /path" -> tokens; anything not listed costs 1
+DEFAULT_ROUTE_COSTS = {
+    "POST /api/auth/login": 10,
+    "POST /api/auth/register": 10,
+    "POST /api/events/batch": 20,
+    "PATCH /api/events/batch": 20,
+    "DELETE /api/events/batch": 20,
+    "GET /api/events/export": 20,
+    "POST /api/events/freebusy": 5,
+    "POST /api/events/slots": 5,
+    "POST /api/events/permissions/bulk": 20,
+    "POST /api/events/permissions/bulk/revoke": 20,
+}
+
+# Never limited or shed: health check, metrics and documentation
+EXEMPT_PATHS = ("/", "/metrics", "/api/docs", "/api/redoc", "/openapi.json")
+
+def parse_route_costs(spec: Optional[str]) -> Dict[str, float]:
+    """Parse "POST /api/events/batch=20,GET /api/events/export=5"."""
+    costs = dict(DEFAULT_ROUTE_COSTS)
+    for item in (spec or "").split(","):
+        route, _, cost = item.rpartition("=")
+        if route.strip():
+            costs[" ".join(route.split())] = float(cost)
+    return costs
+
+def validate_rate_limit(rate: float, burst: float, costs: Dict[str, float]):
+    """Raise ValueError for settings that would reject requests forever: a
+    bucket that never refills, or a route costing more than a full bucket."""
+    if rate <= 0:
+        raise ValueError(f"RATE_LIMIT_PER_SECOND must be positive, got {rate:g}")
+    if burst <= 0:
+        raise ValueError(f"RATE_LIMIT_BURST must be positive, got {burst:g}")
+    for route, cost in costs.items():
+        if not 0 <= cost <= burst:
+            raise ValueError(f"RATE_LIMIT_COSTS: {route} costs {cost:g}, outside 0..RATE_LIMIT_BURST ({burst:g})")
+
+RATE_LIMIT_COSTS = parse_route_costs(os.getenv("RATE_LIMIT_COSTS"))
+# Checked on import, so a bad configuration stops the server from starting
+if RATE_LIMIT_ENABLED:
+    validate_rate_limit(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_COSTS)
+
+class RateLimitBackend(ABC):
+    """Storage for token buckets. A shared implementation (for example a
+    Redis script) lets several workers enforce one limit per client."""
+
+    @abstractmethod
+    async def acquire(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """Take `cost` tokens from `key`'s bucket. Returns 0 on success, or
+        the number of seconds until enough tokens will be available."""
+
+class InMemoryBackend(RateLimitBackend):
+    """Per-process buckets. Only touched from the event loop thread, and
+    acquire() never awaits, so each update runs without interruption and
+    needs no lock. Least recently used keys are evicted beyond `max_keys`."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def acquire(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (min(cost, burst) - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+        return wait
+
+class LoadShedder:
+    """CoDel-style overload detector fed with time-to-first-byte samples."""
+
+    def __init__(self, target: float = SHED_TARGET_MS / 1000, interval: float = SHED_INTERVAL_MS / 1000):
+        self.target = target
+        self.interval = interval
+        self.overloaded = False
+        self.shed = 0
+        self._window_start = time.monotonic()
+        self._window_min = None
+
+    def record(self, latency: float):
+        now = time.monotonic()
+        if now - self._window_start >= self.interval:
+            self.overloaded = self._window_min is not None and self._window_min > self.target
+            self._window_start = now
+            self._window_min = latency
+        elif self._window_min is None or latency < self._window_min:
+            self._window_min = latency
+
+    def should_shed(self) -> bool:
+        if self.overloaded and time.monotonic() - self._window_start >= 2 * self.interval:
+            # Nothing finished for two intervals: the backlog has drained
+            self.overloaded = False
+            self._window_min = None
+        return self.overloaded
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or ():
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def client_key(scope) -> str:
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization[:7].lower() == "bearer ":
+        subject = token_subject(authorization[7:].strip())
+        if subject:
+            return f"user:{subject}"
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded:
+            return "ip:" + forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app,
+        backend: Optional[RateLimitBackend] = None,
+        rate: float = RATE_LIMIT_PER_SECOND,
+        burst: float = RATE_LIMIT_BURST,
+        costs: Optional[Dict[str, float]] = None,
+        shedder: Optional[LoadShedder] = None,
+        rate_limit: bool = RATE_LIMIT_ENABLED,
+        shed: bool = SHED_ENABLED
+    ):
+        self.app = app
+        self.backend = backend or InMemoryBackend()
+        self.rate = rate
+        self.burst = burst
+        self.costs = RATE_LIMIT_COSTS if costs is None else costs
+        self.shedder = shedder or LoadShedder()
+        self.rate_limit = rate_limit
+        self.shed = shed
+        if rate_limit:
+            validate_rate_limit(rate, burst, self.costs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limit:
+            cost = self.costs.get(f"{scope['method']} {scope['path'].rstrip('/') or '/'}", 1)
+            wait = await self.backend.acquire(client_key(scope), cost, self.rate, self.burst)
+            if wait:
+                await _reject(send, 429, "Rate limit exceeded", wait)
+                return
+
+        if not self.shed:
+            await self.app(scope, receive, send)
+            return
+
+        if self.shedder.should_shed():
+            self.shedder.shed += 1
+            await _reject(send, 503, "Server overloaded, retry later", SHED_RETRY_AFTER_SECONDS)
+            return
+
+        started = time.monotonic()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                self.shedder.record(time.monotonic() - started)
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
@@ -3,41 +3,67 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from app.schemas import Token, UserCreate, UserInDB
-from app.database import get_db
+from app.database import SessionRunner, get_runner
 from app.auth import (
+    PasswordHasherBusy,
+    Principal,
     get_current_active_user,
-    authenticate_user,
+    load_credentials,
+    authenticate_user_async,
     create_access_token,
-    get_password_hash,
-    get_user
+    hash_password_async,
+    invalidate_principal
 )
+from app.metrics import InstrumentedRoute
+from app.query_budget import route_budget
 from app.models import User
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+def _hasher_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent password operations, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+def _save_user(db: Session, db_user: User):
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
 
 @router.post("/register", response_model=UserInDB)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user(db, username=user.username)
+@route_budget(3)
+async def register_user(user: UserCreate, db: SessionRunner = Depends(get_runner)):
+    db_user = await db.run(load_credentials, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await hash_password_async(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     db_user = User(
         username=user.username,
         email=user.email,
         hashed_password=hashed_password
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    db_user = await db.run(_save_user, db_user)
+    invalidate_principal(db_user.username)
     return db_user
 
 @router.post("/login", response_model=Token)
-def login_for_access_token(
+# Loading the credentials, plus rewriting the hash when BCRYPT_ROUNDS changed
+@route_budget(2)
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: SessionRunner = Depends(get_runner)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    try:
+        user = await authenticate_user_async(db, form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -51,7 +77,8 @@ def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/refresh", response_model=Token)
-def refresh_token(current_user: UserInDB = Depends(get_current_active_user)):
+@route_budget(1)
+async def refresh_token(current_user: Principal = Depends(get_current_active_user)):
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
         data={"sub": current_user.username}, expires_delta=access_token_expires
@@ -59,6 +86,7 @@ def refresh_token(current_user: UserInDB = Depends(get_current_active_user)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/logout")
-def logout():
+@route_budget(0)
+async def logout():
     # In a real implementation, you would add the token to a blacklist
     return {"message": "Successfully logged out"}
\ No newline at end of file
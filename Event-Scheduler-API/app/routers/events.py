@@ -1,109 +1,370 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
-from app.schemas import EventCreate, EventUpdate, EventOut, BatchEventCreate
-from app.database import get_db
-from app.auth import get_current_active_user
-from app.models import User, Event, EventPermission  # Add these imports
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Union
+from datetime import datetime, timedelta
+from app.schemas import (
+    EventCreate,
+    EventUpdate,
+    EventOut,
+    BatchEventCreate,
+    BatchEventDelete,
+    BatchEventDeleteResult,
+    BatchEventResult,
+    BatchEventUpdate,
+    BatchEventUpdateResult,
+    FreeBusyOut,
+    FreeBusyRequest,
+    SlotRequest,
+    SlotsOut,
+    to_naive_utc
+)
+from app.database import SessionRunner, get_read_runner, get_runner, stream_partitions
+from app.auth import Principal, get_current_active_user
+from app.metrics import InstrumentedRoute
+from app.query_budget import route_budget
+from app.fast_json import list_response
+from app.http_cache import (
+    REVALIDATE_CACHE_CONTROL,
+    etag_matches,
+    if_match_header,
+    not_modified,
+    set_cache_headers,
+    weak_etag
+)
 from app.services.event_service import (
     create_event,
-    get_events,
+    get_events_page,
     get_event,
+    get_event_version,
+    get_calendar_version,
     update_event,
     delete_event,
-    create_batch_events,
     check_event_conflict,
-    has_permission,  # Add this if missing
-    record_change  # Add this if missing
+    StaleVersionError
+)
+from app.services.acl import AccessResolver, get_access, role_allows
+from app.services.availability import FREEBUSY_MAX_DAYS, FREEBUSY_MAX_USERS, get_free_busy
+from app.services.batch_service import bulk_create_events, bulk_delete_events, bulk_update_events
+from app.services.scheduling import find_meeting_slots
+from app.services.export_service import (
+    EXPORT_PARTITION_SIZE,
+    NDJSON_MEDIA_TYPE,
+    calendar_export_query,
+    ndjson_stream
 )
-from app.database import get_db
-from app.auth import get_current_active_user
-from app.models import User, Event
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+def event_etag(event_id: int, version: int) -> str:
+    return weak_etag("event", event_id, version)
+
+def calendar_etag(user_id: int, calendar_version: int) -> str:
+    return weak_etag("calendar", user_id, calendar_version)
+
+def _expected_versions(tags: Optional[list], event_id: int) -> Optional[List[int]]:
+    # Versions named by an If-Match header; None means "any" (no header or *)
+    if tags is None or "*" in tags:
+        return None
+    prefix = f'"event-{event_id}-'
+    versions = []
+    for tag in tags:
+        if tag.startswith(prefix) and tag.endswith('"') and tag[len(prefix):-1].isdigit():
+            versions.append(int(tag[len(prefix):-1]))
+    return versions
+
+# Status for an atomic batch that failed on items of a single kind
+BATCH_ERROR_STATUS = {
+    "not_found": status.HTTP_404_NOT_FOUND,
+    "forbidden": status.HTTP_403_FORBIDDEN,
+    "conflict": status.HTTP_409_CONFLICT,
+    "stale": status.HTTP_412_PRECONDITION_FAILED,
+}
+
+def _batch_error(errors: List[dict]) -> HTTPException:
+    codes = {error["code"] for error in errors}
+    return HTTPException(
+        status_code=BATCH_ERROR_STATUS.get(codes.pop(), 422) if len(codes) == 1 else 422,
+        detail=errors
+    )
 
 @router.post("/", response_model=EventOut)
-def create_new_event(
+@route_budget(8)
+async def create_new_event(
     event: EventCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    # Check for conflicts
-    if check_event_conflict(db, current_user.id, event.start_time, event.end_time):
+    # Check for conflicts, across every occurrence of a recurring event
+    pattern = event.recurrence_pattern if event.is_recurring else None
+    if await db.run(check_event_conflict, current_user.id, event.start_time, event.end_time, pattern):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Event conflicts with existing events"
         )
-    return create_event(db=db, event=event, user_id=current_user.id)
+    return await db.run(create_event, event=event, user_id=current_user.id)
 
 @router.get("/", response_model=List[EventOut])
-def list_events(
+@route_budget(4)
+async def list_events(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     start_date: datetime = None,
     end_date: datetime = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # Read the counter before the page, so a concurrent change can only make
+    # the ETag older than the data, never newer.
+    etag = calendar_etag(current_user.id, await db.run(get_calendar_version, current_user.id))
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+    
+    try:
+        events, next_cursor = await db.run(
+            get_events_page,
+            user_id=current_user.id,
+            limit=limit,
+            cursor=cursor,
+            skip=0 if cursor else skip,
+            start_date=to_naive_utc(start_date),
+            end_date=to_naive_utc(end_date)
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    set_cache_headers(response, etag, REVALIDATE_CACHE_CONTROL)
+    return list_response(events, EventOut, response)
+
+# Declared before /{event_id} so "export" is not parsed as an event id
+@router.get("/export", response_class=StreamingResponse)
+@route_budget(2)
+async def export_events(
+    start_date: datetime = None,
+    end_date: datetime = None,
+    updated_since: datetime = None,
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # One EventOut object per line, streamed with a server-side cursor
+    query = calendar_export_query(
+        current_user.id, to_naive_utc(start_date), to_naive_utc(end_date), to_naive_utc(updated_since)
+    )
+    return StreamingResponse(
+        ndjson_stream(stream_partitions(query, EXPORT_PARTITION_SIZE)),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
+# Batch edits are declared before /{event_id} for the same reason
+@router.patch("/batch", response_model=BatchEventUpdateResult)
+@route_budget(9)
+async def update_multiple_events(
+    batch: BatchEventUpdate,
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
+):
+    # One ACL lookup for the whole set, then one transaction for the writes
+    roles = await access.roles({item.id for item in batch.events})
+    updated, errors = await db.run(
+        bulk_update_events,
+        updates=batch.events,
+        user_id=current_user.id,
+        roles=roles,
+        mode=batch.mode,
+        check_conflicts=batch.check_conflicts
+    )
+    if errors and batch.mode == "atomic":
+        raise _batch_error(errors)
+    return {"updated": updated, "errors": errors}
+
+@router.delete("/batch", response_model=BatchEventDeleteResult)
+@route_budget(8)
+async def delete_multiple_events(
+    batch: BatchEventDelete,
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
-    return get_events(
-        db=db,
+    roles = await access.roles(set(batch.event_ids))
+    deleted, errors = await db.run(
+        bulk_delete_events,
+        event_ids=batch.event_ids,
         user_id=current_user.id,
-        skip=skip,
-        limit=limit,
-        start_date=start_date,
-        end_date=end_date
+        roles=roles,
+        mode=batch.mode
     )
+    if errors and batch.mode == "atomic":
+        raise _batch_error(errors)
+    return {"deleted": deleted, "errors": errors}
 
 @router.get("/{event_id}", response_model=EventOut)
-def read_event(
+@route_budget(4)
+async def read_event(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    response: Response,
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
-    event = get_event(db, event_id=event_id, user_id=current_user.id)
+    # Revalidation only needs the access check and the version column
+    if request.headers.get("if-none-match") and await access.role(event_id) is not None:
+        version = await db.run(get_event_version, event_id)
+        if version is not None and etag_matches(request, event_etag(event_id, version)):
+            return not_modified(event_etag(event_id, version), REVALIDATE_CACHE_CONTROL)
+    
+    event = await db.run(get_event, event_id=event_id, user_id=current_user.id)
     if event is None:
         raise HTTPException(status_code=404, detail="Event not found")
+    set_cache_headers(response, event_etag(event.id, event.version), REVALIDATE_CACHE_CONTROL)
     return event
 
 @router.put("/{event_id}", response_model=EventOut)
-def update_existing_event(
+@route_budget(8)
+async def update_existing_event(
     event_id: int,
     event: EventUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    response: Response,
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
-    db_event = get_event(db, event_id=event_id, user_id=current_user.id)
-    if db_event is None:
+    role = await access.role(event_id)
+    if role is None:
         raise HTTPException(status_code=404, detail="Event not found")
     
     # Check permissions
-    if not has_permission(db, current_user.id, event_id, "editor"):
+    if not role_allows(role, "editor"):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    return update_event(db=db, event_id=event_id, event=event, user_id=current_user.id)
+    try:
+        db_event = await db.run(
+            update_event,
+            event_id=event_id,
+            event=event,
+            user_id=current_user.id,
+            expected_versions=_expected_versions(if_match_header(request), event_id)
+        )
+    except StaleVersionError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Event has been modified since it was read"
+        )
+    if db_event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    set_cache_headers(response, event_etag(db_event.id, db_event.version))
+    return db_event
 
 @router.delete("/{event_id}")
-def delete_existing_event(
+@route_budget(9)
+async def delete_existing_event(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
-    db_event = get_event(db, event_id=event_id, user_id=current_user.id)
-    if db_event is None:
+    role = await access.role(event_id)
+    if role is None:
         raise HTTPException(status_code=404, detail="Event not found")
     
     # Only owner can delete
-    if not has_permission(db, current_user.id, event_id, "owner"):
+    if not role_allows(role, "owner"):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    delete_event(db=db, event_id=event_id, user_id=current_user.id)
+    await db.run(delete_event, event_id=event_id, user_id=current_user.id)
     return {"message": "Event deleted successfully"}
 
-@router.post("/batch", response_model=List[EventOut])
-def create_multiple_events(
+@router.post("/batch", response_model=Union[List[EventOut], BatchEventResult])
+# Plus the INSERTs of each chunk, which bulk_create_events adds as it goes
+@route_budget(3)
+async def create_multiple_events(
     events: BatchEventCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    created, errors = await db.run(
+        bulk_create_events,
+        events=events.events,
+        user_id=current_user.id,
+        mode=events.mode,
+        chunk_size=events.chunk_size,
+        check_conflicts=events.check_conflicts
+    )
+    if events.mode == "partial":
+        return {"created": created, "errors": errors}
+    if errors:
+        conflict_only = all(error["code"] == "conflict" for error in errors)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT if conflict_only else 422,
+            detail=errors
+        )
+    return created
+
+@router.post("/freebusy", response_model=FreeBusyOut)
+@route_budget(3)
+async def free_busy(
+    query: FreeBusyRequest,
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    return create_batch_events(db=db, events=events.events, user_id=current_user.id)
\ No newline at end of file
+    user_ids = list(dict.fromkeys(query.user_ids))
+    if len(user_ids) > FREEBUSY_MAX_USERS:
+        raise HTTPException(status_code=422, detail=f"At most {FREEBUSY_MAX_USERS} users per request")
+    if (query.end - query.start).days >= FREEBUSY_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=f"Window must be shorter than {FREEBUSY_MAX_DAYS} days")
+    
+    busy, hidden = await db.run(get_free_busy, current_user.id, user_ids, query.start, query.end)
+    if hidden:
+        raise HTTPException(
+            status_code=403,
+            detail=f"No shared events with users: {', '.join(map(str, hidden))}"
+        )
+    return {
+        "start": query.start,
+        "end": query.end,
+        "users": [
+            {"user_id": user_id, "busy": [{"start": start, "end": end} for start, end in busy[user_id]]}
+            for user_id in user_ids
+        ]
+    }
+
+@router.post("/slots", response_model=SlotsOut)
+@route_budget(3)
+async def meeting_slots(
+    query: SlotRequest,
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # Earliest times when every participant is free within working hours
+    user_ids = list(dict.fromkeys(query.user_ids))
+    if len(user_ids) > FREEBUSY_MAX_USERS:
+        raise HTTPException(status_code=422, detail=f"At most {FREEBUSY_MAX_USERS} users per request")
+    if (query.end - query.start).days >= FREEBUSY_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=f"Window must be shorter than {FREEBUSY_MAX_DAYS} days")
+
+    slots, hidden = await db.run(
+        find_meeting_slots,
+        current_user.id,
+        user_ids,
+        query.start,
+        query.end,
+        timedelta(minutes=query.duration_minutes),
+        query.limit,
+        timedelta(minutes=query.granularity_minutes),
+        query.work_start,
+        query.work_end,
+        query.weekdays
+    )
+    if hidden:
+        raise HTTPException(
+            status_code=403,
+            detail=f"No shared events with users: {', '.join(map(str, hidden))}"
+        )
+    return {
+        "duration_minutes": query.duration_minutes,
+        "slots": [{"start": start, "end": end} for start, end in slots]
+    }
\ No newline at end of file
@@ -1,154 +1,147 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.schemas import ChangeOut, DiffOut
-from app.database import get_db
-from app.auth import get_current_active_user
-from app.models import User, EventChange, Event, EventPermission  # Add User and EventPermission here
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.schemas import ChangeOut, DiffOut, VersionOut
+from app.database import SessionRunner, get_read_runner, get_runner, stream_partitions
+from app.auth import Principal, get_current_active_user
+from app.metrics import InstrumentedRoute
+from app.query_budget import route_budget
+from app.fast_json import list_response
+from app.http_cache import IMMUTABLE_CACHE_CONTROL, etag_matches, not_modified, set_cache_headers
+from app.services.acl import AccessResolver, get_access
+from app.services.history_recorder import flush_history
+from app.services.export_service import (
+    EXPORT_PARTITION_SIZE,
+    NDJSON_MEDIA_TYPE,
+    history_export_query,
+    ndjson_stream
+)
+from app.services.history_service import (
+    diff_etag,
+    diff_versions,
+    get_changes_page,
+    get_version,
+    rollback_event,
+    version_etag
+)
+from typing import List, Optional
 
-router = APIRouter()
-
-# ... rest of your history.py code remains the same ...
+router = APIRouter(route_class=InstrumentedRoute)
 
 @router.get("/{event_id}/history", response_model=List[ChangeOut])
-def get_event_history(
+@route_budget(3)
+async def get_event_history(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
     # Check if user has permission to view the event
-    event = db.query(Event).join(Event.permissions).filter(
-        Event.id == event_id,
-        EventPermission.user_id == current_user.id
-    ).first()
+    if await access.role(event_id) is None:
+        raise HTTPException(status_code=404, detail="Event not found or no access")
     
-    if not event:
+    await flush_history()
+    try:
+        changes, next_cursor = await db.run(get_changes_page, event_id, limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return list_response(changes, ChangeOut, response)
+
+# Declared before /history/{version_id} so "export" is not parsed as a version
+@router.get("/{event_id}/history/export", response_class=StreamingResponse)
+@route_budget(3)
+async def export_event_history(
+    event_id: int,
+    since_version: Optional[int] = Query(None, ge=0),
+    until_version: Optional[int] = Query(None, ge=1),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
+):
+    # Check if user has permission to view the event
+    if await access.role(event_id) is None:
         raise HTTPException(status_code=404, detail="Event not found or no access")
     
-    return db.query(EventChange).filter(
-        EventChange.event_id == event_id
-    ).order_by(EventChange.version).all()
+    # One ChangeOut object per line, streamed with a server-side cursor
+    await flush_history()
+    query = history_export_query(event_id, since_version, until_version)
+    return StreamingResponse(
+        ndjson_stream(stream_partitions(query, EXPORT_PARTITION_SIZE)),
+        media_type=NDJSON_MEDIA_TYPE
+    )
 
-@router.get("/{event_id}/history/{version_id}", response_model=ChangeOut)
-def get_event_version(
+@router.get("/{event_id}/history/{version_id}", response_model=VersionOut)
+@route_budget(4)
+async def get_event_version(
     event_id: int,
     version_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    response: Response,
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
     # Check if user has permission to view the event
-    event = db.query(Event).join(Event.permissions).filter(
-        Event.id == event_id,
-        EventPermission.user_id == current_user.id
-    ).first()
-    
-    if not event:
+    if await access.role(event_id) is None:
         raise HTTPException(status_code=404, detail="Event not found or no access")
     
-    change = db.query(EventChange).filter(
-        EventChange.event_id == event_id,
-        EventChange.version == version_id
-    ).first()
+    etag = version_etag(event_id, version_id)
+    if etag_matches(request, etag):
+        return not_modified(etag, IMMUTABLE_CACHE_CONTROL)
     
+    await flush_history()
+    change, state = await db.run(get_version, event_id, version_id)
     if not change:
         raise HTTPException(status_code=404, detail="Version not found")
     
-    return change
+    set_cache_headers(response, etag, IMMUTABLE_CACHE_CONTROL)
+    return VersionOut(**ChangeOut.from_orm(change).dict(), state=state)
 
 @router.post("/{event_id}/rollback/{version_id}", response_model=ChangeOut)
-def rollback_event_version(
+@route_budget(9)
+async def rollback_event_version(
     event_id: int,
     version_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
     # Check if user has permission to edit the event
-    event = db.query(Event).join(Event.permissions).filter(
-        Event.id == event_id,
-        EventPermission.user_id == current_user.id,
-        EventPermission.role.in_(["owner", "editor"])
-    ).first()
-    
-    if not event:
+    if not await access.allows(event_id, "editor"):
         raise HTTPException(status_code=404, detail="Event not found or no edit access")
     
-    target_change = db.query(EventChange).filter(
-        EventChange.event_id == event_id,
-        EventChange.version == version_id
-    ).first()
-    
-    if not target_change:
+    await flush_history()
+    rollback_change = await db.run(rollback_event, event_id, version_id, current_user.id)
+    if not rollback_change:
         raise HTTPException(status_code=404, detail="Version not found")
-    
-    # Create a new change record for the rollback
-    rollback_change = EventChange(
-        event_id=event_id,
-        user_id=current_user.id,
-        version=None,  # Will be auto-incremented
-        change_type="rollback",
-        changes={
-            "rolled_back_from": target_change.version,
-            "changes": target_change.changes
-        }
-    )
-    db.add(rollback_change)
-    
-    # Apply the changes from the target version
-    for field, values in target_change.changes.items():
-        if field in ["old", "new"]:  # Handle diff format
-            for subfield, subvalue in values.items():
-                setattr(event, subfield, subvalue)
-        else:
-            setattr(event, field, values["new"] if "new" in values else values)
-    
-    db.commit()
-    db.refresh(rollback_change)
     return rollback_change
 
 @router.get("/{event_id}/diff/{version_id1}/{version_id2}", response_model=DiffOut)
-def get_diff_between_versions(
+@route_budget(3)
+async def get_diff_between_versions(
     event_id: int,
     version_id1: int,
     version_id2: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    response: Response,
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
     # Check if user has permission to view the event
-    event = db.query(Event).join(Event.permissions).filter(
-        Event.id == event_id,
-        EventPermission.user_id == current_user.id
-    ).first()
-    
-    if not event:
+    if await access.role(event_id) is None:
         raise HTTPException(status_code=404, detail="Event not found or no access")
     
-    version1 = db.query(EventChange).filter(
-        EventChange.event_id == event_id,
-        EventChange.version == version_id1
-    ).first()
+    etag = diff_etag(event_id, version_id1, version_id2)
+    if etag_matches(request, etag):
+        return not_modified(etag, IMMUTABLE_CACHE_CONTROL)
     
-    version2 = db.query(EventChange).filter(
-        EventChange.event_id == event_id,
-        EventChange.version == version_id2
-    ).first()
-    
-    if not version1 or not version2:
+    await flush_history()
+    diff = await db.run(diff_versions, event_id, version_id1, version_id2)
+    if diff is None:
         raise HTTPException(status_code=404, detail="One or both versions not found")
-    
-    # Simple diff implementation - in a real app you might want a more sophisticated diff
-    diff = {}
-    changes1 = version1.changes
-    changes2 = version2.changes
-    
-    all_keys = set(changes1.keys()).union(set(changes2.keys()))
-    for key in all_keys:
-        val1 = changes1.get(key, {}).get("new") if isinstance(changes1.get(key), dict) else changes1.get(key)
-        val2 = changes2.get(key, {}).get("new") if isinstance(changes2.get(key), dict) else changes2.get(key)
-        if val1 != val2:
-            diff[key] = {"version1": val1, "version2": val2}
-    
-    return {
-        "version1": version_id1,
-        "version2": version_id2,
-        "differences": diff
-    }
\ No newline at end of file
+    set_cache_headers(response, etag, IMMUTABLE_CACHE_CONTROL)
+    return diff
\ No newline at end of file
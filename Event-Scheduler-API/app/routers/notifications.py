@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from app.database import SessionRunner, get_read_runner
+from app.auth import Principal, get_current_active_user, get_current_user
+from app.metrics import InstrumentedRoute
+from app.query_budget import route_budget
+from app.services.notifications import (
+    NOTIFY_KEEPALIVE_SECONDS,
+    get_broker,
+    user_channel
+)
+import asyncio
+import json
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+async def _sse_stream(request: Request, broker, subscription):
+    try:
+        yield ": connected\n\n"
+        while not await request.is_disconnected():
+            try:
+                batch = await asyncio.wait_for(subscription.next_batch(), NOTIFY_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield "".join(
+                f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+                for message in batch
+            )
+    finally:
+        broker.unsubscribe(subscription)
+
+@router.get("/stream", response_class=StreamingResponse)
+@route_budget(1)
+async def stream_notifications(
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # Server-sent events for every change to events the user can access
+    broker = get_broker()
+    subscription = broker.subscribe(user_channel(current_user.id))
+    return StreamingResponse(
+        _sse_stream(request, broker, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def notifications_socket(
+    websocket: WebSocket,
+    token: str = Query(...),
+    db: SessionRunner = Depends(get_read_runner)
+):
+    # Browsers cannot set headers on WebSocket requests, so the access token
+    # comes in the query string
+    try:
+        current_user = await get_current_user(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if not current_user.is_active:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    broker = get_broker()
+    subscription = broker.subscribe(user_channel(current_user.id))
+
+    async def pump():
+        while True:
+            for message in await subscription.next_batch():
+                await websocket.send_json(message)
+
+    sender = asyncio.create_task(pump())
+    try:
+        # Client messages are ignored; receiving is how a disconnect shows up
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        broker.unsubscribe(subscription)
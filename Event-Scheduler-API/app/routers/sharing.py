@@ -1,119 +1,130 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.schemas import PermissionCreate, PermissionOut
-from app.database import get_db
-from app.auth import get_current_active_user
-from app.models import User, EventPermission, Event  # Make sure these are imported
+from fastapi import APIRouter, Depends, HTTPException, Response
+from app.schemas import BulkPermissionSummary, BulkRevoke, BulkShare, PermissionCreate, PermissionOut
+from app.database import SessionRunner, get_read_runner, get_runner
+from app.auth import Principal, get_current_active_user
+from app.metrics import InstrumentedRoute
+from app.query_budget import route_budget
+from app.fast_json import list_response
+from app.services import sharing_service
+from app.services.acl import AccessResolver, get_access, role_allows
 from typing import List
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
-def has_permission(db: Session, user_id: int, event_id: int, required_role: str):
-    permission = db.query(EventPermission).filter(
-        EventPermission.user_id == user_id,
-        EventPermission.event_id == event_id
-    ).first()
-    
-    if not permission:
-        return False
-    
-    role_hierarchy = {"viewer": 0, "editor": 1, "owner": 2}
-    return role_hierarchy[permission.role] >= role_hierarchy[required_role]
+async def _check_bulk_request(request: BulkRevoke, access: AccessResolver):
+    # Owner rights on every event, resolved with one IN query
+    pairs = len(set(request.event_ids)) * len(set(request.user_ids))
+    if pairs > sharing_service.BULK_SHARE_MAX_PAIRS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {sharing_service.BULK_SHARE_MAX_PAIRS} event/user pairs per request"
+        )
+    roles = await access.roles(set(request.event_ids))
+    denied = sorted(event_id for event_id, role in roles.items() if not role_allows(role, "owner"))
+    if denied:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Not enough permissions on events: {', '.join(map(str, denied))}"
+        )
+
+@router.post("/permissions/bulk", response_model=BulkPermissionSummary)
+@route_budget(8)
+async def bulk_share(
+    request: BulkShare,
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
+):
+    # Grant one role to many users on many events in a single transaction
+    await _check_bulk_request(request, access)
+    try:
+        return await db.run(sharing_service.bulk_share, request.event_ids, request.user_ids, request.role)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+@router.post("/permissions/bulk/revoke", response_model=BulkPermissionSummary)
+@route_budget(5)
+async def bulk_revoke(
+    request: BulkRevoke,
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
+):
+    await _check_bulk_request(request, access)
+    if current_user.id in request.user_ids:
+        raise HTTPException(status_code=400, detail="Cannot remove your own owner permissions")
+
+    return await db.run(sharing_service.bulk_revoke, request.event_ids, request.user_ids)
 
 @router.post("/{event_id}/share", response_model=PermissionOut)
-def share_event(
+@route_budget(8)
+async def share_event(
     event_id: int,
     permission: PermissionCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
     # Check if current user has owner rights
-    if not has_permission(db, current_user.id, event_id, "owner"):
+    if not await access.allows(event_id, "owner"):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    # Check if event exists
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    # Check if user exists
-    user = db.query(User).filter(User.id == permission.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if permission already exists
-    existing = db.query(EventPermission).filter(
-        EventPermission.event_id == event_id,
-        EventPermission.user_id == permission.user_id
-    ).first()
-    
-    if existing:
-        existing.role = permission.role
-    else:
-        existing = EventPermission(
-            event_id=event_id,
-            user_id=permission.user_id,
-            role=permission.role
+    try:
+        return await db.run(
+            sharing_service.share_event, event_id, permission.user_id, permission.role
         )
-        db.add(existing)
-    
-    db.commit()
-    db.refresh(existing)
-    return existing
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
 
 @router.get("/{event_id}/permissions", response_model=List[PermissionOut])
-def list_permissions(
+@route_budget(3)
+async def list_permissions(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    response: Response,
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
-    if not has_permission(db, current_user.id, event_id, "viewer"):
+    if not await access.allows(event_id, "viewer"):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    return db.query(EventPermission).filter(
-        EventPermission.event_id == event_id
-    ).all()
+    permissions = await db.run(sharing_service.list_permissions, event_id)
+    return list_response(permissions, PermissionOut, response)
 
 @router.put("/{event_id}/permissions/{user_id}", response_model=PermissionOut)
-def update_permission(
+@route_budget(6)
+async def update_permission(
     event_id: int,
     user_id: int,
     permission: PermissionCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
-    if not has_permission(db, current_user.id, event_id, "owner"):
+    if not await access.allows(event_id, "owner"):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    db_permission = db.query(EventPermission).filter(
-        EventPermission.event_id == event_id,
-        EventPermission.user_id == user_id
-    ).first()
-    
+    db_permission = await db.run(
+        sharing_service.update_permission, event_id, user_id, permission.role
+    )
     if not db_permission:
         raise HTTPException(status_code=404, detail="Permission not found")
-    
-    db_permission.role = permission.role
-    db.commit()
-    db.refresh(db_permission)
     return db_permission
 
 @router.delete("/{event_id}/permissions/{user_id}")
-def remove_permission(
+@route_budget(5)
+async def remove_permission(
     event_id: int,
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: SessionRunner = Depends(get_runner),
+    current_user: Principal = Depends(get_current_active_user),
+    access: AccessResolver = Depends(get_access)
 ):
-    if not has_permission(db, current_user.id, event_id, "owner"):
+    if not await access.allows(event_id, "owner"):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot remove your own owner permissions")
     
-    db.query(EventPermission).filter(
-        EventPermission.event_id == event_id,
-        EventPermission.user_id == user_id
-    ).delete()
-    db.commit()
+    await db.run(sharing_service.remove_permission, event_id, user_id)
     return {"message": "Permission removed"}
\ No newline at end of file
@@ -1,6 +1,13 @@
-from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, EmailStr
+from datetime import datetime, time, timezone
+from typing import List, Literal, Optional
+from dateutil.parser import isoparse
+from pydantic import BaseModel, EmailStr, Field, validator
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Times are stored as naive UTC; convert an aware datetime to that."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 # Token schemas
 class Token(BaseModel):
@@ -20,23 +27,64 @@ class UserCreate(UserBase):
 
 class UserInDB(UserBase):
     id: int
-    is_active: bool
+    is_active: bool = True
 
     class Config:
         orm_mode = True
 
 # Event schemas
+RECURRENCE_FREQUENCIES = ("daily", "weekly", "monthly")
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate_recurrence_pattern(pattern: Optional[dict]) -> Optional[dict]:
+    """Return `pattern` if it can be expanded, otherwise raise ValueError."""
+    if pattern is None:
+        return None
+    if not isinstance(pattern, dict):
+        raise ValueError("recurrence_pattern must be an object")
+    if pattern.get("frequency", pattern.get("freq")) not in RECURRENCE_FREQUENCIES:
+        raise ValueError(f"frequency must be one of: {', '.join(RECURRENCE_FREQUENCIES)}")
+    interval = pattern.get("interval")
+    if interval is not None and not (_is_int(interval) and interval > 0):
+        raise ValueError("interval must be a positive integer")
+    count = pattern.get("count")
+    if count is not None and not (_is_int(count) and count > 0):
+        raise ValueError("count must be a positive integer")
+    weekdays = pattern.get("weekdays")
+    if weekdays is not None and not (
+        isinstance(weekdays, list) and weekdays and all(_is_int(day) and 0 <= day <= 6 for day in weekdays)
+    ):
+        raise ValueError("weekdays must be a non-empty list of integers from 0 (Monday) to 6")
+    exceptions = pattern.get("exceptions")
+    if exceptions is not None and not isinstance(exceptions, list):
+        raise ValueError("exceptions must be a list of ISO 8601 datetimes")
+    for name, values in (("until", [pattern.get("until")]), ("exceptions", exceptions or [])):
+        for value in values:
+            if value is None:
+                continue
+            try:
+                isoparse(value)
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"{name} must be an ISO 8601 datetime")
+    return pattern
+
 class EventBase(BaseModel):
     title: str
     description: str
     start_time: datetime
     end_time: datetime
 
+    _utc_times = validator("start_time", "end_time", allow_reuse=True)(to_naive_utc)
+
 class EventCreate(EventBase):
     location: Optional[str] = None
     is_recurring: bool = False
     recurrence_pattern: Optional[dict] = None
 
+    _valid_recurrence = validator("recurrence_pattern", allow_reuse=True)(validate_recurrence_pattern)
+
 class EventUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -46,6 +94,9 @@ class EventUpdate(BaseModel):
     is_recurring: Optional[bool] = None
     recurrence_pattern: Optional[dict] = None
 
+    _utc_times = validator("start_time", "end_time", allow_reuse=True)(to_naive_utc)
+    _valid_recurrence = validator("recurrence_pattern", allow_reuse=True)(validate_recurrence_pattern)
+
 class EventOut(EventBase):
     id: int
     location: Optional[str]
@@ -60,6 +111,96 @@ class EventOut(EventBase):
 
 class BatchEventCreate(BaseModel):
     events: List[EventCreate]
+    mode: Literal["atomic", "partial"] = "atomic"
+    chunk_size: int = Field(500, ge=1, le=5000)
+    check_conflicts: bool = True
+
+class BatchItemError(BaseModel):
+    index: int
+    code: str
+    detail: str
+
+class BatchEventResult(BaseModel):
+    created: List[EventOut]
+    errors: List[BatchItemError]
+
+class BatchEventUpdateItem(EventUpdate):
+    id: int
+    # Only apply the change while the event is still at this version
+    version: Optional[int] = None
+
+class BatchEventUpdate(BaseModel):
+    events: List[BatchEventUpdateItem] = Field(..., min_items=1)
+    mode: Literal["atomic", "partial"] = "atomic"
+    check_conflicts: bool = True
+
+class BatchEventUpdateResult(BaseModel):
+    updated: List[EventOut]
+    errors: List[BatchItemError]
+
+class BatchEventDelete(BaseModel):
+    event_ids: List[int] = Field(..., min_items=1)
+    mode: Literal["atomic", "partial"] = "atomic"
+
+class BatchEventDeleteResult(BaseModel):
+    deleted: List[int]
+    errors: List[BatchItemError]
+
+# Availability schemas
+class FreeBusyRequest(BaseModel):
+    user_ids: List[int] = Field(..., min_items=1)
+    start: datetime
+    end: datetime
+
+    _utc_bounds = validator("start", "end", allow_reuse=True)(to_naive_utc)
+
+    @validator("end")
+    def end_after_start(cls, end, values):
+        if "start" in values and end <= values["start"]:
+            raise ValueError("end must be after start")
+        return end
+
+class BusyBlock(BaseModel):
+    start: datetime
+    end: datetime
+
+class UserFreeBusy(BaseModel):
+    user_id: int
+    busy: List[BusyBlock]
+
+class FreeBusyOut(BaseModel):
+    start: datetime
+    end: datetime
+    users: List[UserFreeBusy]
+
+class SlotRequest(FreeBusyRequest):
+    duration_minutes: int = Field(..., gt=0, le=24 * 60)
+    limit: int = Field(5, ge=1, le=100)
+    granularity_minutes: int = Field(15, ge=1, le=24 * 60)
+    # Working hours (on the events' clock) on the given weekdays, Monday=0;
+    # set work_start and work_end to null to search around the clock
+    work_start: Optional[time] = time(9)
+    work_end: Optional[time] = time(17)
+    weekdays: List[int] = Field([0, 1, 2, 3, 4], min_items=1)
+
+    @validator("work_end")
+    def work_end_after_start(cls, work_end, values):
+        work_start = values.get("work_start")
+        if (work_start is None) != (work_end is None):
+            raise ValueError("work_start and work_end must be given together")
+        if work_end is not None and work_end <= work_start:
+            raise ValueError("work_end must be after work_start")
+        return work_end
+
+    @validator("weekdays", each_item=True)
+    def valid_weekday(cls, weekday):
+        if not 0 <= weekday <= 6:
+            raise ValueError("weekdays must be between 0 (Monday) and 6 (Sunday)")
+        return weekday
+
+class SlotsOut(BaseModel):
+    duration_minutes: int
+    slots: List[BusyBlock]
 
 # Permission schemas
 class PermissionBase(BaseModel):
@@ -76,6 +217,21 @@ class PermissionOut(PermissionBase):
     class Config:
         orm_mode = True
 
+class BulkRevoke(BaseModel):
+    event_ids: List[int] = Field(..., min_items=1)
+    user_ids: List[int] = Field(..., min_items=1)
+
+class BulkShare(BulkRevoke):
+    role: Literal["owner", "editor", "viewer"]
+
+class BulkPermissionSummary(BaseModel):
+    events: int
+    users: int
+    created: int
+    updated: int
+    removed: int
+    unchanged: int
+
 # History schemas
 class ChangeBase(BaseModel):
     version: int
@@ -90,6 +246,9 @@ class ChangeOut(ChangeBase):
     class Config:
         orm_mode = True
 
+class VersionOut(ChangeOut):
+    state: dict
+
 class DiffOut(BaseModel):
     version1: int
     version2: int
@@ -1,23 +1,31 @@
 from .event_service import (
     create_event,
     get_events,
+    get_events_page,
     get_event,
     update_event,
     delete_event,
-    create_batch_events,
     check_event_conflict,
     has_permission,
     record_change
 )
+from .history_service import get_changes_page
+from .batch_service import (
+    bulk_create_events,
+    create_batch_events
+)
 
 __all__ = [
     'create_event',
     'get_events',
+    'get_events_page',
     'get_event',
     'update_event',
     'delete_event',
     'create_batch_events',
+    'bulk_create_events',
     'check_event_conflict',
     'has_permission',
-    'record_change'
+    'record_change',
+    'get_changes_page'
 ]
\ No newline at end of file
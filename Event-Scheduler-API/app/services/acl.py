@@ -0,0 +1,115 @@
+from fastapi import Depends
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Optional
+from app.auth import Principal, get_current_active_user
+from app.cache import LRUCache
+from app.database import SessionRunner, get_read_runner
+from app.models import EventPermission, UserRole
+import os
+
+ROLE_RANK = {"viewer": 0, "editor": 1, "owner": 2}
+
+# Process-wide cache of event_id -> {user_id: role or None}. Writes in this
+# process invalidate it precisely; the TTL bounds staleness from other workers.
+ACL_CACHE_SIZE = int(os.getenv("ACL_CACHE_SIZE", "10000"))
+ACL_CACHE_TTL_SECONDS = float(os.getenv("ACL_CACHE_TTL_SECONDS", "30"))
+
+_event_roles = LRUCache(maxsize=ACL_CACHE_SIZE, ttl=ACL_CACHE_TTL_SECONDS)
+_MISSING = object()
+
+def role_name(role) -> Optional[str]:
+    return role.value if isinstance(role, UserRole) else role
+
+def role_allows(role: Optional[str], required_role: str) -> bool:
+    return role is not None and ROLE_RANK[role_name(role)] >= ROLE_RANK[role_name(required_role)]
+
+def _cached_role(user_id: int, event_id: int):
+    roles = _event_roles.get(event_id)
+    return _MISSING if roles is None else roles.get(user_id, _MISSING)
+
+def remember_role(user_id: int, event_id: int, role: Optional[str]):
+    roles = _event_roles.get(event_id)
+    if roles is None:
+        roles = {}
+        _event_roles.set(event_id, roles)
+    roles[user_id] = role_name(role)
+
+def invalidate_access(event_id: int, user_id: Optional[int] = None):
+    if user_id is None:
+        _event_roles.pop(event_id)
+        return
+    roles = _event_roles.get(event_id)
+    if roles is not None:
+        roles.pop(user_id, None)
+
+def load_roles(db: Session, user_id: int, event_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+    """Roles of `user_id` on `event_ids` from the database in one IN query;
+    the results are remembered in the shared cache."""
+    event_ids = list(event_ids)
+    rows = dict(db.query(EventPermission.event_id, EventPermission.role).filter(
+        EventPermission.user_id == user_id,
+        EventPermission.event_id.in_(event_ids)
+    ).all())
+    result = {}
+    for event_id in event_ids:
+        result[event_id] = role_name(rows.get(event_id))
+        remember_role(user_id, event_id, result[event_id])
+    return result
+
+def resolve_roles(db: Session, user_id: int, event_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+    result = {}
+    missing = []
+    for event_id in event_ids:
+        cached = _cached_role(user_id, event_id)
+        if cached is _MISSING:
+            missing.append(event_id)
+        else:
+            result[event_id] = cached
+    if missing:
+        result.update(load_roles(db, user_id, missing))
+    return result
+
+class AccessResolver:
+    """Resolves one user's roles on events, memoized for the lifetime of the
+    resolver (one request) on top of the shared process-wide cache. Only
+    misses in both reach the database, through the request's SessionRunner."""
+
+    def __init__(self, db: SessionRunner, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self._memo = {}
+
+    async def role(self, event_id: int) -> Optional[str]:
+        return (await self.roles([event_id]))[event_id]
+
+    async def roles(self, event_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """Roles for many events at once; misses are resolved with one IN query."""
+        result = {}
+        missing = []
+        for event_id in event_ids:
+            if event_id in self._memo:
+                result[event_id] = self._memo[event_id]
+                continue
+            cached = _cached_role(self.user_id, event_id)
+            if cached is _MISSING:
+                missing.append(event_id)
+            else:
+                result[event_id] = self._memo[event_id] = cached
+
+        if missing:
+            loaded = await self.db.run(load_roles, self.user_id, missing)
+            for event_id, role in loaded.items():
+                result[event_id] = self._memo[event_id] = role
+        return result
+
+    async def allows(self, event_id: int, required_role: str) -> bool:
+        return role_allows(await self.role(event_id), required_role)
+
+    def forget(self, event_id: int):
+        self._memo.pop(event_id, None)
+
+def get_access(
+    db: SessionRunner = Depends(get_read_runner),
+    current_user: Principal = Depends(get_current_active_user)
+) -> AccessResolver:
+    return AccessResolver(db, current_user.id)
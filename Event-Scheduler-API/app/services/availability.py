@@ -0,0 +1,90 @@
+"""Free/busy computation across several users.
+
+All participants' events overlapping the window are fetched with one
+query, recurring series are expanded over the window only, and each user's
+intervals are merged with a sweep over their sorted starts into disjoint
+busy blocks. Only times leave this module, never event details.
+"""
+from datetime import datetime
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session, aliased
+from typing import Dict, Iterable, List, Set, Tuple
+from app.models import Event, EventPermission
+from app.services.recurrence import event_occurrences
+import os
+
+# Upper bound on a free/busy window, which bounds recurrence expansion
+FREEBUSY_MAX_DAYS = int(os.getenv("FREEBUSY_MAX_DAYS", "366"))
+FREEBUSY_MAX_USERS = int(os.getenv("FREEBUSY_MAX_USERS", "200"))
+
+Interval = Tuple[datetime, datetime]
+
+def visible_users(db: Session, user_id: int, user_ids: Iterable[int]) -> Set[int]:
+    """The subset of `user_ids` whose availability `user_id` may see: the
+    user themselves and anyone they share at least one event with."""
+    user_ids = set(user_ids)
+    mine = aliased(EventPermission)
+    theirs = aliased(EventPermission)
+    shared = db.execute(
+        select(theirs.user_id)
+        .join(mine, mine.event_id == theirs.event_id)
+        .where(mine.user_id == user_id, theirs.user_id.in_(user_ids))
+        .distinct()
+    ).scalars()
+    return set(shared) | ({user_id} & user_ids)
+
+def busy_intervals(db: Session, user_ids: Iterable[int], start: datetime, end: datetime) -> Dict[int, List[Interval]]:
+    """Raw (possibly overlapping) busy intervals per user within [start, end),
+    clipped to the window, with recurring events expanded."""
+    user_ids = list(user_ids)
+    rows = db.execute(
+        select(
+            EventPermission.user_id,
+            Event.id,
+            Event.start_time,
+            Event.end_time,
+            Event.is_recurring,
+            Event.recurrence_pattern,
+            Event.updated_at
+        )
+        .join(EventPermission, EventPermission.event_id == Event.id)
+        .where(
+            EventPermission.user_id.in_(user_ids),
+            Event.start_time < end,
+            or_(Event.is_recurring.is_(True), Event.end_time > start)
+        )
+    ).all()
+
+    intervals = {user_id: [] for user_id in user_ids}
+    for row in rows:
+        for occurrence_start, occurrence_end in event_occurrences(row, start, end):
+            intervals[row.user_id].append((max(occurrence_start, start), min(occurrence_end, end)))
+    return intervals
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sweep-line union of half-open intervals; touching intervals merge."""
+    merged = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def free_busy(db: Session, user_ids: Iterable[int], start: datetime, end: datetime) -> Dict[int, List[Interval]]:
+    """Merged busy blocks per user within [start, end)."""
+    return {
+        user_id: merge_intervals(intervals)
+        for user_id, intervals in busy_intervals(db, user_ids, start, end).items()
+    }
+
+def get_free_busy(db: Session, user_id: int, user_ids: List[int], start: datetime, end: datetime):
+    """Return (busy, hidden): merged busy blocks for the requested users, or
+    the ids `user_id` may not see, in which case `busy` is None."""
+    hidden = set(user_ids) - visible_users(db, user_id, user_ids)
+    if hidden:
+        return None, sorted(hidden)
+    return free_busy(db, user_ids, start, end), []
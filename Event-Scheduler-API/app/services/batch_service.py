@@ -0,0 +1,389 @@
+from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.models import Event, EventChange, EventPermission, UserRole
+from app.query_budget import extend_budget
+from app.schemas import BatchEventUpdateItem, EventCreate
+from app.services.acl import invalidate_access, remember_role, role_allows
+from app.services.conflict_index import conflict_indexes
+from app.services.event_service import build_change_diff, bump_calendar_versions
+from app.services.history_store import HISTORY_FIELDS, event_state, is_snapshot_version
+from app.services.notifications import event_audiences, notify
+
+BATCH_MODES = ("atomic", "partial")
+DEFAULT_CHUNK_SIZE = 500
+CONFLICT_DETAIL = "Event conflicts with existing events"
+
+def validate_event(event: EventCreate) -> Optional[str]:
+    if event.end_time <= event.start_time:
+        return "end_time must be after start_time"
+    return None
+
+def _access_error(index: int, event_id: int, role: Optional[str], required_role: str) -> Optional[dict]:
+    if role is None:
+        return {"index": index, "code": "not_found", "detail": f"Event {event_id} not found"}
+    if not role_allows(role, required_role):
+        return {"index": index, "code": "forbidden", "detail": f"Not enough permissions on event {event_id}"}
+    return None
+
+def _stale_error(index: int, event_id: int) -> dict:
+    return {"index": index, "code": "stale", "detail": f"Event {event_id} has been modified since it was read"}
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def bulk_create_events(
+    db: Session,
+    events: List[EventCreate],
+    user_id: int,
+    mode: str = "atomic",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    check_conflicts: bool = True
+) -> Tuple[List[Event], List[dict]]:
+    """Insert a batch of events, their owner permissions and version-1 history
+    rows with multi-row INSERTs, committing once for the whole batch.
+
+    In "atomic" mode any invalid item aborts the batch and nothing is written;
+    in "partial" mode invalid items are reported and the rest are inserted.
+    With `check_conflicts`, items overlapping the user's existing events or an
+    earlier item of the batch are rejected the same way.
+    Returns (created_events, errors) where errors are {"index", "code",
+    "detail"} dicts.
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Unknown batch mode: {mode}")
+
+    errors = []
+    candidates = []
+    for index, event in enumerate(events):
+        detail = validate_event(event)
+        if detail:
+            errors.append({"index": index, "code": "invalid", "detail": detail})
+        else:
+            candidates.append((index, event))
+
+    conflicts = set()
+    if check_conflicts and candidates:
+        conflicts = conflict_indexes.batch_conflicts(db, user_id, [
+            (event.start_time, event.end_time, event.recurrence_pattern if event.is_recurring else None)
+            for _, event in candidates
+        ])
+    valid = []
+    for position, (index, event) in enumerate(candidates):
+        if position in conflicts:
+            errors.append({"index": index, "code": "conflict", "detail": CONFLICT_DETAIL})
+        else:
+            valid.append(event)
+    errors.sort(key=lambda error: error["index"])
+
+    if errors and mode == "atomic":
+        return [], errors
+
+    now = datetime.utcnow()
+    created = []
+    # RETURNING inserts are sent in pages of this many rows
+    page_size = db.get_bind().dialect.insertmanyvalues_page_size
+    try:
+        for chunk in _chunks(valid, chunk_size):
+            # The request's budget covers the fixed statements; each chunk
+            # adds its event INSERT pages and the permission and history INSERTs
+            extend_budget(-(-len(chunk) // page_size) + 2)
+            # One INSERT per chunk: sort_by_parameter_order would make SQLite
+            # insert row by row. Ids follow the VALUES order (events use
+            # AUTOINCREMENT), so sorting by id pairs rows with the chunk.
+            db_events = sorted(db.scalars(
+                insert(Event).returning(Event),
+                [
+                    {
+                        "title": event.title,
+                        "description": event.description,
+                        "start_time": event.start_time,
+                        "end_time": event.end_time,
+                        "location": event.location,
+                        "is_recurring": event.is_recurring,
+                        "recurrence_pattern": event.recurrence_pattern,
+                        "created_by": user_id,
+                        "created_at": now,
+                        "updated_at": now,
+                        "version": 1,
+                    }
+                    for event in chunk
+                ]
+            ).all(), key=lambda db_event: db_event.id)
+
+            db.execute(insert(EventPermission), [
+                {
+                    "event_id": db_event.id,
+                    "user_id": user_id,
+                    "role": UserRole.OWNER,
+                    "granted_at": now,
+                }
+                for db_event in db_events
+            ])
+            db.execute(insert(EventChange), [
+                {
+                    "event_id": db_event.id,
+                    "user_id": user_id,
+                    "version": 1,
+                    "change_type": "create",
+                    "changes": build_change_diff("create", {}, event.dict()),
+                    "snapshot": event_state(event),
+                    "changed_at": now,
+                }
+                for db_event, event in zip(db_events, chunk)
+            ])
+            for db_event in db_events:
+                notify(db, [user_id], {
+                    "type": "event.changed",
+                    "event_id": db_event.id,
+                    "version": 1,
+                    "change_type": "create",
+                    "changed_by": user_id,
+                })
+            created.extend(db_events)
+
+        # Detach the new rows so commit does not expire them; the response is
+        # serialized straight from the RETURNING values.
+        for db_event in created:
+            db.expunge(db_event)
+        if created:
+            bump_calendar_versions(db, user_ids=[user_id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for db_event in created:
+        remember_role(user_id, db_event.id, "owner")
+        conflict_indexes.event_added(user_id, db_event)
+    return created, errors
+
+def _write_changes(db: Session, user_id: int, change_type: str, changes: List[Tuple[Event, int, dict]], now: datetime):
+    # History rows for (event, version, diff) triples, one multi-row INSERT,
+    # plus the list ETag bumps and notifications for their audiences
+    db.execute(insert(EventChange), [
+        {
+            "event_id": db_event.id,
+            "user_id": user_id,
+            "version": version,
+            "change_type": change_type,
+            "changes": diff,
+            "snapshot": event_state(db_event) if is_snapshot_version(version) else None,
+            "changed_at": now,
+        }
+        for db_event, version, diff in changes
+    ])
+    event_ids = [db_event.id for db_event, _, _ in changes]
+    bump_calendar_versions(db, event_ids=event_ids)
+    audiences = event_audiences(db, event_ids)
+    for db_event, version, _ in changes:
+        notify(db, audiences[db_event.id], {
+            "type": "event.changed",
+            "event_id": db_event.id,
+            "version": version,
+            "change_type": change_type,
+            "changed_by": user_id,
+        })
+
+def bulk_update_events(
+    db: Session,
+    updates: List[BatchEventUpdateItem],
+    user_id: int,
+    roles: Dict[int, Optional[str]],
+    mode: str = "atomic",
+    check_conflicts: bool = True
+) -> Tuple[List[Event], List[dict]]:
+    """Apply many event updates in one transaction: one load of the affected
+    rows, one multi-row INSERT of their history and a single commit.
+
+    `roles` holds the caller's role on every event id in `updates`, as
+    resolved by the ACL; items the caller cannot edit, unknown ids, items
+    whose `version` is no longer current and invalid time ranges are
+    reported as errors, as are (with `check_conflicts`) items whose new
+    times overlap the caller's other events or each other. "atomic" and
+    "partial" behave as in bulk_create_events. Returns (updated_events, errors).
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Unknown batch mode: {mode}")
+
+    errors = []
+    candidates = []
+    seen = set()
+    for index, item in enumerate(updates):
+        error = _access_error(index, item.id, roles.get(item.id), "editor")
+        if error is None and item.id in seen:
+            error = {"index": index, "code": "invalid", "detail": f"Event {item.id} is listed more than once"}
+        if error:
+            errors.append(error)
+        else:
+            seen.add(item.id)
+            candidates.append((index, item))
+
+    db_events = {
+        db_event.id: db_event
+        for db_event in db.scalars(select(Event).where(Event.id.in_(list(seen))))
+    }
+    valid = []
+    for index, item in candidates:
+        db_event = db_events.get(item.id)
+        fields = item.dict(exclude_unset=True, exclude={"id", "version"})
+        new_start = fields.get("start_time", db_event.start_time) if db_event else None
+        new_end = fields.get("end_time", db_event.end_time) if db_event else None
+        if db_event is None:
+            errors.append({"index": index, "code": "not_found", "detail": f"Event {item.id} not found"})
+        elif item.version is not None and item.version != db_event.version:
+            errors.append(_stale_error(index, item.id))
+        elif new_start is not None and new_end is not None and new_end <= new_start:
+            errors.append({"index": index, "code": "invalid", "detail": "end_time must be after start_time"})
+        else:
+            valid.append((index, db_event, fields, new_start, new_end))
+
+    if check_conflicts:
+        # Moved or re-patterned events are checked at their new times, every
+        # occurrence of a series included, against everything else on the
+        # caller's calendar and against each other
+        moved = []
+        for index, db_event, fields, new_start, new_end in valid:
+            recurring = fields.get("is_recurring", db_event.is_recurring)
+            pattern = fields.get("recurrence_pattern", db_event.recurrence_pattern) if recurring else None
+            old_pattern = db_event.recurrence_pattern if db_event.is_recurring else None
+            if new_start is None or new_end is None:
+                continue
+            if (new_start, new_end, pattern) != (db_event.start_time, db_event.end_time, old_pattern):
+                moved.append((index, db_event.id, (new_start, new_end, pattern)))
+        conflicts = conflict_indexes.batch_conflicts(
+            db,
+            user_id,
+            [interval for _, _, interval in moved],
+            exclude=[event_id for _, event_id, _ in moved]
+        ) if moved else set()
+        rejected = {moved[position][0] for position in conflicts}
+        for index in sorted(rejected):
+            errors.append({"index": index, "code": "conflict", "detail": CONFLICT_DETAIL})
+        valid = [entry for entry in valid if entry[0] not in rejected]
+    errors.sort(key=lambda error: error["index"])
+
+    if (errors and mode == "atomic") or not valid:
+        db.rollback()
+        return [], errors
+
+    now = datetime.utcnow()
+    changes = []
+    try:
+        # One compare-and-set for every version: an event a concurrent writer
+        # changed since it was loaded matches nothing and is reported stale
+        versions = dict(db.execute(
+            update(Event)
+            .where(tuple_(Event.id, Event.version).in_([(db_event.id, db_event.version) for _, db_event, _, _, _ in valid]))
+            .values(version=Event.version + 1)
+            .returning(Event.id, Event.version)
+            .execution_options(synchronize_session=False)
+        ).all())
+        stale = [index for index, db_event, _, _, _ in valid if db_event.id not in versions]
+        if stale:
+            errors.extend(_stale_error(index, updates[index].id) for index in stale)
+            errors.sort(key=lambda error: error["index"])
+            valid = [entry for entry in valid if entry[1].id in versions]
+            if mode == "atomic" or not valid:
+                db.rollback()
+                return [], errors
+        for _, db_event, fields, _, _ in valid:
+            original = {field: getattr(db_event, field) for field in HISTORY_FIELDS}
+            for field, value in fields.items():
+                setattr(db_event, field, value)
+            set_committed_value(db_event, "version", versions[db_event.id])
+            db_event.updated_at = now
+            changes.append((db_event, db_event.version, build_change_diff("update", original, fields)))
+        _write_changes(db, user_id, "update", changes, now)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    updated = [db_event for db_event, _, _ in changes]
+    for db_event in updated:
+        conflict_indexes.event_changed(db_event)
+    return updated, errors
+
+def bulk_delete_events(
+    db: Session,
+    event_ids: List[int],
+    user_id: int,
+    roles: Dict[int, Optional[str]],
+    mode: str = "atomic"
+) -> Tuple[List[int], List[dict]]:
+    """Delete many events in one transaction: their "delete" history rows
+    are written with one multi-row INSERT, then permissions and events are
+    removed with one DELETE each. Only owners may delete; `roles` and
+    `mode` work as in bulk_update_events. Returns (deleted_ids, errors).
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Unknown batch mode: {mode}")
+
+    errors = []
+    allowed = []
+    for index, event_id in enumerate(event_ids):
+        error = _access_error(index, event_id, roles.get(event_id), "owner")
+        if error:
+            errors.append(error)
+        elif event_id not in allowed:
+            allowed.append(event_id)
+
+    db_events = {
+        db_event.id: db_event
+        for db_event in db.scalars(select(Event).where(Event.id.in_(allowed)))
+    }
+    for index, event_id in enumerate(event_ids):
+        if event_id in allowed and event_id not in db_events:
+            errors.append({"index": index, "code": "not_found", "detail": f"Event {event_id} not found"})
+    errors.sort(key=lambda error: error["index"])
+
+    if (errors and mode == "atomic") or not db_events:
+        db.rollback()
+        return [], errors
+
+    now = datetime.utcnow()
+    deleted = [event_id for event_id in allowed if event_id in db_events]
+    try:
+        changes = [
+            (
+                db_events[event_id],
+                db_events[event_id].version + 1,
+                build_change_diff("delete", {
+                    "title": db_events[event_id].title,
+                    "description": db_events[event_id].description,
+                    "start_time": db_events[event_id].start_time,
+                    "end_time": db_events[event_id].end_time
+                }, {})
+            )
+            for event_id in deleted
+        ]
+        # Audiences and ETag bumps go through the permissions, so they are
+        # written before the permissions are removed
+        _write_changes(db, user_id, "delete", changes, now)
+        db.execute(
+            delete(EventPermission).where(EventPermission.event_id.in_(deleted))
+            .execution_options(synchronize_session=False)
+        )
+        for event_id in deleted:
+            db.expunge(db_events[event_id])
+        db.execute(
+            delete(Event).where(Event.id.in_(deleted))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for event_id in deleted:
+        invalidate_access(event_id)
+        conflict_indexes.event_removed(event_id)
+    return deleted, errors
+
+def create_batch_events(db: Session, events: List[EventCreate], user_id: int):
+    created_events, _ = bulk_create_events(db, events, user_id, mode="partial")
+    return created_events
@@ -0,0 +1,294 @@
+from datetime import datetime, timedelta
+from threading import RLock
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from sqlalchemy.orm import Session
+from app.cache import LRUCache
+from app.models import Event, EventPermission
+from app.schemas import to_naive_utc
+from app.services.recurrence import expandable_pattern, last_end, occurrences
+import os
+import random
+
+# Indexes are per process; the TTL bounds how long another worker's writes
+# can go unnoticed.
+CONFLICT_INDEX_MAX_USERS = int(os.getenv("CONFLICT_INDEX_MAX_USERS", "1024"))
+CONFLICT_INDEX_TTL_SECONDS = float(os.getenv("CONFLICT_INDEX_TTL_SECONDS", "300"))
+# A new recurring series is checked occurrence by occurrence up to this far
+# past its first instance; without a count or until it would never end.
+CONFLICT_HORIZON_DAYS = int(os.getenv("CONFLICT_HORIZON_DAYS", "365"))
+
+def _pattern(event: Event) -> Optional[dict]:
+    return event.recurrence_pattern if event.is_recurring else None
+
+def instances(start: datetime, end: datetime, pattern: Optional[dict] = None) -> Iterator[Tuple[datetime, datetime]]:
+    """The occurrences of a new event to check for conflicts: the event
+    itself, or every occurrence of its series within CONFLICT_HORIZON_DAYS."""
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    return occurrences(start, end, pattern, start, start + timedelta(days=CONFLICT_HORIZON_DAYS))
+
+class _Node:
+    __slots__ = ("key", "end", "span_end", "pattern", "priority", "left", "right", "max_end")
+
+    def __init__(self, event_id: int, start: datetime, end: datetime, pattern: Optional[dict]):
+        self.key = (start, event_id)
+        self.end = end
+        # How far any occurrence reaches; open-ended series reach forever
+        self.span_end = (last_end(start, end, pattern) or datetime.max) if pattern else end
+        self.pattern = pattern
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = self.span_end
+
+def _update(node: _Node):
+    node.max_end = node.span_end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+def _split(node: Optional[_Node], key: tuple) -> Tuple[Optional[_Node], Optional[_Node]]:
+    # (nodes with keys below `key`, the rest)
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _update(node)
+    return left, node
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    # Every key in `left` is below every key in `right`
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+def _insert(node: Optional[_Node], new: _Node) -> _Node:
+    if node is None:
+        return new
+    if new.priority > node.priority:
+        new.left, new.right = _split(node, new.key)
+        _update(new)
+        return new
+    if new.key < node.key:
+        node.left = _insert(node.left, new)
+    else:
+        node.right = _insert(node.right, new)
+    _update(node)
+    return node
+
+def _delete(node: Optional[_Node], key: tuple) -> Optional[_Node]:
+    if node is None:
+        return None
+    if node.key == key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _delete(node.left, key)
+    else:
+        node.right = _delete(node.right, key)
+    _update(node)
+    return node
+
+def _build(nodes: List[_Node]) -> Optional[_Node]:
+    # Treap of nodes already in key order, in O(n): the stack holds the
+    # right spine, and a node leaves it once nothing more can go under it
+    spine = []
+    root = None
+    for node in nodes:
+        below = None
+        while spine and spine[-1].priority < node.priority:
+            below = spine.pop()
+            _update(below)
+        node.left = below
+        if spine:
+            spine[-1].right = node
+        spine.append(node)
+    while spine:
+        root = spine.pop()
+        _update(root)
+    return root
+
+class IntervalIndex:
+    """Interval tree of half-open [start, end) intervals.
+
+    A treap ordered by (start, id) whose nodes also carry the largest end
+    time in their subtree, so adding or removing an interval is O(log n)
+    and "does [start, end) overlap anything?" prunes every subtree that
+    ends before `start` or starts after `end`. A recurring series is one
+    node spanning its first start to its last end (open-ended series reach
+    forever) and is expanded only when a query lands in that span, and then
+    only over the queried window.
+    """
+
+    def __init__(self, intervals: Iterable[tuple] = ()):
+        nodes = {}
+        for event_id, start, end, *rest in intervals:
+            if start is not None and end is not None:
+                pattern = expandable_pattern(rest[0]) if rest else None
+                nodes[event_id] = _Node(event_id, to_naive_utc(start), to_naive_utc(end), pattern)
+        self._keys = {event_id: node.key for event_id, node in nodes.items()}
+        self._root = _build(sorted(nodes.values(), key=lambda node: node.key))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, event_id: int) -> bool:
+        return event_id in self._keys
+
+    def add(self, event_id: int, start: datetime, end: datetime, pattern: Optional[dict] = None):
+        if event_id in self:
+            self.remove(event_id)
+        if start is None or end is None:
+            return
+        node = _Node(event_id, to_naive_utc(start), to_naive_utc(end), expandable_pattern(pattern))
+        self._root = _insert(self._root, node)
+        self._keys[event_id] = node.key
+
+    def remove(self, event_id: int):
+        key = self._keys.pop(event_id, None)
+        if key is not None:
+            self._root = _delete(self._root, key)
+
+    def overlaps(self, start: datetime, end: datetime, exclude: Sequence[int] = (), pattern: Optional[dict] = None) -> bool:
+        """Whether [start, end) overlaps anything outside `exclude`; with a
+        `pattern`, whether any occurrence of that series does (see instances)."""
+        exclude = exclude if isinstance(exclude, (set, frozenset)) else frozenset(exclude)
+        if pattern:
+            return any(
+                self.overlaps(occurrence_start, occurrence_end, exclude)
+                for occurrence_start, occurrence_end in instances(start, end, pattern)
+            )
+        # Stored times are naive UTC; an aware bound would not compare with them
+        return self._overlaps(self._root, to_naive_utc(start), to_naive_utc(end), exclude)
+
+    def _overlaps(self, node: Optional[_Node], start: datetime, end: datetime, exclude: Sequence[int]) -> bool:
+        # Left to right until nodes start at or after `end`; a subtree whose
+        # intervals all end by `start` is skipped whole
+        while node is not None and node.max_end > start:
+            if self._overlaps(node.left, start, end, exclude):
+                return True
+            node_start, event_id = node.key
+            if node_start >= end:
+                return False
+            if node.span_end > start and event_id not in exclude:
+                if node.pattern is None or any(occurrences(node_start, node.end, node.pattern, start, end)):
+                    return True
+            node = node.right
+        return False
+
+    def conflicting(self, intervals: Sequence[tuple], exclude: Sequence[int] = ()) -> Set[int]:
+        """Return positions in `intervals`, (start, end) or (start, end,
+        pattern) tuples, that overlap the index (ignoring `exclude`) or an
+        earlier accepted item of the same sequence, i.e. the items that would
+        be rejected if they were created one by one."""
+        conflicts = set()
+        accepted = IntervalIndex()
+        for position, (start, end, *rest) in enumerate(intervals):
+            pattern = rest[0] if rest else None
+            if self.overlaps(start, end, exclude, pattern) or accepted.overlaps(start, end, pattern=pattern):
+                conflicts.add(position)
+            else:
+                accepted.add(-position - 1, start, end, pattern)
+        return conflicts
+
+class ConflictIndexRegistry:
+    """Lazily loaded per-user IntervalIndex instances, kept in an LRU."""
+
+    def __init__(self, maxsize: int = CONFLICT_INDEX_MAX_USERS, ttl: Optional[float] = CONFLICT_INDEX_TTL_SECONDS):
+        self._indexes = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._lock = RLock()
+        # Bumped by every change applied to the indexes
+        self._writes = 0
+
+    def get(self, db: Session, user_id: int) -> IntervalIndex:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            writes = self._writes
+        if index is not None:
+            return index
+        # Loaded outside the lock so other users' checks are not held up
+        rows = db.query(
+            Event.id, Event.start_time, Event.end_time, Event.is_recurring, Event.recurrence_pattern
+        ).join(EventPermission).filter(
+            EventPermission.user_id == user_id
+        ).all()
+        index = IntervalIndex(
+            (event_id, start, end, pattern if is_recurring else None)
+            for event_id, start, end, is_recurring, pattern in rows
+        )
+        with self._lock:
+            installed = self._indexes.get(user_id)
+            if installed is not None:
+                return installed
+            # A change applied while the rows were read may be missing from
+            # them; such an index still serves this call but is not kept
+            if self._writes == writes:
+                self._indexes.set(user_id, index)
+        return index
+
+    def has_conflict(
+        self,
+        db: Session,
+        user_id: int,
+        start: datetime,
+        end: datetime,
+        exclude: Sequence[int] = (),
+        pattern: Optional[dict] = None
+    ) -> bool:
+        index = self.get(db, user_id)
+        with self._lock:
+            return index.overlaps(start, end, exclude, pattern)
+
+    def batch_conflicts(
+        self,
+        db: Session,
+        user_id: int,
+        intervals: List[tuple],
+        exclude: Sequence[int] = ()
+    ) -> Set[int]:
+        index = self.get(db, user_id)
+        with self._lock:
+            return index.conflicting(intervals, exclude)
+
+    def event_added(self, user_id: int, event: Event):
+        with self._lock:
+            self._writes += 1
+            index = self._indexes.get(user_id)
+            if index is not None:
+                index.add(event.id, event.start_time, event.end_time, _pattern(event))
+
+    def event_changed(self, event: Event):
+        with self._lock:
+            self._writes += 1
+            for index in self._indexes.values():
+                if event.id in index:
+                    index.add(event.id, event.start_time, event.end_time, _pattern(event))
+
+    def event_removed(self, event_id: int, user_id: Optional[int] = None):
+        with self._lock:
+            self._writes += 1
+            if user_id is not None:
+                index = self._indexes.get(user_id)
+                indexes = [index] if index is not None else []
+            else:
+                indexes = self._indexes.values()
+            for index in indexes:
+                index.remove(event_id)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            self._writes += 1
+            if user_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(user_id)
+
+conflict_indexes = ConflictIndexRegistry()
@@ -1,9 +1,36 @@
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, delete, or_, select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
-from app.models import Event, EventChange, EventPermission
+from app.models import Event, EventChange, EventPermission, User
+from app.pagination import decode_event_cursor, encode_event_cursor
 from app.schemas import EventCreate, EventUpdate
-from typing import List
-from typing import Dict
+from app.services.acl import invalidate_access, remember_role, resolve_roles, role_allows
+from app.services.conflict_index import conflict_indexes
+from app.services.history_recorder import defer_history_row
+from app.services.history_store import event_state, is_snapshot_version
+from app.services.notifications import event_audience, notify
+from app.services.recurrence import Occurrence, event_occurrences
+from itertools import islice
+from typing import List, Optional, Tuple
+import heapq
+
+# Columns behind EventOut, in its field order; list queries select these
+# instead of hydrating ORM objects.
+EVENT_OUT_COLUMNS = (
+    Event.title,
+    Event.description,
+    Event.start_time,
+    Event.end_time,
+    Event.id,
+    Event.location,
+    Event.is_recurring,
+    Event.recurrence_pattern,
+    Event.created_by,
+    Event.created_at,
+    Event.updated_at,
+)
 
 def create_event(db: Session, event: EventCreate, user_id: int):
     db_event = Event(
@@ -18,7 +45,6 @@ def create_event(db: Session, event: EventCreate, user_id: int):
     )
     db.add(db_event)
     db.commit()
-    db.refresh(db_event)
     
     # Add owner permission
     add_permission(db, user_id, db_event.id, "owner")
@@ -33,50 +59,18 @@ def create_event(db: Session, event: EventCreate, user_id: int):
         event.dict()
     )
     
+    remember_role(user_id, db_event.id, "owner")
+    conflict_indexes.event_added(user_id, db_event)
     return db_event
 
-def record_change(db: Session, event_id: int, user_id: int, change_type: str, old_values: dict, new_values: dict):
-    # Get next version number
-    last_version = db.query(EventChange.version).filter(
-        EventChange.event_id == event_id
-    ).order_by(EventChange.version.desc()).first()
-    
-    next_version = 1 if last_version is None else last_version[0] + 1
-    
-    # Calculate diff
-    diff = {}
-    for key in new_values:
-        if key in old_values and old_values[key] != new_values[key]:
-            diff[key] = {"old": old_values[key], "new": new_values[key]}
-        elif key not in old_values:
-            diff[key] = {"old": None, "new": new_values[key]}
-    
-    # For deletions, track what was removed
-    if change_type == "delete":
-        diff = old_values
-    
-    db_change = EventChange(
-        event_id=event_id,
-        user_id=user_id,
-        version=next_version,
-        change_type=change_type,
-        changes=diff
-    )
-    db.add(db_change)
+def add_permission(db: Session, user_id: int, event_id: int, role: str):
+    db_permission = EventPermission(event_id=event_id, user_id=user_id, role=role)
+    db.add(db_permission)
     db.commit()
+    return db_permission
 
-# Add this function to your event_service.py
 def has_permission(db: Session, user_id: int, event_id: int, required_role: str):
-    permission = db.query(EventPermission).filter(
-        EventPermission.user_id == user_id,
-        EventPermission.event_id == event_id
-    ).first()
-    
-    if not permission:
-        return False
-    
-    role_hierarchy = {"viewer": 0, "editor": 1, "owner": 2}
-    return role_hierarchy[permission.role] >= role_hierarchy[required_role]
+    return role_allows(resolve_roles(db, user_id, [event_id])[event_id], required_role)
 
 def get_events(
     db: Session,
@@ -84,18 +78,117 @@ def get_events(
     skip: int = 0,
     limit: int = 100,
     start_date: datetime = None,
-    end_date: datetime = None
+    end_date: datetime = None,
+    after: Optional[Tuple[datetime, int]] = None
 ):
-    query = db.query(Event).join(EventPermission).filter(
+    query = db.query(*EVENT_OUT_COLUMNS).join(EventPermission).filter(
         EventPermission.user_id == user_id
     )
+    order = (Event.start_time, Event.id)
+    if after:
+        # Keyset condition on (start_time, id), served by ix_events_start_time_id
+        query = query.filter(or_(
+            Event.start_time > after[0],
+            and_(Event.start_time == after[0], Event.id > after[1])
+        ))
+    
+    # Without an upper bound a series has no finite expansion, so recurring
+    # events are only listed by their first instance.
+    if end_date is None:
+        if start_date:
+            query = query.filter(Event.start_time >= start_date)
+        return query.order_by(*order).offset(skip).limit(limit).all()
     
+    single = query.filter(Event.is_recurring.isnot(True), Event.end_time <= end_date)
     if start_date:
-        query = query.filter(Event.start_time >= start_date)
-    if end_date:
-        query = query.filter(Event.end_time <= end_date)
+        single = single.filter(Event.start_time >= start_date)
+    single = single.order_by(*order).limit(skip + limit).all()
+    
+    series = db.query(*EVENT_OUT_COLUMNS).join(EventPermission).filter(
+        EventPermission.user_id == user_id,
+        Event.is_recurring.is_(True),
+        Event.start_time < end_date
+    ).all()
+    if not series:
+        return single[skip:]
     
-    return query.offset(skip).limit(limit).all()
+    window_start = start_date or min(event.start_time for event in series)
+    # A cursor page only needs occurrences from the cursor on
+    expand_from = max(window_start, after[0]) if after else window_start
+
+    def instances(event):
+        # Occurrences come out in start order, so heapq.merge reads each
+        # series only as far as the page needs
+        for occurrence_start, occurrence_end in event_occurrences(event, expand_from, end_date):
+            if occurrence_start >= window_start and occurrence_end <= end_date and (
+                after is None or (occurrence_start, event.id) > after
+            ):
+                yield Occurrence(event, occurrence_start, occurrence_end)
+
+    merged = heapq.merge(
+        single,
+        *(instances(event) for event in series),
+        key=lambda event: (event.start_time, event.id)
+    )
+    return list(islice(merged, skip, skip + limit))
+
+def get_events_page(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    start_date: datetime = None,
+    end_date: datetime = None
+):
+    """Return (events, next_cursor). The cursor encodes the (start_time, id)
+    of the last row, so every page costs the same however deep it is."""
+    after = decode_event_cursor(cursor) if cursor else None
+    events = get_events(
+        db,
+        user_id,
+        skip=skip,
+        limit=limit + 1,
+        start_date=start_date,
+        end_date=end_date,
+        after=after
+    )
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = encode_event_cursor(events[-1].start_time, events[-1].id)
+    return events, next_cursor
+
+def get_event_version(db: Session, event_id: int) -> Optional[int]:
+    return db.execute(select(Event.version).where(Event.id == event_id)).scalar()
+
+def get_calendar_version(db: Session, user_id: int) -> int:
+    return db.execute(select(User.calendar_version).where(User.id == user_id)).scalar() or 0
+
+def bump_calendar_versions(db: Session, event_id: Optional[int] = None, user_ids=(), event_ids=()):
+    """Invalidate the list ETags of everyone with access to `event_id` or any
+    of `event_ids`, and of `user_ids`, in the caller's transaction."""
+    conditions = []
+    if event_id is not None:
+        conditions.append(User.id.in_(
+            select(EventPermission.user_id).where(EventPermission.event_id == event_id)
+        ))
+    if event_ids:
+        conditions.append(User.id.in_(
+            select(EventPermission.user_id).where(EventPermission.event_id.in_(list(event_ids)))
+        ))
+    if user_ids:
+        conditions.append(User.id.in_(list(user_ids)))
+    if conditions:
+        db.execute(
+            update(User)
+            .where(or_(*conditions))
+            .values(calendar_version=User.calendar_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+class StaleVersionError(Exception):
+    """Raised when a conditional write names a version that is no longer current."""
 
 def get_event(db: Session, event_id: int, user_id: int):
     return db.query(Event).join(EventPermission).filter(
@@ -103,7 +196,16 @@ def get_event(db: Session, event_id: int, user_id: int):
         EventPermission.user_id == user_id
     ).first()
 
-def update_event(db: Session, event_id: int, event: EventUpdate, user_id: int):
+def update_event(
+    db: Session,
+    event_id: int,
+    event: EventUpdate,
+    user_id: int,
+    expected_versions: Optional[List[int]] = None
+):
+    """Apply `event` to the stored event. When `expected_versions` is given the
+    update only happens if the current version is one of them, otherwise
+    StaleVersionError is raised."""
     db_event = db.query(Event).filter(Event.id == event_id).first()
     if not db_event:
         return None
@@ -123,19 +225,23 @@ def update_event(db: Session, event_id: int, event: EventUpdate, user_id: int):
     for field, value in event.dict(exclude_unset=True).items():
         setattr(db_event, field, value)
     
-    db.commit()
-    db.refresh(db_event)
+    # Stamped here so the row needs no reload: the version comes back from
+    # the history row instead
+    db_event.updated_at = datetime.utcnow()
     
-    # Record update in history
-    record_change(
+    # Record update in history; commits the edit together with its version
+    db_change = record_change(
         db,
         event_id,
         user_id,
         "update",
         original_values,
-        event.dict(exclude_unset=True)
+        event.dict(exclude_unset=True),
+        expected_versions=expected_versions
     )
+    set_committed_value(db_event, "version", db_change.version)
     
+    conflict_indexes.event_changed(db_event)
     return db_event
 
 def delete_event(db: Session, event_id: int, user_id: int):
@@ -159,51 +265,98 @@ def delete_event(db: Session, event_id: int, user_id: int):
         # Delete permissions first
         db.query(EventPermission).filter(EventPermission.event_id == event_id).delete()
         
-        # Then delete the event
-        db.delete(db_event)
+        # Then delete the event. A Core DELETE, as the ORM one would load both
+        # relationships and unlink the history rows, which outlive the event
+        db.expunge(db_event)
+        db.execute(delete(Event).where(Event.id == event_id).execution_options(synchronize_session=False))
         db.commit()
+        invalidate_access(event_id)
+        conflict_indexes.event_removed(event_id)
 
-def create_batch_events(db: Session, events: List[EventCreate], user_id: int):
-    created_events = []
-    for event in events:
-        created_events.append(create_event(db, event, user_id))
-    return created_events
+def check_event_conflict(db: Session, user_id: int, start_time: datetime, end_time: datetime, recurrence_pattern: Optional[dict] = None):
+    return conflict_indexes.has_conflict(db, user_id, start_time, end_time, pattern=recurrence_pattern)
 
-def check_event_conflict(db: Session, user_id: int, start_time: datetime, end_time: datetime):
-    conflicting_events = db.query(Event).join(EventPermission).filter(
-        EventPermission.user_id == user_id,
-        Event.start_time < end_time,
-        Event.end_time > start_time
-    ).count()
-    
-    return conflicting_events > 0
+def build_change_diff(change_type: str, old_values: dict, new_values: dict) -> dict:
+    old_values = jsonable_encoder(old_values)
+    new_values = jsonable_encoder(new_values)
+
+    # For deletions, track what was removed
+    if change_type == "delete":
+        return old_values
 
-def record_change(db: Session, event_id: int, user_id: int, change_type: str, old_values: dict, new_values: dict):
-    # Get next version number
-    last_version = db.query(EventChange.version).filter(
-        EventChange.event_id == event_id
-    ).order_by(EventChange.version.desc()).first()
-    
-    next_version = 1 if last_version is None else last_version[0] + 1
-    
-    # Calculate diff
     diff = {}
     for key in new_values:
         if key in old_values and old_values[key] != new_values[key]:
             diff[key] = {"old": old_values[key], "new": new_values[key]}
         elif key not in old_values:
             diff[key] = {"old": None, "new": new_values[key]}
-    
-    # For deletions, track what was removed
-    if change_type == "delete":
-        diff = old_values
-    
-    db_change = EventChange(
-        event_id=event_id,
-        user_id=user_id,
-        version=next_version,
-        change_type=change_type,
-        changes=diff
-    )
-    db.add(db_change)
-    db.commit()
\ No newline at end of file
+    return diff
+
+def allocate_version(db: Session, event_id: int, expected_versions: Optional[List[int]] = None) -> Optional[int]:
+    """Increment the event's version counter and return the new value.
+
+    The counter lives on the event row, so this is a single indexed UPDATE
+    however long the history is. The row update serializes concurrent
+    writers until commit, and the unique (event_id, version) index rejects
+    anything that slips past it.
+
+    With `expected_versions` the increment is a compare-and-set: it only
+    happens if the current version is one of them, and None is returned
+    otherwise.
+    """
+    statement = update(Event).where(Event.id == event_id)
+    if expected_versions is not None:
+        statement = statement.where(Event.version.in_(expected_versions))
+    return db.execute(
+        statement.values(version=Event.version + 1).returning(Event.version)
+    ).scalar_one_or_none()
+
+def record_change(
+    db: Session,
+    event_id: int,
+    user_id: int,
+    change_type: str,
+    old_values: dict,
+    new_values: dict,
+    extra: Optional[dict] = None,
+    write_behind: bool = True,
+    expected_versions: Optional[List[int]] = None
+):
+    """Write the next history row for an event and commit it together with
+    any pending edits. Snapshot versions also store the event's full state;
+    `extra` adds annotation keys to the stored diff. With `expected_versions`
+    the write only goes through if the event is still at one of them,
+    otherwise it is rolled back and StaleVersionError is raised.
+
+    In write-behind mode the row is queued instead (see history_recorder)
+    and the returned EventChange is not persisted yet, so it has no id;
+    callers that need one pass write_behind=False."""
+    version = allocate_version(db, event_id, expected_versions)
+    if version is None:
+        db.rollback()
+        raise StaleVersionError(event_id)
+    changes = build_change_diff(change_type, old_values, new_values)
+    if extra:
+        changes.update(jsonable_encoder(extra))
+    row = {
+        "event_id": event_id,
+        "user_id": user_id,
+        "version": version,
+        "change_type": change_type,
+        "changes": changes,
+        "snapshot": event_state(db.get(Event, event_id)) if is_snapshot_version(version) else None,
+        "changed_at": datetime.utcnow(),
+    }
+    db_change = EventChange(**row)
+    if not (write_behind and defer_history_row(db, row)):
+        db.add(db_change)
+    bump_calendar_versions(db, event_id)
+    notify(db, event_audience(db, event_id), {
+        "type": "event.changed",
+        "event_id": event_id,
+        "version": version,
+        "change_type": change_type,
+        "changed_by": user_id,
+    })
+    db.commit()
+    return db_change
\ No newline at end of file
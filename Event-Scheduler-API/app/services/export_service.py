@@ -0,0 +1,67 @@
+"""NDJSON export of calendars and event history.
+
+The queries select plain columns in the same order as EventOut/ChangeOut,
+and each row is written out as one JSON line as soon as its partition
+arrives. Memory stays bounded by the partition size however many rows
+are exported.
+"""
+from datetime import date, datetime
+from sqlalchemy import select
+from typing import Optional
+from app.models import Event, EventChange, EventPermission
+from app.services.event_service import EVENT_OUT_COLUMNS
+from app.services.history_service import CHANGE_OUT_COLUMNS
+import json
+import os
+
+EXPORT_PARTITION_SIZE = int(os.getenv("EXPORT_PARTITION_SIZE", "500"))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def calendar_export_query(
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    updated_since: Optional[datetime] = None
+):
+    """Every event `user_id` can see, ordered by (start_time, id).
+
+    start_date/end_date bound the event start time (end exclusive);
+    updated_since keeps events modified at or after that moment, for
+    incremental backups.
+    """
+    query = select(*EVENT_OUT_COLUMNS).join(EventPermission).where(
+        EventPermission.user_id == user_id
+    )
+    if start_date:
+        query = query.where(Event.start_time >= start_date)
+    if end_date:
+        query = query.where(Event.start_time < end_date)
+    if updated_since:
+        query = query.where(Event.updated_at >= updated_since)
+    return query.order_by(Event.start_time, Event.id)
+
+def history_export_query(
+    event_id: int,
+    since_version: Optional[int] = None,
+    until_version: Optional[int] = None
+):
+    """Change rows of one event in version order, after `since_version`
+    (exclusive) and up to `until_version` (inclusive)."""
+    query = select(*CHANGE_OUT_COLUMNS).where(EventChange.event_id == event_id)
+    if since_version is not None:
+        query = query.where(EventChange.version > since_version)
+    if until_version is not None:
+        query = query.where(EventChange.version <= until_version)
+    return query.order_by(EventChange.version)
+
+def _encode_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def ndjson_line(row) -> bytes:
+    return (json.dumps(row._asdict(), default=_encode_default) + "\n").encode()
+
+async def ndjson_stream(partitions):
+    async for partition in partitions:
+        yield b"".join(ndjson_line(row) for row in partition)
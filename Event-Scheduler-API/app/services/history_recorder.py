@@ -0,0 +1,170 @@
+"""Write-behind recording of event history.
+
+With HISTORY_WRITE_BEHIND=1, record_change still allocates the version in
+the edit's own transaction, but the history row is handed to a background
+writer only once that transaction commits (and dropped if it rolls back).
+The writer drains the queue with multi-row INSERTs and one commit per batch
+(group commit), waiting up to HISTORY_FLUSH_LINGER_MS for a batch to fill.
+
+The queue is bounded: a row reserves one of HISTORY_QUEUE_SIZE places
+before its edit commits. When none is free, record_change writes the row in
+the edit's transaction as in synchronous mode, so a sustained overload
+slows writers down to the speed of the database instead of growing the
+queue.
+
+History reads flush first, waiting until every row queued so far in this
+process is committed, so they see their own writes. The queue is also
+drained on shutdown; rows still queued if the process dies are lost, which
+is the durability this mode trades for latency. The default,
+HISTORY_WRITE_BEHIND=0, writes history synchronously.
+"""
+from collections import deque
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from threading import Condition, Semaphore, Thread
+from typing import List, Optional
+from app.database import SessionLocal
+from app.models import EventChange
+import logging
+import os
+
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_FLUSH_BATCH = int(os.getenv("HISTORY_FLUSH_BATCH", "500"))
+HISTORY_FLUSH_LINGER_SECONDS = float(os.getenv("HISTORY_FLUSH_LINGER_MS", "5")) / 1000
+
+logger = logging.getLogger(__name__)
+
+class HistoryRecorder:
+    """Bounded queue of EventChange rows with a single background writer."""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_rows: int = HISTORY_QUEUE_SIZE,
+        batch_size: int = HISTORY_FLUSH_BATCH,
+        linger: float = HISTORY_FLUSH_LINGER_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.linger = linger
+        self.batches = 0
+        self.failed = 0
+        self._slots = Semaphore(max_rows)
+        self._rows = deque()
+        self._condition = Condition()
+        self._queued = 0
+        self._written = 0
+        self._waiters = 0
+        self._closed = False
+        self._thread: Optional[Thread] = None
+
+    def reserve(self) -> bool:
+        """Claim a place for one row without blocking; False when full."""
+        return not self._closed and self._slots.acquire(blocking=False)
+
+    def release(self, count: int = 1):
+        for _ in range(count):
+            self._slots.release()
+
+    def submit(self, rows: List[dict]):
+        """Queue rows whose places were reserved."""
+        with self._condition:
+            self._rows.extend(rows)
+            self._queued += len(rows)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name="history-recorder", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def pending(self) -> int:
+        return self._queued - self._written
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued before the call is committed."""
+        with self._condition:
+            target = self._queued
+            self._waiters += 1
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(lambda: self._written >= target, timeout)
+            finally:
+                self._waiters -= 1
+
+    def close(self):
+        """Drain the queue and stop the writer."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._rows or self._closed)
+                if not self._rows:
+                    return
+                # Give a batch time to fill unless someone is waiting on it
+                self._condition.wait_for(
+                    lambda: len(self._rows) >= self.batch_size or self._waiters or self._closed,
+                    self.linger
+                )
+                batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+            self._write(batch)
+            with self._condition:
+                self._written += len(batch)
+                self._condition.notify_all()
+            self.release(len(batch))
+
+    def _write(self, batch: List[dict]):
+        db = self.session_factory()
+        try:
+            db.execute(insert(EventChange), batch)
+            db.commit()
+            self.batches += 1
+        except Exception:
+            db.rollback()
+            # Retry one by one so a bad row does not take the batch with it
+            for row in batch:
+                try:
+                    db.execute(insert(EventChange), [row])
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    self.failed += 1
+                    logger.exception("Dropping history row for event %s version %s", row["event_id"], row["version"])
+        finally:
+            db.close()
+
+history_recorder = HistoryRecorder()
+
+def defer_history_row(db: Session, row: dict) -> bool:
+    """Queue `row` to be written after `db` commits. Returns False, leaving
+    the row to the caller, when write-behind is off or the queue is full."""
+    if not HISTORY_WRITE_BEHIND or not history_recorder.reserve():
+        return False
+    db.info.setdefault("history_rows", []).append(row)
+    return True
+
+async def flush_history():
+    """Make this process's queued history visible to the next read."""
+    if history_recorder.pending():
+        await run_in_threadpool(history_recorder.flush)
+
+async def close_history_recorder():
+    await run_in_threadpool(history_recorder.close)
+
+@event.listens_for(Session, "after_commit")
+def _submit_after_commit(session):
+    rows = session.info.pop("history_rows", None)
+    if rows:
+        history_recorder.submit(rows)
+
+@event.listens_for(Session, "after_rollback")
+def _release_after_rollback(session):
+    rows = session.info.pop("history_rows", None)
+    if rows:
+        history_recorder.release(len(rows))
@@ -0,0 +1,118 @@
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.cache import LRUCache
+from app.models import Event, EventChange
+from app.pagination import decode_history_cursor, encode_history_cursor
+from app.schemas import EventUpdate
+from app.services.conflict_index import conflict_indexes
+from app.services.event_service import record_change
+from app.services.history_store import HISTORY_FIELDS, event_state, materialize, materialize_many
+import os
+
+HISTORY_DIFF_CACHE_SIZE = int(os.getenv("HISTORY_DIFF_CACHE_SIZE", "1024"))
+DIFF_FORMAT = 1  # bump when the diff or version payload changes shape
+
+_diffs = LRUCache(maxsize=HISTORY_DIFF_CACHE_SIZE)
+
+# Columns behind ChangeOut, in its field order
+CHANGE_OUT_COLUMNS = (
+    EventChange.version,
+    EventChange.change_type,
+    EventChange.changes,
+    EventChange.changed_at,
+    EventChange.user_id,
+    EventChange.id,
+)
+
+def get_changes_page(
+    db: Session,
+    event_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
+    """Return (changes, next_cursor) ordered by version, seeking past the
+    version held in `cursor` through the (event_id, version) index."""
+    query = db.query(*CHANGE_OUT_COLUMNS).filter(EventChange.event_id == event_id)
+    if cursor:
+        query = query.filter(EventChange.version > decode_history_cursor(cursor))
+    changes = query.order_by(EventChange.version).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(changes) > limit:
+        changes = changes[:limit]
+        next_cursor = encode_history_cursor(changes[-1].version)
+    return changes, next_cursor
+
+def get_change(db: Session, event_id: int, version: int):
+    return db.query(EventChange).filter(
+        EventChange.event_id == event_id,
+        EventChange.version == version
+    ).first()
+
+def get_version(db: Session, event_id: int, version: int):
+    """Return (change, state): the history row for `version` and the full
+    event state as of that version."""
+    change = get_change(db, event_id, version)
+    if not change:
+        return None, None
+    return change, materialize(db, event_id, version)
+
+def rollback_event(db: Session, event_id: int, version: int, user_id: int):
+    """Restore the event to its state as of `version`, recorded as a new
+    "rollback" version."""
+    event = db.query(Event).filter(Event.id == event_id).first()
+    target_state = materialize(db, event_id, version)
+    if not event or target_state is None:
+        return None
+
+    current_state = event_state(event)
+    restored = EventUpdate(**target_state).dict(exclude_unset=True)
+    for field, value in restored.items():
+        setattr(event, field, value)
+
+    rollback_change = record_change(
+        db,
+        event_id,
+        user_id,
+        "rollback",
+        current_state,
+        restored,
+        extra={"rolled_back_from": version},
+        write_behind=False  # the response includes the row id
+    )
+    conflict_indexes.event_changed(event)
+    return rollback_change
+
+def diff_states(state1: dict, state2: dict) -> dict:
+    diff = {}
+    for key in HISTORY_FIELDS:
+        val1 = state1.get(key)
+        val2 = state2.get(key)
+        if val1 != val2:
+            diff[key] = {"version1": val1, "version2": val2}
+    return diff
+
+def diff_versions(db: Session, event_id: int, version_id1: int, version_id2: int):
+    """Diff the full event states at two versions. Both are materialized in
+    one query, and the result is cached since past versions never change."""
+    key = (event_id, version_id1, version_id2)
+    diff = _diffs.get(key)
+    if diff is None:
+        states = materialize_many(db, event_id, [version_id1, version_id2])
+        if states[version_id1] is None or states[version_id2] is None:
+            return None
+        diff = {
+            "version1": version_id1,
+            "version2": version_id2,
+            "differences": diff_states(states[version_id1], states[version_id2])
+        }
+        _diffs.set(key, diff)
+    return diff
+
+def diff_etag(event_id: int, version_id1: int, version_id2: int) -> str:
+    # Strong validator: the diff between two recorded versions is fixed
+    # (event ids are never reused), so it can be named by its inputs.
+    return f'"diff-{DIFF_FORMAT}-{event_id}-{version_id1}-{version_id2}"'
+
+def version_etag(event_id: int, version: int) -> str:
+    return f'"version-{DIFF_FORMAT}-{event_id}-{version}"'
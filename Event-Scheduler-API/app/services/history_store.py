@@ -0,0 +1,130 @@
+"""Snapshot + delta storage for event history.
+
+Every change row keeps its per-field diff in `changes`; every
+HISTORY_SNAPSHOT_INTERVAL-th version (1, K+1, 2K+1, ...) also stores the
+full event state in `snapshot`. Rebuilding version N therefore reads the
+nearest snapshot at or below N and replays at most K-1 deltas on top of it,
+in one range query over the (event_id, version) index.
+
+Past versions never change, so materialized states are cached by
+(event_id, version). Event ids are never reused (see Event.__table_args__),
+which keeps those keys valid after an event is deleted.
+"""
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from app.cache import LRUCache
+from app.models import EventChange
+import os
+
+HISTORY_SNAPSHOT_INTERVAL = max(int(os.getenv("HISTORY_SNAPSHOT_INTERVAL", "32")), 1)
+HISTORY_STATE_CACHE_SIZE = int(os.getenv("HISTORY_STATE_CACHE_SIZE", "4096"))
+
+# Event columns that make up a versioned state
+HISTORY_FIELDS = (
+    "title",
+    "description",
+    "start_time",
+    "end_time",
+    "location",
+    "is_recurring",
+    "recurrence_pattern",
+)
+
+_states = LRUCache(maxsize=HISTORY_STATE_CACHE_SIZE)
+
+def is_snapshot_version(version: int) -> bool:
+    return (version - 1) % HISTORY_SNAPSHOT_INTERVAL == 0
+
+def event_state(event) -> dict:
+    """JSON-ready state of an Event (or EventCreate) as stored in snapshots."""
+    return jsonable_encoder({field: getattr(event, field, None) for field in HISTORY_FIELDS})
+
+def apply_change(state: dict, change_type: str, changes: dict) -> dict:
+    """Apply one change row's delta to `state` in place.
+
+    Deltas are {"field": {"old": ..., "new": ...}}; a delete row records the
+    removed values and leaves the state as it was. Other keys (such as a
+    rollback's "rolled_back_from") are annotations and are ignored.
+    """
+    if change_type == "delete":
+        return state
+    for field, value in (changes or {}).items():
+        if field in HISTORY_FIELDS and isinstance(value, dict) and "new" in value:
+            state[field] = value["new"]
+    return state
+
+def _snapshot_floor(event_id: int, version: int):
+    # Rows written before snapshots existed replay from version 1
+    return func.coalesce(
+        select(func.max(EventChange.version))
+        .where(
+            EventChange.event_id == event_id,
+            EventChange.version <= version,
+            EventChange.snapshot.isnot(None)
+        )
+        .scalar_subquery(),
+        1
+    )
+
+def replay(rows) -> dict:
+    """Fold (version, change_type, changes, snapshot) rows, starting at a
+    snapshot or at version 1, into the state after the last row."""
+    state = {}
+    for _, change_type, changes, snapshot in rows:
+        if snapshot is not None:
+            state = dict(snapshot)
+        else:
+            apply_change(state, change_type, changes)
+    return state
+
+def materialize_many(db: Session, event_id: int, versions) -> Dict[int, Optional[dict]]:
+    """Materialize several versions of one event, fetching the snapshot +
+    delta range of every uncached version in a single query.
+
+    Returns {version: state or None}; callers get their own (shallow) copy
+    of each cached state.
+    """
+    states = {}
+    missing = set()
+    for version in set(versions):
+        state = _states.get((event_id, version))
+        if state is None:
+            missing.add(version)
+        else:
+            states[version] = state
+
+    if missing:
+        rows = db.execute(
+            select(
+                EventChange.version,
+                EventChange.change_type,
+                EventChange.changes,
+                EventChange.snapshot
+            )
+            .where(
+                EventChange.event_id == event_id,
+                or_(*[
+                    EventChange.version.between(_snapshot_floor(event_id, version), version)
+                    for version in missing
+                ])
+            )
+            .order_by(EventChange.version)
+        ).all()
+        # Each range starts at a snapshot (or version 1), so replaying every
+        # row up to a version resets at that version's own snapshot.
+        found = {row.version for row in rows}
+        for version in missing:
+            if version not in found:
+                states[version] = None
+                continue
+            state = replay(row for row in rows if row.version <= version)
+            _states.set((event_id, version), state)
+            states[version] = state
+
+    return {version: None if state is None else dict(state) for version, state in states.items()}
+
+def materialize(db: Session, event_id: int, version: int) -> Optional[dict]:
+    """Full event state as of `version`, or None if there is no such version."""
+    return materialize_many(db, event_id, [version])[version]
@@ -0,0 +1,173 @@
+"""Change notifications pushed to collaborators over SSE or WebSocket.
+
+Services queue messages on the session with notify(); they are handed to
+the broker only after that session commits, and dropped if it rolls back,
+so clients never hear about changes that did not happen. Every user has
+one channel, and a message goes to the channel of each user with access to
+the event it concerns.
+
+The broker is pluggable (set_broker). The default InMemoryBroker fans out
+inside this process, which is also what a single-worker deployment and local
+testing need; a multi-worker deployment would plug in a shared transport
+such as Redis pub/sub behind the same interface.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from threading import Lock
+from typing import Dict, Iterable, List, Set
+from app.models import EventPermission
+import asyncio
+import os
+
+# Messages for the same event that arrive while a subscriber is behind are
+# merged; at most NOTIFY_MAX_PENDING distinct ones are kept per subscriber
+# before its backlog is replaced by a single "overflow" (refetch) message.
+NOTIFY_MAX_PENDING = int(os.getenv("NOTIFY_MAX_PENDING", "256"))
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_MS", "50")) / 1000
+NOTIFY_KEEPALIVE_SECONDS = float(os.getenv("NOTIFY_KEEPALIVE_SECONDS", "15"))
+
+OVERFLOW_MESSAGE = {"type": "overflow", "detail": "Notifications were dropped; refetch your events"}
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+class Subscription:
+    """One consumer's view of a channel: a bounded, coalescing backlog that
+    publishers on any thread can add to without ever blocking."""
+
+    def __init__(self, channel: str, loop: asyncio.AbstractEventLoop, max_pending: int = NOTIFY_MAX_PENDING):
+        self.channel = channel
+        self.max_pending = max_pending
+        self.delivered = 0
+        self.coalesced = 0
+        self.overflows = 0
+        self._loop = loop
+        self._pending = OrderedDict()
+        self._overflowed = False
+        self._lock = Lock()
+        self._ready = asyncio.Event()
+
+    def deliver(self, message: dict):
+        key = (message.get("type"), message.get("event_id"), message.get("user_id"))
+        with self._lock:
+            previous = self._pending.pop(key, None)
+            if previous is not None:
+                message = {**message, "coalesced": previous.get("coalesced", 1) + 1}
+                self.coalesced += 1
+            elif len(self._pending) >= self.max_pending:
+                self._pending.clear()
+                self._overflowed = True
+                self.overflows += 1
+            self._pending[key] = message
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # the consumer's loop is gone; it will be unsubscribed
+
+    async def next_batch(self, coalesce_seconds: float = NOTIFY_COALESCE_SECONDS) -> List[dict]:
+        """Wait for messages, give a burst `coalesce_seconds` to settle, then
+        return everything pending, oldest first."""
+        await self._ready.wait()
+        if coalesce_seconds:
+            await asyncio.sleep(coalesce_seconds)
+        with self._lock:
+            batch = list(self._pending.values())
+            self._pending.clear()
+            if self._overflowed:
+                batch.insert(0, dict(OVERFLOW_MESSAGE))
+                self._overflowed = False
+            self._ready.clear()
+        self.delivered += len(batch)
+        return batch
+
+class Broker(ABC):
+    """Pub/sub transport between the services that publish changes and the
+    connections that stream them."""
+
+    @abstractmethod
+    def subscribe(self, channel: str) -> Subscription:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription):
+        ...
+
+    @abstractmethod
+    def publish(self, channels: Iterable[str], message: dict):
+        ...
+
+class InMemoryBroker(Broker):
+    def __init__(self, max_pending: int = NOTIFY_MAX_PENDING):
+        self.max_pending = max_pending
+        self._channels: Dict[str, Set[Subscription]] = {}
+        self._lock = Lock()
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(channel, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channels: Iterable[str], message: dict):
+        with self._lock:
+            subscribers = [
+                subscription
+                for channel in set(channels)
+                for subscription in self._channels.get(channel, ())
+            ]
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+_broker: Broker = InMemoryBroker()
+
+def get_broker() -> Broker:
+    return _broker
+
+def set_broker(broker: Broker):
+    global _broker
+    _broker = broker
+
+def event_audience(db: Session, event_id: int) -> List[int]:
+    """Users with any role on the event."""
+    return list(db.execute(
+        select(EventPermission.user_id).where(EventPermission.event_id == event_id)
+    ).scalars())
+
+def event_audiences(db: Session, event_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    """Users with any role on each of `event_ids`, in one query."""
+    event_ids = list(event_ids)
+    audiences = {event_id: set() for event_id in event_ids}
+    for event_id, user_id in db.execute(
+        select(EventPermission.event_id, EventPermission.user_id)
+        .where(EventPermission.event_id.in_(event_ids))
+    ):
+        audiences[event_id].add(user_id)
+    return audiences
+
+def notify(db: Session, user_ids: Iterable[int], message: dict):
+    """Queue `message` for `user_ids`; it is published when `db` commits."""
+    db.info.setdefault("notifications", []).append((list(user_ids), message))
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session):
+    pending = session.info.pop("notifications", None)
+    for user_ids, message in pending or ():
+        _broker.publish([user_channel(user_id) for user_id in user_ids], message)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("notifications", None)
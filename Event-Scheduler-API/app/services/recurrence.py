@@ -0,0 +1,183 @@
+"""Recurrence expansion for events with a `recurrence_pattern`.
+
+A pattern is a dict such as::
+
+    {
+        "frequency": "weekly",       # "daily", "weekly" or "monthly"
+        "interval": 2,               # every 2nd week (default 1)
+        "weekdays": [0, 2],          # weekly only, 0 = Monday (default: start's weekday)
+        "count": 10,                 # stop after 10 occurrences
+        "until": "2024-06-30T00:00:00",  # no occurrence starts after this
+        "exceptions": ["2024-03-06T09:00:00"],  # occurrence starts to skip
+    }
+
+Occurrences are generated lazily and only inside the requested window: the
+generator jumps straight to the first period that can overlap the window
+instead of walking the series from its first instance.
+
+Patterns are validated on write (see schemas). A stored pattern that does
+not pass (written before validation existed) is logged and expanded as
+a single instance, so one bad row cannot break a calendar.
+"""
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from typing import Iterator, Optional, Tuple
+from dateutil.parser import isoparse
+from dateutil.relativedelta import relativedelta
+from app.cache import LRUCache
+from app.schemas import to_naive_utc, validate_recurrence_pattern
+import logging
+import os
+
+RECURRENCE_CACHE_SIZE = int(os.getenv("RECURRENCE_CACHE_SIZE", "4096"))
+# Occurrences cached per series and window; later ones are generated on demand
+RECURRENCE_CACHE_OCCURRENCES = int(os.getenv("RECURRENCE_CACHE_OCCURRENCES", "100"))
+
+_occurrence_cache = LRUCache(maxsize=RECURRENCE_CACHE_SIZE)
+
+logger = logging.getLogger(__name__)
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if value is not None and not isinstance(value, datetime):
+        value = isoparse(value)
+    return to_naive_utc(value)
+
+def expandable_pattern(pattern: Optional[dict]) -> Optional[dict]:
+    """`pattern` if it is valid, else None (logged) so the event expands as a
+    single instance."""
+    if not pattern:
+        return None
+    try:
+        return validate_recurrence_pattern(pattern)
+    except ValueError as exc:
+        logger.warning("Ignoring invalid recurrence pattern %r: %s", pattern, exc)
+        return None
+
+def _candidates(start: datetime, pattern: dict, not_before: datetime) -> Iterator[Tuple[int, datetime]]:
+    """Yield (occurrence number, start) pairs in order, beginning at the first
+    period whose occurrences may start at or after `not_before`."""
+    frequency = pattern.get("frequency", pattern.get("freq"))
+    interval = max(int(pattern.get("interval") or 1), 1)
+
+    if frequency == "daily":
+        step = timedelta(days=interval)
+        n = max(0, (not_before - start) // step) if not_before > start else 0
+        while True:
+            yield n, start + n * step
+            n += 1
+
+    elif frequency == "weekly":
+        weekdays = sorted(set(pattern.get("weekdays") or [start.weekday()]))
+        week_start = start - timedelta(days=start.weekday())
+        first_week = [day for day in weekdays if day >= start.weekday()]
+        step = timedelta(weeks=interval)
+        period = max(0, (not_before - week_start) // step) if not_before > week_start else 0
+        while True:
+            days = first_week if period == 0 else weekdays
+            base = 0 if period == 0 else len(first_week) + (period - 1) * len(weekdays)
+            for offset, day in enumerate(days):
+                yield base + offset, week_start + period * step + timedelta(days=day)
+            period += 1
+
+    elif frequency == "monthly":
+        months = (not_before.year - start.year) * 12 + not_before.month - start.month
+        n = max(0, months // interval - 1)
+        while True:
+            yield n, start + relativedelta(months=n * interval)
+            n += 1
+
+    else:
+        yield 0, start
+
+def occurrences(
+    start: datetime,
+    end: datetime,
+    pattern: Optional[dict],
+    window_start: datetime,
+    window_end: datetime
+) -> Iterator[Tuple[datetime, datetime]]:
+    """Yield (start, end) of every occurrence overlapping [window_start, window_end)."""
+    duration = end - start
+    pattern = expandable_pattern(pattern)
+    if not pattern:
+        if start < window_end and end > window_start:
+            yield start, end
+        return
+
+    count = pattern.get("count")
+    until = _parse_datetime(pattern.get("until"))
+    exceptions = {_parse_datetime(value) for value in pattern.get("exceptions") or ()}
+
+    for number, occurrence_start in _candidates(start, pattern, window_start - duration):
+        if count is not None and number >= count:
+            return
+        if until is not None and occurrence_start > until:
+            return
+        if occurrence_start >= window_end:
+            return
+        if occurrence_start < start or occurrence_start in exceptions:
+            continue
+        if occurrence_start + duration > window_start:
+            yield occurrence_start, occurrence_start + duration
+
+def last_end(start: datetime, end: datetime, pattern: Optional[dict]) -> Optional[datetime]:
+    """An upper bound on the end of the last occurrence, or None when the
+    series never ends. Cheap: it never walks the series."""
+    duration = end - start
+    pattern = expandable_pattern(pattern)
+    if not pattern:
+        return end
+    bounds = []
+    until = _parse_datetime(pattern.get("until"))
+    if until is not None:
+        bounds.append(max(until, start) + duration)
+    count = pattern.get("count")
+    if count is not None:
+        frequency = pattern.get("frequency", pattern.get("freq"))
+        interval = max(int(pattern.get("interval") or 1), 1)
+        try:
+            if frequency == "daily":
+                bounds.append(start + timedelta(days=(count - 1) * interval) + duration)
+            elif frequency == "weekly":
+                # The first week may hold fewer occurrences; allow one more
+                per_week = len(set(pattern.get("weekdays") or [start.weekday()]))
+                weeks = (-(-count // per_week) + 1) * interval
+                bounds.append(start - timedelta(days=start.weekday()) + timedelta(weeks=weeks) + duration)
+            elif frequency == "monthly":
+                bounds.append(start + relativedelta(months=(count - 1) * interval) + duration)
+        except (OverflowError, ValueError):
+            pass
+    return min(bounds) if bounds else None
+
+def event_occurrences(event, window_start: datetime, window_end: datetime) -> Iterator[Tuple[datetime, datetime]]:
+    """Expansion of an Event within a window, in start order.
+
+    The first RECURRENCE_CACHE_OCCURRENCES occurrences are cached, keyed by
+    (event_id, updated_at, window), so an edit to the event naturally stops
+    old expansions from being served; the rest are generated as they are read.
+    """
+    pattern = event.recurrence_pattern if event.is_recurring else None
+    key = (event.id, event.updated_at, window_start, window_end)
+    cached = _occurrence_cache.get(key)
+    if cached is None:
+        expansion = occurrences(event.start_time, event.end_time, pattern, window_start, window_end)
+        prefix = tuple(islice(expansion, RECURRENCE_CACHE_OCCURRENCES + 1))
+        cached = (prefix[:RECURRENCE_CACHE_OCCURRENCES], len(prefix) <= RECURRENCE_CACHE_OCCURRENCES)
+        _occurrence_cache.set(key, cached)
+    prefix, complete = cached
+    if complete:
+        return iter(prefix)
+    rest = occurrences(event.start_time, event.end_time, pattern, window_start, window_end)
+    return chain(prefix, islice(rest, len(prefix), None))
+
+class Occurrence:
+    """A single instance of a recurring event; reads through to the event for
+    every attribute except its own start and end time."""
+
+    def __init__(self, event, start_time: datetime, end_time: datetime):
+        self._event = event
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def __getattr__(self, name):
+        return getattr(self._event, name)
@@ -0,0 +1,147 @@
+"""Meeting-slot finder: the earliest common free slots of a group.
+
+Everything is interval arithmetic over NumPy arrays of epoch seconds, so the
+cost is a few sorts and linear passes over all participants' intervals
+instead of Python loops over every event:
+
+1. Non-working time inside the search window (outside the working hours,
+   or on excluded weekdays) is turned into blocked intervals.
+2. Participants' busy intervals and the non-working ones are merged into
+   disjoint blocks: sort by start, running maximum of ends, and a new
+   block wherever a start passes the running maximum.
+3. The gaps between blocks are the common free time; each gap yields
+   slot starts on the granularity grid, and the first k are returned.
+
+Times are naive, on the same clock as stored events, and so are the
+working hours.
+"""
+from datetime import datetime, time, timedelta
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Sequence, Tuple
+from app.services.availability import busy_intervals, visible_users
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+DAY = 86400
+WORKDAYS = (0, 1, 2, 3, 4)
+
+def to_epoch(values: Sequence[datetime]) -> np.ndarray:
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+def from_epoch(seconds: int) -> datetime:
+    return EPOCH + timedelta(seconds=int(seconds))
+
+def _seconds_of_day(value: time) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+def non_working_intervals(
+    window_start: int,
+    window_end: int,
+    work_start: time,
+    work_end: time,
+    weekdays: Iterable[int] = WORKDAYS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Blocked (start, end) arrays covering everything in the window that is
+    not inside the daily [work_start, work_end) on one of `weekdays`."""
+    days = np.arange(window_start // DAY, window_end // DAY + 1, dtype=np.int64)
+    # 1970-01-01 was a Thursday (weekday 3)
+    days = days[np.isin((days + 3) % 7, list(weekdays))]
+    open_at = days * DAY + _seconds_of_day(work_start)
+    close_at = days * DAY + _seconds_of_day(work_end)
+    return np.r_[window_start, close_at], np.r_[open_at, window_end]
+
+def merge_blocks(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Union of [start, end) intervals as sorted disjoint blocks."""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts = starts[order]
+    reach = np.maximum.accumulate(ends[order])
+    opens = np.empty(len(starts), dtype=bool)
+    opens[0] = True
+    opens[1:] = starts[1:] > reach[:-1]
+    first = np.flatnonzero(opens)
+    last = np.r_[first[1:] - 1, len(starts) - 1]
+    return starts[first], reach[last]
+
+def find_slots(
+    busy_starts: np.ndarray,
+    busy_ends: np.ndarray,
+    window_start: int,
+    window_end: int,
+    duration: int,
+    limit: int = 5,
+    granularity: int = 900,
+    work_start: Optional[time] = time(9),
+    work_end: Optional[time] = time(17),
+    weekdays: Iterable[int] = WORKDAYS
+) -> List[Tuple[int, int]]:
+    """Earliest `limit` slots of `duration` seconds, starting on multiples of
+    `granularity`, inside the window and working hours and clear of every
+    busy interval. All times are epoch seconds; returns (start, end) pairs.
+    Without work_start/work_end the whole window is eligible.
+    """
+    busy_starts = np.asarray(busy_starts, dtype=np.int64)
+    busy_ends = np.asarray(busy_ends, dtype=np.int64)
+    # Zero-length events block nothing
+    keep = busy_ends > busy_starts
+    starts, ends = [busy_starts[keep]], [busy_ends[keep]]
+    if work_start is not None and work_end is not None:
+        closed_starts, closed_ends = non_working_intervals(window_start, window_end, work_start, work_end, weekdays)
+        starts.append(closed_starts)
+        ends.append(closed_ends)
+    block_starts, block_ends = merge_blocks(np.concatenate(starts), np.concatenate(ends))
+
+    free_starts = np.maximum(np.r_[window_start, block_ends], window_start)
+    free_ends = np.minimum(np.r_[block_starts, window_end], window_end)
+
+    first_slot = -(-free_starts // granularity) * granularity
+    counts = np.maximum((free_ends - duration - first_slot) // granularity + 1, 0)
+    total = np.cumsum(counts)
+    if not len(total) or total[-1] == 0:
+        return []
+    needed = min(limit, int(total[-1]))
+    used = int(np.searchsorted(total, needed)) + 1
+    counts = counts[:used]
+    offsets = np.arange(int(counts.sum())) - np.repeat(total[:used] - counts, counts)
+    slot_starts = (np.repeat(first_slot[:used], counts) + offsets * granularity)[:needed]
+    return [(int(start), int(start) + duration) for start in slot_starts]
+
+def find_meeting_slots(
+    db: Session,
+    user_id: int,
+    user_ids: List[int],
+    start: datetime,
+    end: datetime,
+    duration: timedelta,
+    limit: int = 5,
+    granularity: timedelta = timedelta(minutes=15),
+    work_start: Optional[time] = time(9),
+    work_end: Optional[time] = time(17),
+    weekdays: Iterable[int] = WORKDAYS
+):
+    """Return (slots, hidden): the earliest common free slots as datetime
+    pairs, or the participants `user_id` may not see (slots is then None)."""
+    hidden = set(user_ids) - visible_users(db, user_id, user_ids)
+    if hidden:
+        return None, sorted(hidden)
+
+    intervals = [
+        interval
+        for user_intervals in busy_intervals(db, user_ids, start, end).values()
+        for interval in user_intervals
+    ]
+    busy = to_epoch([value for interval in intervals for value in interval]).reshape(-1, 2)
+    slots = find_slots(
+        busy[:, 0],
+        busy[:, 1],
+        int(to_epoch([start])[0]),
+        int(to_epoch([end])[0]),
+        int(duration.total_seconds()),
+        limit=limit,
+        granularity=int(granularity.total_seconds()),
+        work_start=work_start,
+        work_end=work_end,
+        weekdays=weekdays
+    )
+    return [(from_epoch(slot_start), from_epoch(slot_end)) for slot_start, slot_end in slots], []
@@ -0,0 +1,226 @@
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List
+from app.models import Event, EventPermission, User, UserRole
+from app.services.acl import invalidate_access, role_name
+from app.services.conflict_index import conflict_indexes
+from app.services.event_service import bump_calendar_versions
+from app.services.notifications import event_audience, event_audiences, notify
+import os
+
+# Upper bound on events x users in one bulk grant or revoke
+BULK_SHARE_MAX_PAIRS = int(os.getenv("BULK_SHARE_MAX_PAIRS", "50000"))
+
+# Columns behind PermissionOut, in its field order
+PERMISSION_OUT_COLUMNS = (
+    EventPermission.user_id,
+    EventPermission.role,
+    EventPermission.id,
+    EventPermission.granted_at,
+)
+
+def _notify_permission_change(db: Session, event_id: int, user_id: int, role):
+    # The affected user hears about it even when they just lost access
+    audience = set(event_audience(db, event_id)) | {user_id}
+    notify(db, audience, {
+        "type": "permission.changed",
+        "event_id": event_id,
+        "user_id": user_id,
+        "role": role_name(role),
+    })
+
+def share_event(db: Session, event_id: int, user_id: int, role: str):
+    """Grant or change `user_id`'s role on an event. Raises LookupError when
+    the event or the user does not exist."""
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise LookupError("Event not found")
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise LookupError("User not found")
+
+    existing = db.query(EventPermission).filter(
+        EventPermission.event_id == event_id,
+        EventPermission.user_id == user_id
+    ).first()
+
+    if existing:
+        existing.role = role
+    else:
+        existing = EventPermission(
+            event_id=event_id,
+            user_id=user_id,
+            role=role
+        )
+        db.add(existing)
+
+    bump_calendar_versions(db, user_ids=[user_id])
+    _notify_permission_change(db, event_id, user_id, role)
+    db.commit()
+    invalidate_access(event_id, user_id)
+    conflict_indexes.event_added(user_id, event)
+    return existing
+
+def list_permissions(db: Session, event_id: int):
+    return db.query(*PERMISSION_OUT_COLUMNS).filter(
+        EventPermission.event_id == event_id
+    ).all()
+
+def update_permission(db: Session, event_id: int, user_id: int, role: str):
+    db_permission = db.query(EventPermission).filter(
+        EventPermission.event_id == event_id,
+        EventPermission.user_id == user_id
+    ).first()
+
+    if not db_permission:
+        return None
+
+    db_permission.role = role
+    bump_calendar_versions(db, user_ids=[user_id])
+    _notify_permission_change(db, event_id, user_id, role)
+    db.commit()
+    invalidate_access(event_id, user_id)
+    return db_permission
+
+def remove_permission(db: Session, event_id: int, user_id: int):
+    db.query(EventPermission).filter(
+        EventPermission.event_id == event_id,
+        EventPermission.user_id == user_id
+    ).delete()
+    bump_calendar_versions(db, user_ids=[user_id])
+    _notify_permission_change(db, event_id, user_id, None)
+    db.commit()
+    invalidate_access(event_id, user_id)
+    conflict_indexes.event_removed(event_id, user_id)
+
+def _upsert(db: Session):
+    dialect = db.get_bind().dialect.name
+    return (postgresql if dialect == "postgresql" else sqlite).insert(EventPermission)
+
+def _notify_bulk_change(db: Session, audiences: Dict[int, set], changed: Dict[int, List[int]], role):
+    # One message per event rather than per (event, user) pair
+    for event_id, user_ids in changed.items():
+        notify(db, audiences[event_id] | set(user_ids), {
+            "type": "permission.changed",
+            "event_id": event_id,
+            "user_ids": user_ids,
+            "role": role_name(role),
+        })
+
+def bulk_share(db: Session, event_ids: Iterable[int], user_ids: Iterable[int], role: str) -> dict:
+    """Grant `role` to every user on every event in one transaction. Events
+    and users are validated with one IN query each, existing grants are read
+    with a third, and all changes are written as one multi-row upsert.
+    Raises LookupError naming the events or users that do not exist.
+    Returns a summary of how many grants were created, updated or unchanged.
+    """
+    event_ids = list(dict.fromkeys(event_ids))
+    user_ids = list(dict.fromkeys(user_ids))
+    role = UserRole(role)
+
+    events = db.scalars(select(Event).where(Event.id.in_(event_ids))).all()
+    missing = set(event_ids) - {event.id for event in events}
+    if missing:
+        raise LookupError(f"Events not found: {', '.join(map(str, sorted(missing)))}")
+    missing = set(user_ids) - set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+    if missing:
+        raise LookupError(f"Users not found: {', '.join(map(str, sorted(missing)))}")
+
+    audiences = event_audiences(db, event_ids)
+    current = dict(
+        ((event_id, user_id), existing_role)
+        for event_id, user_id, existing_role in db.execute(
+            select(EventPermission.event_id, EventPermission.user_id, EventPermission.role).where(
+                EventPermission.event_id.in_(event_ids),
+                EventPermission.user_id.in_(user_ids)
+            )
+        )
+    )
+
+    summary = {"events": len(event_ids), "users": len(user_ids), "created": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    rows = []
+    changed = {}
+    for event_id in event_ids:
+        for user_id in user_ids:
+            existing = current.get((event_id, user_id))
+            if existing is None:
+                summary["created"] += 1
+            elif role_name(existing) != role.value:
+                summary["updated"] += 1
+            else:
+                summary["unchanged"] += 1
+                continue
+            rows.append({"event_id": event_id, "user_id": user_id, "role": role})
+            changed.setdefault(event_id, []).append(user_id)
+
+    if not rows:
+        return summary
+
+    try:
+        statement = _upsert(db)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["event_id", "user_id"],
+                set_={"role": statement.excluded.role}
+            ),
+            rows
+        )
+        bump_calendar_versions(db, user_ids={row["user_id"] for row in rows})
+        _notify_bulk_change(db, audiences, changed, role)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for event in events:
+        for user_id in changed.get(event.id, ()):
+            invalidate_access(event.id, user_id)
+            conflict_indexes.event_added(user_id, event)
+    return summary
+
+def bulk_revoke(db: Session, event_ids: Iterable[int], user_ids: Iterable[int]) -> dict:
+    """Remove every listed user's role on every listed event with one DELETE.
+    Returns a summary of how many grants were removed; pairs without a grant
+    count as unchanged."""
+    event_ids = list(dict.fromkeys(event_ids))
+    user_ids = list(dict.fromkeys(user_ids))
+    audiences = event_audiences(db, event_ids)
+    changed = {}
+    for event_id, audience in audiences.items():
+        removed = [user_id for user_id in user_ids if user_id in audience]
+        if removed:
+            changed[event_id] = removed
+
+    removed = sum(len(users) for users in changed.values())
+    summary = {
+        "events": len(event_ids),
+        "users": len(user_ids),
+        "created": 0,
+        "updated": 0,
+        "removed": removed,
+        "unchanged": len(event_ids) * len(user_ids) - removed,
+    }
+    if not changed:
+        return summary
+
+    try:
+        db.execute(
+            delete(EventPermission).where(
+                EventPermission.event_id.in_(list(changed)),
+                EventPermission.user_id.in_(user_ids)
+            ).execution_options(synchronize_session=False)
+        )
+        bump_calendar_versions(db, user_ids={user_id for users in changed.values() for user_id in users})
+        _notify_bulk_change(db, audiences, changed, None)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for event_id, users in changed.items():
+        for user_id in users:
+            invalidate_access(event_id, user_id)
+            conflict_indexes.event_removed(event_id, user_id)
+    return summary
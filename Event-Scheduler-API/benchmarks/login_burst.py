@@ -0,0 +1,83 @@
+"""Read latency while a burst of logins is hashing passwords.
+
+    python -m benchmarks.login_burst --logins 64 --reads 400
+
+Runs the app in-process against a throwaway SQLite database and reports
+p50/p99 of GET /api/events/ on its own and during a concurrent login burst.
+With hashing offloaded to the dedicated pool the medians stay level and the
+pool statistics show how deep the hashing queue got. How close the p99s stay
+depends on spare cores: with a single CPU every hash still takes the one core
+from the request threads for a scheduler slice at a time, and the p99 during
+the burst ends up about 1.5-2x the quiet one whatever PASSWORD_HASH_NICE is.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def timed_reads(client, headers, count, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get("/api/events/", headers=headers)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    await asyncio.gather(*(read() for _ in range(count)))
+    return latencies
+
+async def main(args):
+    import httpx
+    from app.main import app
+    from app.auth import get_password_hash, password_hasher
+    from app.database import SessionLocal
+    from app.models import User
+
+    db = SessionLocal()
+    db.add(User(username="bench", email="bench@example.com", hashed_password=get_password_hash("bench")))
+    db.commit()
+    db.close()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/api/auth/login", data={"username": "bench", "password": "bench"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        quiet = await timed_reads(client, headers, args.reads, args.concurrency)
+
+        logins = [
+            client.post("/api/auth/login", data={"username": "bench", "password": "bench"})
+            for _ in range(args.logins)
+        ]
+        burst = asyncio.gather(*logins)
+        loaded = await timed_reads(client, headers, args.reads, args.concurrency)
+        statuses = [response.status_code for response in await burst]
+
+    print(f"reads without logins: p50={statistics.median(quiet) * 1000:.1f}ms p99={percentile(quiet, 0.99) * 1000:.1f}ms")
+    print(f"reads during burst:   p50={statistics.median(loaded) * 1000:.1f}ms p99={percentile(loaded, 0.99) * 1000:.1f}ms")
+    print(f"login statuses: {dict((code, statuses.count(code)) for code in set(statuses))}")
+    print(f"hasher: {password_hasher.stats()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--reads", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.chdir(tempfile.mkdtemp(prefix="login-burst-"))
+    # Measures the hashing pool, not the limiter: one client sends every request
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("SHED_ENABLED", "0")
+    asyncio.run(main(args))
@@ -0,0 +1,127 @@
+"""Deterministic benchmark dataset, written straight to the database.
+
+Users, events, shares and history rows are inserted with multi-row Core
+INSERTs rather than through the API, so a dataset of tens of thousands of
+events with deep histories takes seconds to build. The rows look exactly
+like ones the API writes: every event has an owner permission, a version-1
+"create" row and `history_depth - 1` title updates, with snapshots at the
+configured interval.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+import random
+
+SEED_PASSWORD = "bench"
+SEED_START = datetime(2030, 1, 6, 9)  # a Sunday; events land on every day
+
+@dataclass
+class Dataset:
+    users: List[int]
+    tokens: Dict[int, str]
+    owned: Dict[int, List[int]] = field(default_factory=dict)
+    times: Dict[int, Tuple[datetime, datetime]] = field(default_factory=dict)
+    history_depth: int = 1
+
+def _chunks(rows, size=2000):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+def seed(
+    users: int = 20,
+    events_per_user: int = 100,
+    shares: int = 2,
+    history_depth: int = 10,
+    random_seed: int = 1
+) -> Dataset:
+    """Populate the app's database and return ids and access tokens. Each
+    event is shared with `shares` other users as viewer or editor."""
+    from sqlalchemy import insert
+    from app.auth import create_access_token, get_password_hash
+    from app.database import Base, SessionLocal, engine
+    from app.models import Event, EventChange, EventPermission, User, UserRole
+    from app.services.event_service import build_change_diff
+    from app.services.history_store import event_state, is_snapshot_version
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(random_seed)
+    history_depth = max(history_depth, 1)
+    hashed = get_password_hash(SEED_PASSWORD)
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        # Ids come back sorted rather than with sort_by_parameter_order,
+        # which SQLite can only honour by inserting row by row
+        user_ids = sorted(db.scalars(
+            insert(User).returning(User.id),
+            [
+                {"username": f"bench{n}", "email": f"bench{n}@example.com", "hashed_password": hashed, "created_at": now}
+                for n in range(users)
+            ]
+        ).all())
+
+        events = []
+        for user_id in user_ids:
+            for n in range(events_per_user):
+                start = SEED_START + timedelta(hours=3 * n + rng.randrange(3))
+                events.append({
+                    "title": f"Event {user_id}-{n} v{history_depth}",
+                    "description": "Seeded for benchmarks",
+                    "start_time": start,
+                    "end_time": start + timedelta(minutes=rng.choice((30, 60, 90))),
+                    "location": rng.choice((None, "Room A", "Room B")),
+                    "is_recurring": False,
+                    "recurrence_pattern": None,
+                    "created_by": user_id,
+                    "created_at": now,
+                    "updated_at": now,
+                    "version": history_depth,
+                })
+        event_ids = []
+        for chunk in _chunks(events):
+            event_ids.extend(sorted(db.scalars(insert(Event).returning(Event.id), chunk).all()))
+
+        permissions = []
+        changes = []
+        dataset = Dataset(users=list(user_ids), tokens={}, history_depth=history_depth)
+        for event_id, event in zip(event_ids, events):
+            owner = event["created_by"]
+            dataset.owned.setdefault(owner, []).append(event_id)
+            dataset.times[event_id] = (event["start_time"], event["end_time"])
+            permissions.append({"event_id": event_id, "user_id": owner, "role": UserRole.OWNER, "granted_at": now})
+            others = [user_id for user_id in user_ids if user_id != owner]
+            for user_id in rng.sample(others, min(shares, len(others))):
+                role = rng.choice((UserRole.VIEWER, UserRole.EDITOR))
+                permissions.append({"event_id": event_id, "user_id": user_id, "role": role, "granted_at": now})
+
+            state = dict(event, title=event["title"].rsplit(" v", 1)[0] + " v1")
+            for version in range(1, history_depth + 1):
+                if version == 1:
+                    change_type, diff = "create", build_change_diff("create", {}, event_state(SimpleNamespace(**state)))
+                else:
+                    title = state["title"].rsplit(" v", 1)[0] + f" v{version}"
+                    change_type, diff = "update", build_change_diff("update", {"title": state["title"]}, {"title": title})
+                    state["title"] = title
+                changes.append({
+                    "event_id": event_id,
+                    "user_id": owner,
+                    "version": version,
+                    "change_type": change_type,
+                    "changes": diff,
+                    "snapshot": event_state(SimpleNamespace(**state)) if is_snapshot_version(version) else None,
+                    "changed_at": now,
+                })
+        for chunk in _chunks(permissions):
+            db.execute(insert(EventPermission), chunk)
+        for chunk in _chunks(changes):
+            db.execute(insert(EventChange), chunk)
+        db.commit()
+    finally:
+        db.close()
+
+    dataset.tokens = {
+        user_id: create_access_token({"sub": f"bench{n}"}, timedelta(hours=12))
+        for n, user_id in enumerate(dataset.users)
+    }
+    return dataset
@@ -0,0 +1,107 @@
+"""Meeting-slot search over a large group.
+
+    python -m benchmarks.slot_finder --participants 100 --days 365
+
+Generates a year of random meetings for every participant and times the
+vectorized finder in app.services.scheduling against a plain Python sweep
+(merge_intervals, then walk the gaps slot by slot) over the same input.
+Both must return the same slots. With a hundred participants common
+openings are rare, so the search typically scans far into the year.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time as clock
+from datetime import datetime, time
+
+def synthetic_calendars(participants, days, per_week, seed):
+    """Busy (start, end) epoch-second lists: on average `per_week` meetings
+    of 30-120 minutes per participant and week, between 08:00 and 18:00."""
+    from app.services.scheduling import DAY, WORKDAYS
+    rng = random.Random(seed)
+    first_day = (datetime(2024, 1, 1) - datetime(1970, 1, 1)).days
+    starts, ends = [], []
+    for _ in range(participants):
+        for day in range(first_day, first_day + days):
+            if (day + 3) % 7 not in WORKDAYS:
+                continue
+            for _ in range(sum(rng.random() < per_week / 20 for _ in range(4))):
+                start = day * DAY + rng.randrange(8 * 3600, 18 * 3600, 900)
+                starts.append(start)
+                ends.append(start + rng.choice((1800, 3600, 5400, 7200)))
+    return first_day * DAY, (first_day + days) * DAY, starts, ends
+
+def python_slots(starts, ends, window_start, window_end, duration, limit, granularity, work_start, work_end):
+    from app.services.availability import merge_intervals
+    from app.services.scheduling import DAY, WORKDAYS
+    blocked = list(zip(starts, ends))
+    opens, closes = work_start.hour * 3600, work_end.hour * 3600
+    previous_close = window_start
+    for day in range(window_start // DAY, window_end // DAY + 1):
+        if (day + 3) % 7 in WORKDAYS:
+            blocked.append((previous_close, day * DAY + opens))
+            previous_close = day * DAY + closes
+    blocked.append((previous_close, window_end))
+
+    slots = []
+    free_from = window_start
+    for block_start, block_end in merge_intervals(blocked) + [(window_end, window_end)]:
+        slot = -(-max(free_from, window_start) // granularity) * granularity
+        while slot + duration <= min(block_start, window_end) and len(slots) < limit:
+            slots.append((slot, slot + duration))
+            slot += granularity
+        if len(slots) >= limit:
+            break
+        free_from = max(free_from, block_end)
+    return slots
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = clock.perf_counter()
+        result = function()
+        samples.append(clock.perf_counter() - started)
+    return result, samples
+
+def main(args):
+    import numpy as np
+    from app.services.scheduling import find_slots, from_epoch
+
+    window_start, window_end, starts, ends = synthetic_calendars(args.participants, args.days, args.per_week, args.seed)
+    print(f"{args.participants} participants, {args.days} days, {len(starts)} busy intervals")
+
+    options = dict(
+        duration=args.duration * 60,
+        limit=args.limit,
+        granularity=args.granularity * 60,
+        work_start=time(9),
+        work_end=time(17)
+    )
+    busy_starts, busy_ends = np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+    vectorized, fast = timed(lambda: find_slots(busy_starts, busy_ends, window_start, window_end, **options), args.repeat)
+    baseline, slow = timed(lambda: python_slots(starts, ends, window_start, window_end, **options), args.repeat)
+
+    if vectorized != baseline:
+        sys.exit(f"results differ:\n  numpy:  {vectorized}\n  python: {baseline}")
+    for start, end in vectorized:
+        print(f"  {from_epoch(start)} - {from_epoch(end).time()}")
+    print(f"numpy:  median {statistics.median(fast) * 1000:.1f}ms")
+    print(f"python: median {statistics.median(slow) * 1000:.1f}ms")
+    print(f"speedup: {statistics.median(slow) / statistics.median(fast):.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--per-week", type=float, default=1.5)
+    parser.add_argument("--duration", type=int, default=60, help="meeting length in minutes")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--granularity", type=int, default=15, help="slot grid in minutes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main(args)
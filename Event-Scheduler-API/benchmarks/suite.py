@@ -0,0 +1,601 @@
+"""Per-route throughput and latency, with regression gates.
+
+    python -m benchmarks.suite --users 20 --events-per-user 100 --requests 200
+    python -m benchmarks.suite --transport uvicorn --check benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --budgets
+
+Seeds a throwaway SQLite database (see benchmarks.seed), then sends each
+route `--requests` requests from `--concurrency` concurrent clients, either
+in-process through the ASGI transport or over HTTP to a uvicorn server on
+a local port, and reports requests per second and p50/p95/p99 latency.
+
+Results can be written as JSON (--output), saved into a baseline file
+(--save-baseline) or checked against one (--check). A route regresses when
+a percentile exceeds its baseline by more than the baseline's tolerance
+(and by more than min_slack_ms), when throughput falls by more than the
+tolerance, or when any request gets an unexpected status; --check then
+exits with status 1. Baselines are per machine: record one before a change
+and check after it, on the same host.
+
+Requests run with QUERY_BUDGET_MODE=raise, so a request that goes over its
+endpoint's query budget fails with a 500 and counts as an error. --budgets
+skips the timing and instead sends every route (all of ALL_ROUTE_NAMES by
+default) a few requests one at a time, in-process and with the app's caches
+disabled, so each request takes its cold path. It reports the most
+statements any request ran against the endpoint's budget, and exits with
+status 1 when one is over, or when an /api endpoint declares no budget.
+The notification stream and socket never finish, so they are left out.
+"""
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+DEFAULT_TOLERANCE = {"p50_ms": 0.5, "p95_ms": 0.5, "p99_ms": 1.0, "rps": 0.35}
+DEFAULT_MIN_SLACK_MS = 2.0
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+# New events go far past the seeded ones, one hour apart, so they never
+# conflict with anything
+CREATE_START = datetime(2040, 1, 1)
+BATCH_START = datetime(2045, 1, 1)
+MOVE_START = datetime(2050, 1, 1)
+BATCH_SIZE = 10
+
+ROUTE_NAMES = ("list", "read", "history", "diff", "create", "batch", "conflict", "update", "share", "rollback")
+# Every other endpoint, for --budgets. Order matters: the permission routes
+# change the grant that "share" made, and deletes come last
+ALL_ROUTE_NAMES = ROUTE_NAMES + (
+    "version",
+    "permissions",
+    "export",
+    "history_export",
+    "freebusy",
+    "slots",
+    "batch_update",
+    "update_permission",
+    "remove_permission",
+    "bulk_share",
+    "bulk_revoke",
+    "batch_delete",
+    "delete",
+    "refresh",
+    "logout",
+    "login",
+    "login_rehash",
+    "register",
+)
+BULK_SIZE = 5
+
+# Caches that save queries on repeat requests; --budgets turns them off
+COLD_CACHE_SETTINGS = (
+    "PRINCIPAL_CACHE_SIZE",
+    "ACL_CACHE_SIZE",
+    "CONFLICT_INDEX_MAX_USERS",
+    "HISTORY_STATE_CACHE_SIZE",
+    "HISTORY_DIFF_CACHE_SIZE",
+)
+
+class Form(dict):
+    """A request body sent as form fields rather than JSON."""
+
+def _stale_password_hash(user_id: int, password: str):
+    """Store a hash of `password` made with another bcrypt cost, so the next
+    login for the user also rewrites it."""
+    from passlib.hash import bcrypt
+    from app.auth import BCRYPT_ROUNDS
+    from app.database import SessionLocal
+    from app.models import User
+
+    rounds = BCRYPT_ROUNDS - 1 if BCRYPT_ROUNDS > 4 else BCRYPT_ROUNDS + 1
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.id == user_id).update({"hashed_password": bcrypt.using(rounds=rounds).hash(password)})
+        db.commit()
+    finally:
+        db.close()
+
+def _event_body(start: datetime, minutes: int = 30) -> dict:
+    return {
+        "title": "Benchmark event",
+        "description": "Created by the benchmark suite",
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(minutes=minutes)).isoformat(),
+    }
+
+def route_specs(data):
+    """name -> spec(i) returning (user_id, method, url, body, expected_status)
+    for the i-th request. Reads come first, so writes do not skew them."""
+    from benchmarks.seed import SEED_PASSWORD, SEED_START
+    users = data.users
+
+    def owner(i):
+        return users[i % len(users)]
+
+    def owned_event(i):
+        user_id = owner(i)
+        events = data.owned[user_id]
+        return user_id, events[(i // len(users)) % len(events)]
+
+    def other_user(i):
+        return users[(i + 1) % len(users)]
+
+    def spare_events(i, count, offset):
+        # Events no read touches, counted back from the end of the owner's
+        # list, for the routes that delete them
+        user_id = owner(i)
+        events = data.owned[user_id]
+        first = offset + (i // len(users)) * count
+        return user_id, [events[-1 - (first + n) % len(events)] for n in range(count)]
+
+    def week(i):
+        start = SEED_START + timedelta(days=7 * (i % 4))
+        return {"start": start.isoformat(), "end": (start + timedelta(days=7)).isoformat()}
+
+    def list_events(i):
+        return owner(i), "GET", "/api/events/?limit=100", None, 200
+
+    def read(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "GET", f"/api/events/{event_id}", None, 200
+
+    def history(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "GET", f"/api/events/{event_id}/history", None, 200
+
+    def diff(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "GET", f"/api/events/{event_id}/diff/1/{data.history_depth}", None, 200
+
+    def create(i):
+        return owner(i), "POST", "/api/events/", _event_body(CREATE_START + timedelta(hours=i)), 200
+
+    def batch(i):
+        events = [_event_body(BATCH_START + timedelta(hours=i * BATCH_SIZE + n)) for n in range(BATCH_SIZE)]
+        return owner(i), "POST", "/api/events/batch", {"events": events}, 200
+
+    def conflict(i):
+        user_id, event_id = owned_event(i)
+        start, _ = data.times[event_id]
+        return user_id, "POST", "/api/events/", _event_body(start + timedelta(minutes=10), 10), 409
+
+    def update(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "PUT", f"/api/events/{event_id}", {"title": f"Renamed {i}"}, 200
+
+    def share(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "POST", f"/api/events/{event_id}/share", {"user_id": other_user(i), "role": "viewer"}, 200
+
+    def rollback(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "POST", f"/api/events/{event_id}/rollback/1", None, 200
+
+    def version(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "GET", f"/api/events/{event_id}/history/{data.history_depth // 2 or 1}", None, 200
+
+    def permissions(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "GET", f"/api/events/{event_id}/permissions", None, 200
+
+    def export(i):
+        window = week(i)
+        return owner(i), "GET", f"/api/events/export?start_date={window['start']}&end_date={window['end']}", None, 200
+
+    def history_export(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "GET", f"/api/events/{event_id}/history/export", None, 200
+
+    def freebusy(i):
+        return owner(i), "POST", "/api/events/freebusy", {"user_ids": [owner(i), other_user(i)], **week(i)}, 200
+
+    def slots(i):
+        body = {"user_ids": [owner(i), other_user(i)], "duration_minutes": 30, **week(i)}
+        return owner(i), "POST", "/api/events/slots", body, 200
+
+    def batch_update(i):
+        # Moved to free hours of their own, so conflicts are checked but
+        # never found
+        user_id = owner(i)
+        events = data.owned[user_id]
+        first = (i // len(users)) * BULK_SIZE
+        items = []
+        for n in range(BULK_SIZE):
+            start = MOVE_START + timedelta(hours=i * BULK_SIZE + n)
+            items.append({
+                "id": events[(first + n) % len(events)],
+                "start_time": start.isoformat(),
+                "end_time": (start + timedelta(minutes=30)).isoformat(),
+            })
+        return user_id, "PATCH", "/api/events/batch", {"events": items}, 200
+
+    def update_permission(i):
+        # The grant made by the share route with the same index
+        user_id, event_id = owned_event(i)
+        return user_id, "PUT", f"/api/events/{event_id}/permissions/{other_user(i)}", {"user_id": other_user(i), "role": "editor"}, 200
+
+    def remove_permission(i):
+        user_id, event_id = owned_event(i)
+        return user_id, "DELETE", f"/api/events/{event_id}/permissions/{other_user(i)}", None, 200
+
+    def bulk_share(i):
+        user_id, event_ids = spare_events(i, BULK_SIZE, 0)
+        others = [users[(i + n) % len(users)] for n in range(1, 4)]
+        body = {"event_ids": event_ids, "user_ids": others, "role": "viewer"}
+        return user_id, "POST", "/api/events/permissions/bulk", body, 200
+
+    def bulk_revoke(i):
+        user_id, _, _, body, _ = bulk_share(i)
+        del body["role"]
+        return user_id, "POST", "/api/events/permissions/bulk/revoke", body, 200
+
+    def batch_delete(i):
+        # Past the events bulk_share used, which stay
+        user_id, event_ids = spare_events(i, BULK_SIZE, len(data.owned[owner(i)]) // 4)
+        return user_id, "DELETE", "/api/events/batch", {"event_ids": event_ids}, 200
+
+    def delete(i):
+        user_id, event_ids = spare_events(i, 1, len(data.owned[owner(i)]) // 2)
+        return user_id, "DELETE", f"/api/events/{event_ids[0]}", None, 200
+
+    def refresh(i):
+        return owner(i), "POST", "/api/auth/refresh", None, 200
+
+    def logout(i):
+        return owner(i), "POST", "/api/auth/logout", None, 200
+
+    def login(i):
+        body = Form(username=f"bench{i % len(users)}", password=SEED_PASSWORD)
+        return owner(i), "POST", "/api/auth/login", body, 200
+
+    def login_rehash(i):
+        user_id, method, url, body, expected = login(i)
+        _stale_password_hash(user_id, SEED_PASSWORD)
+        return user_id, method, url, body, expected
+
+    def register(i):
+        body = {"username": f"register{i}", "email": f"register{i}@example.com", "password": SEED_PASSWORD}
+        return owner(i), "POST", "/api/auth/register", body, 200
+
+    specs = {
+        "list": list_events,
+        "read": read,
+        "history": history,
+        "diff": diff,
+        "create": create,
+        "batch": batch,
+        "conflict": conflict,
+        "update": update,
+        "share": share,
+        "rollback": rollback,
+        "version": version,
+        "permissions": permissions,
+        "export": export,
+        "history_export": history_export,
+        "freebusy": freebusy,
+        "slots": slots,
+        "batch_update": batch_update,
+        "update_permission": update_permission,
+        "remove_permission": remove_permission,
+        "bulk_share": bulk_share,
+        "bulk_revoke": bulk_revoke,
+        "batch_delete": batch_delete,
+        "delete": delete,
+        "refresh": refresh,
+        "logout": logout,
+        "login": login,
+        "login_rehash": login_rehash,
+        "register": register,
+    }
+    return {name: specs[name] for name in ALL_ROUTE_NAMES}
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(latencies, elapsed, errors) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+def send(client, token, method, url, body):
+    payload = {"data": body} if isinstance(body, Form) else {"json": body}
+    return client.request(method, url, headers={"Authorization": f"Bearer {token}"}, **payload)
+
+async def run_route(client, spec, tokens, requests, concurrency, offset=0):
+    latencies = []
+    unexpected = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        user_id, method, url, body, expected = spec(offset + i)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send(client, tokens[user_id], method, url, body)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code != expected:
+            unexpected.append(f"{method} {url} -> {response.status_code} {response.text[:200]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, time.perf_counter() - started, unexpected
+
+@asynccontextmanager
+async def asgi_client(app, concurrency):
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    # The transport sends no lifespan events, so the app's startup and
+    # shutdown handlers (which close aiosqlite's threads) are run here
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            yield client
+    finally:
+        await app.router.shutdown()
+
+@asynccontextmanager
+async def uvicorn_client(app, concurrency):
+    import httpx
+    import socket
+    import threading
+    import uvicorn
+
+    sock = socket.socket()
+    # Inherited by accepted connections on Linux; without it Nagle plus
+    # delayed ACKs add ~40ms whenever headers and body are written apart
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        await asyncio.to_thread(thread.join)
+
+TRANSPORTS = {"asgi": asgi_client, "uvicorn": uvicorn_client}
+
+async def run_suite(args, data) -> dict:
+    from app.main import app
+
+    specs = route_specs(data)
+    selected = args.routes or list(ROUTE_NAMES)
+    results = {}
+    async with TRANSPORTS[args.transport](app, args.concurrency) as client:
+        for name in selected:
+            spec = specs[name]
+            # Warm-up requests use their own indexes, so creates stay unique
+            await run_route(client, spec, data.tokens, args.warmup, args.concurrency, offset=args.requests)
+            latencies, elapsed, unexpected = await run_route(
+                client, spec, data.tokens, args.requests, args.concurrency
+            )
+            results[name] = summarize(latencies, elapsed, len(unexpected))
+            for line in unexpected[:3]:
+                print(f"  unexpected: {line}", file=sys.stderr)
+    return results
+
+def endpoint_budget(app, method: str, url: str):
+    """The route template and declared query budget of the endpoint `url` hits."""
+    from starlette.routing import Match
+    from urllib.parse import urlsplit
+    scope = {"type": "http", "method": method, "path": urlsplit(url).path}
+    for route in app.routes:
+        if route.matches(scope)[0] == Match.FULL:
+            return route.path, getattr(route.endpoint, "query_budget", None)
+    return None, None
+
+def unbudgeted_endpoints(app) -> list:
+    from fastapi.routing import APIRoute
+    return [
+        f"{','.join(sorted(route.methods))} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.path.startswith("/api/") and not hasattr(route.endpoint, "query_budget")
+    ]
+
+async def check_budgets(names, data, requests) -> dict:
+    """Send each route `requests` requests one at a time and count the
+    statements each ran, less any the endpoint added to its budget with
+    extend_budget(). The app runs in this task, so the counter sees every
+    statement, threadpool calls included."""
+    from app.main import app
+    from app.query_budget import count_queries
+
+    specs = route_specs(data)
+    results = {}
+    async with asgi_client(app, 1) as client:
+        for name in names:
+            counts = []
+            unexpected = []
+            for i in range(requests):
+                user_id, method, url, body, expected = specs[name](i)
+                with count_queries() as counter:
+                    response = await send(client, data.tokens[user_id], method, url, body)
+                    # Streaming bodies run their queries while being read
+                    await response.aread()
+                # Statements the endpoint added to its budget as it went
+                # (per batch chunk, say) are not counted against it
+                counts.append(counter.queries - counter.extended)
+                if response.status_code != expected:
+                    unexpected.append(f"{method} {url} -> {response.status_code} {response.text[:300]}")
+            path, budget = endpoint_budget(app, method, url)
+            results[name] = {
+                "endpoint": f"{method} {path}",
+                "budget": budget,
+                "max_queries": max(counts),
+                "errors": len(unexpected),
+            }
+            for line in unexpected[:3]:
+                print(f"  unexpected: {line}", file=sys.stderr)
+    return results
+
+def budget_problems(results: dict, unbudgeted: list) -> list:
+    problems = [f"{endpoint}: no query budget" for endpoint in unbudgeted]
+    for name, result in results.items():
+        if result["errors"]:
+            problems.append(f"{name}: {result['errors']} unexpected responses")
+        if result["budget"] is not None and result["max_queries"] > result["budget"]:
+            problems.append(f"{name}: {result['max_queries']} queries > budget {result['budget']}")
+    return problems
+
+def print_budgets(results: dict):
+    print(f"{'route':<18} {'endpoint':<62} {'queries':>7} {'budget':>6}")
+    for name, result in results.items():
+        budget = "-" if result["budget"] is None else result["budget"]
+        print(f"{name:<18} {result['endpoint']:<62} {result['max_queries']:>7} {budget:>6}")
+
+def compare(routes: dict, baseline: dict, tolerance: dict, min_slack_ms: float):
+    """Return a list of human-readable regressions of `routes` against
+    `baseline` (both route -> summary)."""
+    regressions = []
+    for name, current in routes.items():
+        if current["errors"]:
+            regressions.append(f"{name}: {current['errors']} unexpected responses")
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        for metric in LATENCY_METRICS:
+            limit = max(expected[metric] * (1 + tolerance[metric]), expected[metric] + min_slack_ms)
+            if current[metric] > limit:
+                regressions.append(f"{name}: {metric} {current[metric]} > {limit:.2f} (baseline {expected[metric]})")
+        floor = expected["rps"] * (1 - tolerance["rps"])
+        if current["rps"] < floor:
+            regressions.append(f"{name}: rps {current['rps']} < {floor:.1f} (baseline {expected['rps']})")
+    return regressions
+
+def print_table(routes: dict):
+    print(f"{'route':<10} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, result in routes.items():
+        print(
+            f"{name:<10} {result['requests']:>8} {result['errors']:>6} {result['rps']:>8.1f} "
+            f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+        )
+
+def load_json(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def write_json(path: str, payload: dict):
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def main(args):
+    from benchmarks.seed import seed
+
+    params = {
+        "users": args.users,
+        "events_per_user": args.events_per_user,
+        "shares": args.shares,
+        "history_depth": args.history_depth,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+    }
+    started = time.perf_counter()
+    data = seed(args.users, args.events_per_user, args.shares, args.history_depth, args.seed)
+    print(
+        f"seeded {args.users} users x {args.events_per_user} events, {args.shares} shares each, "
+        f"history depth {args.history_depth} in {time.perf_counter() - started:.1f}s"
+    )
+    if args.budgets:
+        from app.main import app
+        results = asyncio.run(check_budgets(args.routes or ALL_ROUTE_NAMES, data, args.budget_requests))
+        print_budgets(results)
+        if args.output:
+            write_json(args.output, {"params": params, "budgets": results})
+        problems = budget_problems(results, unbudgeted_endpoints(app))
+        for problem in problems:
+            print(f"BUDGET {problem}")
+        if problems:
+            sys.exit(1)
+        print("every route is within its query budget")
+        return
+
+    print(f"transport: {args.transport}, {args.requests} requests per route, concurrency {args.concurrency}")
+
+    routes = asyncio.run(run_suite(args, data))
+    print_table(routes)
+    result = {"params": params, "transports": {args.transport: {"routes": routes}}}
+
+    if args.output:
+        write_json(args.output, result)
+    if args.save_baseline:
+        baseline = load_json(args.save_baseline) if os.path.exists(args.save_baseline) else {}
+        baseline.setdefault("tolerance", dict(DEFAULT_TOLERANCE))
+        baseline.setdefault("min_slack_ms", DEFAULT_MIN_SLACK_MS)
+        baseline["params"] = params
+        baseline.setdefault("transports", {})[args.transport] = {"routes": routes}
+        write_json(args.save_baseline, baseline)
+        print(f"baseline for {args.transport} saved to {args.save_baseline}")
+
+    if args.check:
+        baseline = load_json(args.check)
+        if baseline.get("params") != params:
+            print(f"warning: baseline was recorded with {baseline.get('params')}", file=sys.stderr)
+        expected = baseline.get("transports", {}).get(args.transport, {}).get("routes", {})
+        regressions = compare(
+            routes,
+            expected,
+            {**DEFAULT_TOLERANCE, **baseline.get("tolerance", {})},
+            baseline.get("min_slack_ms", DEFAULT_MIN_SLACK_MS)
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.check}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--events-per-user", type=int, default=100)
+    parser.add_argument("--shares", type=int, default=2, help="other users each event is shared with")
+    parser.add_argument("--history-depth", type=int, default=10, help="versions per seeded event")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="asgi")
+    parser.add_argument("--routes", nargs="+", choices=ALL_ROUTE_NAMES, help="subset of routes to run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--save-baseline", metavar="PATH", help="record results as the baseline for this transport")
+    parser.add_argument("--check", metavar="PATH", help="fail on regressions against a baseline")
+    parser.add_argument("--budgets", action="store_true", help="check query budgets instead of timing")
+    parser.add_argument("--budget-requests", type=int, default=3, help="requests per route for --budgets")
+    args = parser.parse_args()
+
+    # Paths are resolved before moving into the scratch directory
+    for option in ("output", "save_baseline", "check"):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    workdir = tempfile.mkdtemp(prefix="bench-suite-")
+    os.chdir(workdir)
+    # Always a fresh local database, never whatever DATABASE_URL points at
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.pop("DATABASE_READ_URL", None)
+    # One client sends every request; the limiter would only measure itself
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("SHED_ENABLED", "0")
+    os.environ.setdefault("QUERY_BUDGET_MODE", "raise")
+    if args.budgets:
+        for setting in COLD_CACHE_SETTINGS:
+            os.environ.setdefault(setting, "0")
+    main(args)
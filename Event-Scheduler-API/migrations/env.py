@@ -0,0 +1,31 @@
+"""Alembic environment: migrates the database the app is configured for.
+
+The app also runs Base.metadata.create_all at startup, which builds a new
+database at the current schema but never changes existing tables, so the
+migrations inspect what is already there and only add what is missing.
+That needs a live connection; offline (--sql) mode is not supported.
+"""
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+from app.database import SQLALCHEMY_DATABASE_URL, Base, is_sqlite
+import app.models  # registers the tables on Base.metadata
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+url = config.get_main_option("sqlalchemy.url") or SQLALCHEMY_DATABASE_URL
+
+if context.is_offline_mode():
+    raise SystemExit("These migrations inspect the database; run them against a live connection")
+
+engine = create_engine(url)
+try:
+    with engine.connect() as connection:
+        # SQLite cannot ALTER most constraints; batch mode rebuilds tables
+        context.configure(connection=connection, target_metadata=Base.metadata, render_as_batch=is_sqlite(url))
+        with context.begin_transaction():
+            context.run_migrations()
+finally:
+    engine.dispose()
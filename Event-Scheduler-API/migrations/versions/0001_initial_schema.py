@@ -0,0 +1,79 @@
+"""Initial schema: users, events, permissions and history.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# The tables as the first release created them; later columns and indexes
+# are added by the following revisions.
+
+def upgrade() -> None:
+    # Databases created by create_all already have these tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("username", sa.String),
+            sa.Column("email", sa.String),
+            sa.Column("hashed_password", sa.String),
+            sa.Column("created_at", sa.DateTime),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if "events" not in existing:
+        op.create_table(
+            "events",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("title", sa.String),
+            sa.Column("description", sa.String),
+            sa.Column("start_time", sa.DateTime),
+            sa.Column("end_time", sa.DateTime),
+            sa.Column("location", sa.String, nullable=True),
+            sa.Column("is_recurring", sa.Boolean),
+            sa.Column("recurrence_pattern", sa.JSON, nullable=True),
+            sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("updated_at", sa.DateTime),
+        )
+        op.create_index("ix_events_id", "events", ["id"])
+        op.create_index("ix_events_title", "events", ["title"])
+
+    if "event_permissions" not in existing:
+        op.create_table(
+            "event_permissions",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("event_id", sa.Integer, sa.ForeignKey("events.id")),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+            sa.Column("role", sa.Enum("OWNER", "EDITOR", "VIEWER", name="userrole")),
+            sa.Column("granted_at", sa.DateTime),
+        )
+        op.create_index("ix_event_permissions_id", "event_permissions", ["id"])
+
+    if "event_changes" not in existing:
+        op.create_table(
+            "event_changes",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("event_id", sa.Integer, sa.ForeignKey("events.id")),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+            sa.Column("version", sa.Integer),
+            sa.Column("change_type", sa.String),
+            sa.Column("changes", sa.JSON),
+            sa.Column("changed_at", sa.DateTime),
+        )
+        op.create_index("ix_event_changes_id", "event_changes", ["id"])
+
+def downgrade() -> None:
+    for table in ("event_changes", "event_permissions", "events", "users"):
+        op.drop_table(table)
@@ -0,0 +1,128 @@
+"""Event versions, history snapshots, calendar versions and unique grants.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+Brings a database created before these columns and indexes existed up to
+the current models:
+
+- events.version, backfilled from the latest history row of each event;
+- event_changes.snapshot (older rows replay from version 1);
+- users.calendar_version;
+- unique (event_id, version) on history, renumbering the versions of an
+  event that concurrent writes left with duplicates;
+- unique (event_id, user_id) on permissions, keeping the strongest grant
+  of each duplicate set;
+- AUTOINCREMENT on events under SQLite, so ids with history are never
+  handed out again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def _columns(inspector, table: str) -> set:
+    return {column["name"] for column in inspector.get_columns(table)}
+
+def _indexes(inspector, table: str) -> dict:
+    return {index["name"]: index for index in inspector.get_indexes(table)}
+
+def _ensure_index(inspector, name: str, table: str, columns: list, unique: bool = False):
+    index = _indexes(inspector, table).get(name)
+    if index is not None and bool(index["unique"]) == unique:
+        return
+    if index is not None:
+        op.drop_index(name, table_name=table)
+    op.create_index(name, table, columns, unique=unique)
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "calendar_version" not in _columns(inspector, "users"):
+        op.add_column("users", sa.Column("calendar_version", sa.Integer, nullable=False, server_default="0"))
+
+    if "snapshot" not in _columns(inspector, "event_changes"):
+        op.add_column("event_changes", sa.Column("snapshot", sa.JSON(none_as_null=True), nullable=True))
+
+    if not _indexes(inspector, "event_changes").get("ix_event_changes_event_id_version", {}).get("unique"):
+        # Versions were once allocated as MAX + 1 outside any lock; number
+        # each affected event's rows 1..n again, in their recorded order
+        op.execute("""
+            UPDATE event_changes SET version = (
+                SELECT ranked.position FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY event_id ORDER BY version, id) AS position
+                    FROM event_changes
+                ) AS ranked
+                WHERE ranked.id = event_changes.id
+            )
+            WHERE event_id IN (
+                SELECT event_id FROM event_changes GROUP BY event_id, version HAVING COUNT(*) > 1
+            )
+        """)
+    _ensure_index(inspector, "ix_event_changes_event_id_version", "event_changes", ["event_id", "version"], unique=True)
+
+    if "version" not in _columns(inspector, "events"):
+        op.add_column("events", sa.Column("version", sa.Integer, nullable=False, server_default="0"))
+        op.execute("""
+            UPDATE events SET version = COALESCE(
+                (SELECT MAX(event_changes.version) FROM event_changes WHERE event_changes.event_id = events.id),
+                0
+            )
+        """)
+    _ensure_index(inspector, "ix_events_start_time_id", "events", ["start_time", "id"])
+
+    # Keep one grant per user and event: the strongest role, then the newest
+    op.execute("""
+        DELETE FROM event_permissions WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY event_id, user_id
+                    ORDER BY CASE role WHEN 'OWNER' THEN 0 WHEN 'EDITOR' THEN 1 ELSE 2 END, id DESC
+                ) AS position
+                FROM event_permissions
+            ) AS ranked
+            WHERE ranked.position = 1
+        )
+    """)
+    _ensure_index(inspector, "ix_event_permissions_event_id", "event_permissions", ["event_id"])
+    _ensure_index(inspector, "ix_event_permissions_user_id", "event_permissions", ["user_id"])
+    _ensure_index(
+        inspector, "ix_event_permissions_event_id_user_id", "event_permissions", ["event_id", "user_id"], unique=True
+    )
+
+    if bind.dialect.name == "sqlite":
+        _sqlite_autoincrement_events(bind)
+
+def _sqlite_autoincrement_events(bind):
+    table_sql = bind.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'events'").scalar()
+    if "AUTOINCREMENT" in table_sql.upper():
+        return
+    # SQLite cannot add AUTOINCREMENT in place; batch mode copies the table
+    with op.batch_alter_table("events", recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+        pass
+    # Deleted events may have had higher ids than any left; their history
+    # still refers to them
+    highest = bind.exec_driver_sql(
+        "SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM events UNION ALL SELECT MAX(event_id) FROM event_changes)"
+    ).scalar()
+    if highest is not None:
+        bind.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'events'")
+        bind.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('events', ?)", (highest,))
+
+def downgrade() -> None:
+    op.drop_index("ix_event_permissions_event_id_user_id", table_name="event_permissions")
+    op.drop_index("ix_event_permissions_user_id", table_name="event_permissions")
+    op.drop_index("ix_event_permissions_event_id", table_name="event_permissions")
+    op.drop_index("ix_events_start_time_id", table_name="events")
+    op.drop_index("ix_event_changes_event_id_version", table_name="event_changes")
+    with op.batch_alter_table("events") as batch:
+        batch.drop_column("version")
+    with op.batch_alter_table("event_changes") as batch:
+        batch.drop_column("snapshot")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("calendar_version")
@@ -0,0 +1,46 @@
+"""Shared fixtures: the app running against a throwaway SQLite database."""
+import os
+import tempfile
+
+# Settings are read at import time, so they are set before the app is imported
+_db_dir = tempfile.mkdtemp(prefix="event-scheduler-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/events.db"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import itertools
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+_usernames = itertools.count()
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def auth_headers(client):
+    return register(client)
+
+def register(client) -> dict:
+    """Register a fresh user and return its Authorization header."""
+    return register_user(client)[1]
+
+def register_user(client) -> tuple:
+    """Register a fresh user and return (its id, its Authorization header)."""
+    username = f"user{next(_usernames)}"
+    response = client.post(
+        "/api/auth/register",
+        json={"username": username, "email": f"{username}@example.com", "password": "secret"}
+    )
+    assert response.status_code == 200, response.text
+    user_id = response.json()["id"]
+    response = client.post("/api/auth/login", data={"username": username, "password": "secret"})
+    assert response.status_code == 200, response.text
+    return user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def event_body(start: str, end: str, **fields) -> dict:
+    return {"title": "Meeting", "description": "Weekly sync", "start_time": start, "end_time": end, **fields}
@@ -0,0 +1,76 @@
+"""Every permission change invalidates the cached roles: the next request
+sees the new access, not the cached one."""
+import pytest
+from tests.conftest import event_body, register_user
+
+@pytest.fixture
+def owner_and_guest(client):
+    owner_id, owner = register_user(client)
+    guest_id, guest = register_user(client)
+    response = client.post("/api/events/", json=event_body("2038-01-04T09:00:00", "2038-01-04T10:00:00"), headers=owner)
+    assert response.status_code == 200, response.text
+    return response.json()["id"], owner, guest_id, guest
+
+def _share(client, event_id, owner, guest_id, role):
+    response = client.post(f"/api/events/{event_id}/share", json={"user_id": guest_id, "role": role}, headers=owner)
+    assert response.status_code == 200, response.text
+
+def _read(client, event_id, headers) -> int:
+    # Checked through the cached roles (GET /{event_id} joins the grants itself)
+    return client.get(f"/api/events/{event_id}/permissions", headers=headers).status_code
+
+def _rename(client, event_id, headers) -> int:
+    return client.put(f"/api/events/{event_id}", json={"title": "Renamed"}, headers=headers).status_code
+
+def test_share_grants_access_cached_as_none(client, owner_and_guest):
+    event_id, owner, guest_id, guest = owner_and_guest
+    assert _read(client, event_id, guest) == 403
+
+    _share(client, event_id, owner, guest_id, "viewer")
+    assert _read(client, event_id, guest) == 200
+
+def test_role_update_takes_effect_on_the_next_request(client, owner_and_guest):
+    event_id, owner, guest_id, guest = owner_and_guest
+    _share(client, event_id, owner, guest_id, "viewer")
+    assert _rename(client, event_id, guest) == 403
+
+    response = client.put(f"/api/events/{event_id}/permissions/{guest_id}", json={"user_id": guest_id, "role": "editor"}, headers=owner)
+    assert response.status_code == 200, response.text
+    assert _rename(client, event_id, guest) == 200
+
+    response = client.put(f"/api/events/{event_id}/permissions/{guest_id}", json={"user_id": guest_id, "role": "viewer"}, headers=owner)
+    assert response.status_code == 200, response.text
+    assert _rename(client, event_id, guest) == 403
+
+def test_revoke_removes_cached_access(client, owner_and_guest):
+    event_id, owner, guest_id, guest = owner_and_guest
+    _share(client, event_id, owner, guest_id, "viewer")
+    assert _read(client, event_id, guest) == 200
+
+    response = client.delete(f"/api/events/{event_id}/permissions/{guest_id}", headers=owner)
+    assert response.status_code == 200, response.text
+    assert _read(client, event_id, guest) == 403
+
+def test_bulk_revoke_removes_cached_access(client, owner_and_guest):
+    event_id, owner, guest_id, guest = owner_and_guest
+    _share(client, event_id, owner, guest_id, "editor")
+    assert _rename(client, event_id, guest) == 200
+
+    response = client.post(
+        "/api/events/permissions/bulk/revoke", json={"event_ids": [event_id], "user_ids": [guest_id]}, headers=owner
+    )
+    assert response.status_code == 200, response.text
+    assert _read(client, event_id, guest) == 403
+    assert _rename(client, event_id, guest) == 404
+
+def test_delete_removes_cached_access(client, owner_and_guest):
+    event_id, owner, guest_id, guest = owner_and_guest
+    _share(client, event_id, owner, guest_id, "viewer")
+    assert _read(client, event_id, guest) == 200
+    assert _read(client, event_id, owner) == 200
+
+    response = client.delete(f"/api/events/{event_id}", headers=owner)
+    assert response.status_code == 200, response.text
+    assert _read(client, event_id, guest) == 403
+    assert _read(client, event_id, owner) == 403
+    assert _rename(client, event_id, owner) == 404
@@ -0,0 +1,24 @@
+"""Bearer tokens stop working when they expire, cached or not."""
+from datetime import timedelta
+from jose import jwt
+from app.auth import ALGORITHM, SECRET_KEY, create_access_token
+import time
+
+def test_expired_token_is_rejected_after_being_cached(client, auth_headers, monkeypatch):
+    # East of UTC, reading utcnow() as local time stretched the cache lifetime
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    try:
+        token = auth_headers["Authorization"].split()[1]
+        username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["sub"]
+        short = create_access_token({"sub": username}, expires_delta=timedelta(seconds=1))
+        headers = {"Authorization": f"Bearer {short}"}
+        assert client.get("/api/events/", headers=headers).status_code == 200
+
+        expires_at = jwt.get_unverified_claims(short)["exp"]
+        # jose compares exp with whole seconds, so allow one more
+        time.sleep(max(0, expires_at + 1 - time.time()) + 0.2)
+        assert client.get("/api/events/", headers=headers).status_code == 401
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,16 @@
+"""Free/busy and slot requests accept windows given in any UTC offset."""
+from tests.conftest import event_body
+
+def test_freebusy_and_slots_with_aware_window(client, auth_headers):
+    body = event_body("2030-03-04T09:00:00", "2030-03-04T10:00:00")
+    event_id = client.post("/api/events/", json=body, headers=auth_headers).json()["id"]
+    user_id = client.get(f"/api/events/{event_id}", headers=auth_headers).json()["created_by"]
+    window = {"user_ids": [user_id], "start": "2030-03-04T10:00:00+02:00", "end": "2030-03-04T12:00:00Z"}
+
+    response = client.post("/api/events/freebusy", json=window, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["users"][0]["busy"] == [{"start": "2030-03-04T09:00:00", "end": "2030-03-04T10:00:00"}]
+
+    response = client.post("/api/events/slots", json={**window, "duration_minutes": 60, "limit": 2}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["slots"][0] == {"start": "2030-03-04T10:00:00", "end": "2030-03-04T11:00:00"}
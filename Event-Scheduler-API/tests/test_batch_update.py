@@ -0,0 +1,49 @@
+"""PATCH /api/events/batch only writes events still at the version it loaded."""
+from sqlalchemy import update
+from app.models import Event
+from app.services.conflict_index import conflict_indexes
+from tests.conftest import event_body
+
+def _create(client, headers, day):
+    body = event_body(f"2030-05-{day:02d}T09:00:00", f"2030-05-{day:02d}T10:00:00")
+    return client.post("/api/events/", json=body, headers=headers).json()["id"]
+
+def _concurrent_writer(monkeypatch, event_id):
+    # Conflicts are checked between loading the events and writing them, so
+    # a write made here lands in the window a concurrent request would use
+    def batch_conflicts(db, user_id, intervals, exclude=()):
+        db.execute(
+            update(Event).where(Event.id == event_id).values(version=Event.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        return set()
+    monkeypatch.setattr(conflict_indexes, "batch_conflicts", batch_conflicts)
+
+def _move(event_ids, mode):
+    return {
+        "mode": mode,
+        "events": [
+            {"id": event_id, "start_time": f"2030-06-{n + 1:02d}T09:00:00", "end_time": f"2030-06-{n + 1:02d}T10:00:00"}
+            for n, event_id in enumerate(event_ids)
+        ]
+    }
+
+def test_partial_batch_reports_concurrently_changed_event_as_stale(client, auth_headers, monkeypatch):
+    first, second = _create(client, auth_headers, 1), _create(client, auth_headers, 2)
+    _concurrent_writer(monkeypatch, first)
+
+    response = client.patch("/api/events/batch", json=_move([first, second], "partial"), headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [event["id"] for event in response.json()["updated"]] == [second]
+    assert [(error["index"], error["code"]) for error in response.json()["errors"]] == [(0, "stale")]
+
+    history = client.get(f"/api/events/{second}/history", headers=auth_headers).json()
+    assert [change["version"] for change in history] == [1, 2]
+
+def test_atomic_batch_with_stale_event_writes_nothing(client, auth_headers, monkeypatch):
+    first, second = _create(client, auth_headers, 3), _create(client, auth_headers, 4)
+    _concurrent_writer(monkeypatch, second)
+
+    response = client.patch("/api/events/batch", json=_move([first, second], "atomic"), headers=auth_headers)
+    assert response.status_code == 412, response.text
+    assert client.get(f"/api/events/{first}", headers=auth_headers).json()["start_time"] == "2030-05-03T09:00:00"
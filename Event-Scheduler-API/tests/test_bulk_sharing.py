@@ -0,0 +1,80 @@
+"""POST /api/events/permissions/bulk and /bulk/revoke: summary counts,
+and refusal of events the caller does not own."""
+import pytest
+from tests.conftest import event_body, register_user
+
+@pytest.fixture
+def calendar(client):
+    owner_id, owner = register_user(client)
+    event_ids = [
+        client.post("/api/events/", json=event_body(f"2040-01-0{day}T09:00:00", f"2040-01-0{day}T10:00:00"), headers=owner).json()["id"]
+        for day in (1, 2)
+    ]
+    user_ids = [register_user(client)[0] for _ in range(3)]
+    return owner_id, owner, event_ids, user_ids
+
+def _share(client, headers, event_ids, user_ids, role):
+    return client.post(
+        "/api/events/permissions/bulk", json={"event_ids": event_ids, "user_ids": user_ids, "role": role}, headers=headers
+    )
+
+def _revoke(client, headers, event_ids, user_ids):
+    return client.post("/api/events/permissions/bulk/revoke", json={"event_ids": event_ids, "user_ids": user_ids}, headers=headers)
+
+def _counts(response) -> tuple:
+    assert response.status_code == 200, response.text
+    summary = response.json()
+    return summary["created"], summary["updated"], summary["unchanged"], summary["removed"]
+
+def _grants(client, headers, event_id) -> dict:
+    permissions = client.get(f"/api/events/{event_id}/permissions", headers=headers).json()
+    return {permission["user_id"]: permission["role"] for permission in permissions}
+
+def test_bulk_share_counts(client, calendar):
+    owner_id, owner, event_ids, (first, second, third) = calendar
+
+    assert _counts(_share(client, owner, event_ids, [first, second], "viewer")) == (4, 0, 0, 0)
+    assert _counts(_share(client, owner, event_ids, [first, second, third], "editor")) == (2, 4, 0, 0)
+    assert _counts(_share(client, owner, event_ids, [first, second, third], "editor")) == (0, 0, 6, 0)
+    # Repeated ids count once
+    response = _share(client, owner, [event_ids[0], event_ids[0]], [first, first], "viewer")
+    assert _counts(response) == (0, 1, 0, 0)
+    assert (response.json()["events"], response.json()["users"]) == (1, 1)
+
+    assert _grants(client, owner, event_ids[0]) == {owner_id: "owner", first: "viewer", second: "editor", third: "editor"}
+    assert _grants(client, owner, event_ids[1]) == {owner_id: "owner", first: "editor", second: "editor", third: "editor"}
+
+def test_bulk_revoke_counts(client, calendar):
+    owner_id, owner, event_ids, (first, second, third) = calendar
+    _share(client, owner, event_ids, [first, second], "viewer")
+    _share(client, owner, event_ids[:1], [third], "viewer")
+
+    # `first` on both events and `third` on the first; `third` has nothing on the second
+    assert _counts(_revoke(client, owner, event_ids, [first, third])) == (0, 0, 1, 3)
+    assert _counts(_revoke(client, owner, event_ids, [first, third])) == (0, 0, 4, 0)
+    for event_id in event_ids:
+        assert _grants(client, owner, event_id) == {owner_id: "owner", second: "viewer"}
+
+def test_unknown_or_foreign_events_are_refused(client, calendar):
+    owner_id, owner, event_ids, (first, _, _) = calendar
+    _, other = register_user(client)
+    foreign = client.post("/api/events/", json=event_body("2040-01-05T09:00:00", "2040-01-05T10:00:00"), headers=other).json()["id"]
+    unknown = foreign + 100000
+
+    for refused in (unknown, foreign):
+        response = _share(client, owner, [event_ids[0], refused], [first], "viewer")
+        assert response.status_code == 403, response.text
+        assert str(refused) in response.json()["detail"]
+        response = _revoke(client, owner, [event_ids[0], refused], [first])
+        assert response.status_code == 403, response.text
+
+    # The refused requests changed nothing
+    assert _grants(client, owner, event_ids[0]) == {owner_id: "owner"}
+
+def test_unknown_user_and_self_revoke(client, calendar):
+    owner_id, owner, event_ids, (first, _, _) = calendar
+    response = _share(client, owner, event_ids, [first, first + 100000], "viewer")
+    assert response.status_code == 404, response.text
+    assert _grants(client, owner, event_ids[0]) == {owner_id: "owner"}
+
+    assert _revoke(client, owner, event_ids, [owner_id]).status_code == 400
@@ -0,0 +1,37 @@
+"""If-Match updates only apply to the version the client read."""
+from app.database import SessionLocal
+from app.services.event_service import StaleVersionError, allocate_version, update_event
+from app.schemas import EventUpdate
+from tests.conftest import event_body, register_user
+import pytest
+
+def test_if_match(client, auth_headers):
+    body = event_body("2030-04-01T09:00:00", "2030-04-01T10:00:00")
+    response = client.post("/api/events/", json=body, headers=auth_headers)
+    event_id = response.json()["id"]
+    etag = client.get(f"/api/events/{event_id}", headers=auth_headers).headers["ETag"]
+
+    response = client.put(f"/api/events/{event_id}", json={"title": "First"}, headers={**auth_headers, "If-Match": etag})
+    assert response.status_code == 200, response.text
+    response = client.put(f"/api/events/{event_id}", json={"title": "Second"}, headers={**auth_headers, "If-Match": etag})
+    assert response.status_code == 412, response.text
+    assert client.get(f"/api/events/{event_id}", headers=auth_headers).json()["title"] == "First"
+
+def test_version_moved_after_load_is_stale(client):
+    user_id, auth_headers = register_user(client)
+    body = event_body("2030-04-02T09:00:00", "2030-04-02T10:00:00")
+    event_id = client.post("/api/events/", json=body, headers=auth_headers).json()["id"]
+
+    db = SessionLocal()
+    try:
+        version = allocate_version(db, event_id)
+        db.commit()
+        # Another writer got in between the read and this write
+        assert allocate_version(db, event_id, [version - 1]) is None
+        db.rollback()
+        with pytest.raises(StaleVersionError):
+            update_event(db, event_id, EventUpdate(title="Late"), user_id=user_id, expected_versions=[version - 1])
+        assert allocate_version(db, event_id, [version]) == version + 1
+        db.rollback()
+    finally:
+        db.close()
@@ -0,0 +1,94 @@
+"""IntervalIndex agrees with checking every interval, and the registry
+never keeps an index that misses a concurrent write."""
+from datetime import datetime, timedelta
+import random
+from app.models import Event
+from app.services.conflict_index import ConflictIndexRegistry, IntervalIndex
+from app.services.recurrence import occurrences
+
+BASE = datetime(2030, 1, 1)
+
+def _random_pattern(rng):
+    pattern = {"frequency": rng.choice(["daily", "weekly", "monthly"]), "interval": rng.randint(1, 3)}
+    if pattern["frequency"] == "weekly" and rng.random() < 0.5:
+        pattern["weekdays"] = rng.sample(range(7), rng.randint(1, 3))
+    bound = rng.random()
+    if bound < 0.4:
+        pattern["count"] = rng.randint(1, 20)
+    elif bound < 0.7:
+        pattern["until"] = (BASE + timedelta(days=rng.randint(0, 400))).isoformat()
+    return pattern
+
+def _random_interval(rng):
+    start = BASE + timedelta(hours=rng.randint(0, 24 * 365))
+    return start, start + timedelta(minutes=rng.randint(15, 600))
+
+def _naive_overlaps(intervals, start, end, exclude):
+    return any(
+        any(occurrences(interval_start, interval_end, pattern, start, end))
+        for event_id, (interval_start, interval_end, pattern) in intervals.items()
+        if event_id not in exclude
+    )
+
+def test_index_matches_checking_every_interval():
+    rng = random.Random(7)
+    index = IntervalIndex()
+    intervals = {}
+    for step in range(3000):
+        action = rng.random()
+        if action < 0.45 or not intervals:
+            event_id = rng.randint(1, 300)
+            start, end = _random_interval(rng)
+            pattern = _random_pattern(rng) if rng.random() < 0.2 else None
+            index.add(event_id, start, end, pattern)
+            intervals[event_id] = (start, end, pattern)
+        elif action < 0.6:
+            event_id = rng.choice(list(intervals))
+            index.remove(event_id)
+            del intervals[event_id]
+        else:
+            start, end = _random_interval(rng)
+            exclude = set(rng.sample(list(intervals), min(len(intervals), rng.randint(0, 3))))
+            assert index.overlaps(start, end, exclude) == _naive_overlaps(intervals, start, end, exclude), step
+        if step % 500 == 499:
+            # An index built in one go answers the same
+            rebuilt = IntervalIndex((event_id, *interval) for event_id, interval in intervals.items())
+            for _ in range(50):
+                start, end = _random_interval(rng)
+                assert rebuilt.overlaps(start, end) == _naive_overlaps(intervals, start, end, ()), step
+    assert len(index) == len(intervals)
+
+class _Rows:
+    """Stands in for the registry's query; `during_read` runs while the
+    rows are being read, as a concurrent request would."""
+
+    def __init__(self, rows, during_read):
+        self.rows = rows
+        self.during_read = during_read
+
+    def query(self, *columns):
+        return self
+
+    def join(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def all(self):
+        self.during_read()
+        return self.rows
+
+def test_registry_does_not_keep_an_index_built_during_a_write():
+    registry = ConflictIndexRegistry()
+    created = Event(id=2, start_time=BASE, end_time=BASE + timedelta(hours=1), is_recurring=False)
+    db = _Rows([(1, BASE - timedelta(days=1), BASE - timedelta(days=1) + timedelta(hours=1), False, None)],
+               lambda: registry.event_added(7, created))
+
+    assert not registry.has_conflict(db, 7, BASE, BASE + timedelta(hours=1))
+
+    # The next check reloads instead of reusing the index that missed event 2
+    db = _Rows([(1, BASE - timedelta(days=1), BASE - timedelta(days=1) + timedelta(hours=1), False, None),
+                (2, BASE, BASE + timedelta(hours=1), False, None)], lambda: None)
+    assert registry.has_conflict(db, 7, BASE, BASE + timedelta(hours=1))
+    assert 2 in registry.get(db, 7)
@@ -0,0 +1,28 @@
+"""Exports stream from their own connection pool."""
+import asyncio
+from app import database
+from app.services.export_service import calendar_export_query
+from tests.conftest import event_body
+
+def test_export_rejected_when_export_pool_is_full(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(database, "DB_EXPORT_POOL_SIZE", 0)
+    response = client.get("/api/events/export", headers=auth_headers)
+    assert response.status_code == 503, response.text
+    assert response.headers["Retry-After"]
+
+def test_open_export_holds_no_read_connection(client, auth_headers):
+    body = event_body("2030-08-01T09:00:00", "2030-08-01T10:00:00")
+    user_id = client.post("/api/events/", json=body, headers=auth_headers).json()["created_by"]
+
+    async def first_partition():
+        stream = database.stream_partitions(calendar_export_query(user_id, None, None, None), 1)
+        try:
+            partition = await stream.__anext__()
+            pools = (database.async_export_engine or database.export_engine).pool, database.read_engine.pool
+            return len(partition), [pool.checkedout() for pool in pools]
+        finally:
+            await stream.aclose()
+
+    rows, checked_out = asyncio.run(first_partition())
+    assert rows == 1
+    assert checked_out == [1, 0]
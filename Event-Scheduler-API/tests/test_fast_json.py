@@ -0,0 +1,55 @@
+"""The fast JSON path must produce the same bytes as FastAPI's own encoding."""
+import pytest
+from app import fast_json
+from tests.conftest import event_body, register
+
+PATTERN = {
+    "frequency": "weekly",
+    "weekdays": [0, 2],
+    "count": 5,
+    "exceptions": ["2030-07-03T09:00:00.250000"],
+}
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(fast_json, "orjson", None)
+    elif fast_json.orjson is None:
+        pytest.skip("orjson is not installed")
+
+def _bytes(client, url, headers, params, fast, monkeypatch):
+    monkeypatch.setattr(fast_json, "FAST_JSON_RESPONSES", fast)
+    response = client.get(url, params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.content
+
+def test_list_responses_match_default_encoding(client, monkeypatch, encoder):
+    owner, viewer = register(client), register(client)
+    viewer_id = client.post(
+        "/api/events/", json=event_body("2031-01-01T09:00:00", "2031-01-01T10:00:00"), headers=viewer
+    ).json()["created_by"]
+
+    single = event_body("2030-07-01T12:00:00.123456", "2030-07-01T13:30:00.654321", title="Réunion – 会議 🎉")
+    single["description"] = "Ünïcödé \"quoted\" \\ back\nslash"
+    event_id = client.post("/api/events/", json=single, headers=owner).json()["id"]
+    series = event_body("2030-07-01T09:00:00.250000", "2030-07-01T09:45:00", location="Café", is_recurring=True)
+    series["recurrence_pattern"] = PATTERN
+    assert client.post("/api/events/", json=series, headers=owner).status_code == 200
+    client.put(f"/api/events/{event_id}", json={"location": "Zürich", "recurrence_pattern": None}, headers=owner)
+    share = client.post(f"/api/events/{event_id}/share", json={"user_id": viewer_id, "role": "viewer"}, headers=owner)
+    assert share.status_code == 200, share.text
+
+    requests = [
+        ("/api/events/", {}),
+        ("/api/events/", {"start_date": "2030-07-01T00:00:00", "end_date": "2030-08-01T00:00:00"}),
+        (f"/api/events/{event_id}/history", {}),
+        (f"/api/events/{event_id}/permissions", {}),
+    ]
+    bodies = []
+    for url, params in requests:
+        default = _bytes(client, url, owner, params, False, monkeypatch)
+        assert _bytes(client, url, owner, params, True, monkeypatch) == default, url
+        bodies.append(default)
+    # Five occurrences less the excepted one, not just the first instance
+    assert bodies[1].count("Café".encode()) == 4
+    assert "会議".encode() in bodies[0] and b"\\u" not in bodies[0]
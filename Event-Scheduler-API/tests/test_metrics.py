@@ -0,0 +1,13 @@
+"""The /metrics endpoint exposes the password hasher's queue."""
+
+def test_password_hasher_gauges(client, auth_headers):
+    lines = client.get("/metrics").text.splitlines()
+    assert "# TYPE password_hash_queued gauge" in lines
+    values = dict(line.split() for line in lines if line.startswith("password_hash_"))
+    assert set(values) == {
+        "password_hash_in_flight",
+        "password_hash_queued",
+        "password_hash_queue_wait_avg_seconds",
+        "password_hash_queue_wait_max_seconds",
+    }
+    assert float(values["password_hash_queued"]) == 0
@@ -0,0 +1,68 @@
+"""Alembic migrations bring an old database up to the current models."""
+from pathlib import Path
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import IntegrityError
+from app.database import Base
+
+MIGRATIONS = Path(__file__).resolve().parent.parent / "migrations"
+
+@pytest.fixture
+def database(tmp_path):
+    url = f"sqlite:///{tmp_path}/old.db"
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS))
+    config.set_main_option("sqlalchemy.url", url)
+    engine = create_engine(url)
+    yield config, engine
+    engine.dispose()
+
+def test_upgrade_backfills_versions_and_removes_duplicates(database):
+    config, engine = database
+    command.upgrade(config, "0001")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO users (id, username) VALUES (1, 'owner'), (2, 'guest')")
+        connection.exec_driver_sql("INSERT INTO events (id, title, created_by) VALUES (1, 'edited', 1), (2, 'new', 1), (3, 'no history', 1)")
+        connection.exec_driver_sql(
+            "INSERT INTO event_permissions (event_id, user_id, role) VALUES "
+            "(1, 1, 'OWNER'), (1, 2, 'VIEWER'), (1, 2, 'EDITOR'), (1, 2, 'VIEWER'), (2, 1, 'OWNER')"
+        )
+        # Event 1 got two version-2 rows from concurrent updates; event 5 was deleted
+        connection.exec_driver_sql(
+            "INSERT INTO event_changes (id, event_id, version, change_type) VALUES "
+            "(1, 1, 1, 'create'), (2, 1, 2, 'update'), (3, 1, 2, 'update'), (4, 2, 1, 'create'), "
+            "(5, 5, 1, 'create'), (6, 5, 2, 'delete')"
+        )
+
+    command.upgrade(config, "head")
+
+    with engine.begin() as connection:
+        versions = dict(connection.exec_driver_sql("SELECT id, version FROM events").all())
+        assert versions == {1: 3, 2: 1, 3: 0}
+        history = connection.exec_driver_sql("SELECT version FROM event_changes WHERE event_id = 1 ORDER BY id").scalars().all()
+        assert history == [1, 2, 3]
+        grants = connection.exec_driver_sql("SELECT event_id, user_id, role FROM event_permissions ORDER BY event_id, user_id").all()
+        assert grants == [(1, 1, "OWNER"), (1, 2, "EDITOR"), (2, 1, "OWNER")]
+        assert connection.exec_driver_sql("SELECT calendar_version FROM users").scalars().all() == [0, 0]
+        # Ids of deleted events with history are not handed out again
+        connection.exec_driver_sql("INSERT INTO events (title) VALUES ('next')")
+        assert connection.exec_driver_sql("SELECT MAX(id) FROM events").scalar() == 6
+
+    with pytest.raises(IntegrityError), engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO event_permissions (event_id, user_id, role) VALUES (2, 1, 'VIEWER')")
+
+    with pytest.raises(IntegrityError), engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO event_changes (event_id, version) VALUES (2, 1)")
+
+    assert "snapshot" in {column["name"] for column in inspect(engine).get_columns("event_changes")}
+
+def test_upgrade_of_current_schema_changes_nothing(database):
+    config, engine = database
+    Base.metadata.create_all(bind=engine)
+    before = {table: inspect(engine).get_indexes(table) for table in Base.metadata.tables}
+
+    command.upgrade(config, "head")
+
+    assert {table: inspect(engine).get_indexes(table) for table in Base.metadata.tables} == before
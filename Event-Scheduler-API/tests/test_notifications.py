@@ -0,0 +1,155 @@
+"""Change notifications: broker fan-out and coalescing, publishing only
+after commit, and the SSE and WebSocket endpoints."""
+import asyncio
+import json
+import pytest
+from sqlalchemy import text
+from starlette.websockets import WebSocketDisconnect
+from app.database import SessionLocal
+from app.routers.notifications import _sse_stream
+from app.services import notifications
+from app.services.notifications import InMemoryBroker, notify, user_channel
+from tests.conftest import event_body, register_user
+
+def _changed(event_id: int, **fields) -> dict:
+    return {"type": "event.changed", "event_id": event_id, **fields}
+
+def test_broker_delivers_to_subscribed_channels_only():
+    async def scenario():
+        broker = InMemoryBroker()
+        first = broker.subscribe(user_channel(1))
+        second = broker.subscribe(user_channel(2))
+        broker.publish([user_channel(1), user_channel(3)], _changed(10))
+        assert await first.next_batch(0) == [_changed(10)]
+        assert second.delivered == 0 and not second._pending
+
+        broker.unsubscribe(first)
+        broker.unsubscribe(second)
+        assert broker.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+def test_messages_for_the_same_event_are_coalesced():
+    async def scenario():
+        broker = InMemoryBroker()
+        subscription = broker.subscribe(user_channel(1))
+        for version in (1, 2, 3):
+            broker.publish([user_channel(1)], _changed(10, version=version))
+        broker.publish([user_channel(1)], _changed(11, version=1))
+
+        assert await subscription.next_batch(0) == [_changed(10, version=3, coalesced=3), _changed(11, version=1)]
+        assert subscription.coalesced == 2
+
+    asyncio.run(scenario())
+
+def test_backlog_over_the_limit_becomes_one_overflow_message():
+    async def scenario():
+        broker = InMemoryBroker(max_pending=2)
+        subscription = broker.subscribe(user_channel(1))
+        for event_id in (10, 11, 12):
+            broker.publish([user_channel(1)], _changed(event_id))
+
+        batch = await subscription.next_batch(0)
+        assert batch == [notifications.OVERFLOW_MESSAGE, _changed(12)]
+        assert subscription.overflows == 1
+
+    asyncio.run(scenario())
+
+class RecordingBroker(InMemoryBroker):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, channels, message):
+        self.published.append((sorted(channels), message))
+        super().publish(channels, message)
+
+@pytest.fixture
+def broker():
+    previous = notifications.get_broker()
+    recording = RecordingBroker()
+    notifications.set_broker(recording)
+    yield recording
+    notifications.set_broker(previous)
+
+def test_messages_are_published_on_commit_and_dropped_on_rollback(broker):
+    with SessionLocal() as db:
+        notify(db, [1], _changed(10))
+        db.execute(text("SELECT 1"))
+        assert broker.published == []
+        db.rollback()
+
+        notify(db, [2], _changed(11))
+        db.execute(text("SELECT 1"))
+        db.commit()
+
+    assert broker.published == [([user_channel(2)], _changed(11))]
+
+def test_failed_write_publishes_nothing(client, broker):
+    user_id, headers = register_user(client)
+    # Atomic batch: the second item is invalid, so nothing is written
+    body = {"events": [
+        event_body("2039-01-03T09:00:00", "2039-01-03T10:00:00"),
+        event_body("2039-01-04T10:00:00", "2039-01-04T09:00:00"),
+    ]}
+    assert client.post("/api/events/batch", json=body, headers=headers).status_code == 422
+    assert broker.published == []
+
+    response = client.post("/api/events/", json=body["events"][0], headers=headers)
+    assert response.status_code == 200, response.text
+    [(channels, message)] = broker.published
+    assert channels == [user_channel(user_id)]
+    assert message["event_id"] == response.json()["id"] and message["change_type"] == "create"
+
+def test_websocket_receives_changes_to_shared_events(client):
+    owner_id, owner = register_user(client)
+    guest_id, guest = register_user(client)
+    event_id = client.post("/api/events/", json=event_body("2039-02-01T09:00:00", "2039-02-01T10:00:00"), headers=owner).json()["id"]
+    response = client.post(f"/api/events/{event_id}/share", json={"user_id": guest_id, "role": "viewer"}, headers=owner)
+    assert response.status_code == 200, response.text
+    token = guest["Authorization"].split()[1]
+
+    with client.websocket_connect(f"/api/notifications/ws?token={token}") as socket:
+        response = client.put(f"/api/events/{event_id}", json={"title": "Renamed"}, headers=owner)
+        assert response.status_code == 200, response.text
+
+        assert socket.receive_json() == {
+            "type": "event.changed",
+            "event_id": event_id,
+            "version": 2,
+            "change_type": "update",
+            "changed_by": owner_id,
+        }
+
+def test_websocket_rejects_a_bad_token(client):
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/api/notifications/ws?token=nope") as socket:
+            socket.receive_json()
+    assert closed.value.code == 1008
+
+class _Request:
+    """Connected for `polls` checks, then disconnected."""
+
+    def __init__(self, polls: int):
+        self.polls = polls
+
+    async def is_disconnected(self) -> bool:
+        self.polls -= 1
+        return self.polls < 0
+
+def test_sse_stream_formats_batches_and_unsubscribes():
+    async def scenario():
+        broker = InMemoryBroker()
+        subscription = broker.subscribe(user_channel(1))
+        stream = _sse_stream(_Request(1), broker, subscription)
+        assert await stream.__anext__() == ": connected\n\n"
+
+        broker.publish([user_channel(1)], _changed(10, version=2))
+        chunk = await stream.__anext__()
+        assert chunk == f"event: event.changed\ndata: {json.dumps(_changed(10, version=2))}\n\n"
+
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+        assert broker.subscriber_count() == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+"""Keyset pagination of GET /api/events: walking the pages with the
+X-Next-Cursor header returns exactly the full listing, in order."""
+from base64 import urlsafe_b64encode
+from datetime import datetime
+import pytest
+from app.pagination import encode_event_cursor, encode_history_cursor
+from tests.conftest import event_body, register
+
+DAILY = {"is_recurring": True, "recurrence_pattern": {"frequency": "daily", "count": 3}}
+WINDOW = {"start_date": "2037-04-01T00:00:00", "end_date": "2037-04-10T00:00:00"}
+
+@pytest.fixture(scope="module")
+def calendar(client):
+    headers = register(client)
+    # Conflict checks off, so several series can share every occurrence
+    body = {"check_conflicts": False, "events": [
+        event_body("2037-04-01T09:00:00", "2037-04-01T10:00:00", **DAILY),
+        event_body("2037-04-01T09:00:00", "2037-04-01T10:00:00", **DAILY),
+        event_body("2037-04-02T09:00:00", "2037-04-02T10:00:00"),
+        event_body("2037-04-01T12:00:00", "2037-04-01T13:00:00"),
+        event_body("2037-04-02T09:00:00", "2037-04-02T09:30:00", **DAILY),
+        event_body("2037-04-08T09:00:00", "2037-04-08T10:00:00"),
+    ]}
+    response = client.post("/api/events/batch", json=body, headers=headers)
+    assert response.status_code == 200, response.text
+    return headers
+
+def _keys(events):
+    return [(event["start_time"], event["id"]) for event in events]
+
+def _walk(client, headers, limit, **params):
+    keys, cursor = [], None
+    for _ in range(100):
+        response = client.get(
+            "/api/events/", params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})}, headers=headers
+        )
+        assert response.status_code == 200, response.text
+        keys += _keys(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return keys
+    raise AssertionError("pagination did not end")
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4])
+def test_pages_over_series_and_single_events_in_a_window(client, calendar, limit):
+    full = _keys(client.get("/api/events/", params={**WINDOW, "limit": 100}, headers=calendar).json())
+    # 3 + 3 + 3 occurrences and 3 single events
+    assert len(full) == 12
+    assert full == sorted(full)
+    # Three series and a single event start at 09:00 on the 2nd; page breaks fall between them
+    assert sum(start == "2037-04-02T09:00:00" for start, _ in full) == 4
+    assert _walk(client, calendar, limit, **WINDOW) == full
+
+@pytest.mark.parametrize("limit", [1, 4])
+def test_pages_without_a_window_list_series_once(client, calendar, limit):
+    full = _keys(client.get("/api/events/", params={"limit": 100}, headers=calendar).json())
+    assert len(full) == 6
+    assert _walk(client, calendar, limit) == full
+
+def test_cursor_on_a_shared_occurrence_resumes_after_that_series(client, calendar):
+    full = _keys(client.get("/api/events/", params={**WINDOW, "limit": 100}, headers=calendar).json())
+    shared = [key for key in full if key[0] == "2037-04-02T09:00:00"]
+    start, event_id = shared[1]
+    cursor = encode_event_cursor(datetime.fromisoformat(start), event_id)
+
+    response = client.get("/api/events/", params={**WINDOW, "limit": 100, "cursor": cursor}, headers=calendar)
+    assert response.status_code == 200, response.text
+    assert _keys(response.json()) == full[full.index((start, event_id)) + 1:]
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    urlsafe_b64encode(b"not json").decode(),
+    urlsafe_b64encode(b"[1, 2]").decode(),
+    urlsafe_b64encode(b'{"kind": "events", "start": "yesterday", "id": 1}').decode(),
+    urlsafe_b64encode(b'{"kind": "events", "start": "2037-04-01T09:00:00"}').decode(),
+    encode_history_cursor(3),
+])
+def test_malformed_cursor_is_a_bad_request(client, calendar, cursor):
+    response = client.get("/api/events/", params={**WINDOW, "cursor": cursor}, headers=calendar)
+    assert response.status_code == 400, response.text
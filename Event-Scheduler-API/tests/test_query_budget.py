@@ -0,0 +1,72 @@
+"""Batch budgets grow with the batch, and a budget never fails a request
+after it has committed."""
+from datetime import datetime, timedelta
+import logging
+import pytest
+from sqlalchemy import select, update
+from app.database import SessionLocal
+from app.models import User
+from app.query_budget import QueryBudget, QueryBudgetExceeded
+from tests.conftest import event_body
+
+def _events(count: int, start: datetime) -> list:
+    return [
+        event_body((start + timedelta(hours=2 * n)).isoformat(), (start + timedelta(hours=2 * n + 1)).isoformat())
+        for n in range(count)
+    ]
+
+@pytest.mark.parametrize("count, chunk_size", [(501, 500), (30, 7)])
+def test_batch_budgets_scale_with_chunks(client, auth_headers, count, chunk_size):
+    start = datetime(2031, 1, 1) if chunk_size == 500 else datetime(2032, 1, 1)
+    response = client.post(
+        "/api/events/batch",
+        json={"events": _events(count, start), "chunk_size": chunk_size},
+        headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    event_ids = [event["id"] for event in response.json()]
+    assert len(event_ids) == count
+
+    response = client.patch(
+        "/api/events/batch",
+        json={"events": [{"id": event_id, "title": "Renamed"} for event_id in event_ids]},
+        headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    assert len(response.json()["updated"]) == count
+
+    response = client.request("DELETE", "/api/events/batch", json={"event_ids": event_ids}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert len(response.json()["deleted"]) == count
+
+def _calendar_version(db) -> int:
+    return db.scalar(select(User.calendar_version).where(User.id == 1))
+
+def _bump_calendar_version(db):
+    db.execute(update(User).where(User.id == 1).values(calendar_version=User.calendar_version + 1))
+
+def test_commit_over_budget_is_refused(client, auth_headers):
+    with SessionLocal() as db:
+        before = _calendar_version(db)
+
+    with pytest.raises(QueryBudgetExceeded):
+        with QueryBudget(0, "refused", mode="raise"), SessionLocal() as db:
+            _bump_calendar_version(db)
+            db.commit()
+
+    with SessionLocal() as db:
+        assert _calendar_version(db) == before
+
+def test_overrun_after_commit_only_warns(client, auth_headers, caplog):
+    with SessionLocal() as db:
+        before = _calendar_version(db)
+
+    with caplog.at_level(logging.WARNING, logger="app.query_budget"):
+        with QueryBudget(1, "committed", mode="raise"), SessionLocal() as db:
+            _bump_calendar_version(db)
+            db.commit()
+            _calendar_version(db)
+
+    assert "committed ran 2 queries" in caplog.text
+    with SessionLocal() as db:
+        assert _calendar_version(db) == before + 1
@@ -0,0 +1,20 @@
+"""Rate limit settings that could never admit a request are refused."""
+import pytest
+from app.ratelimit import RateLimitMiddleware, validate_rate_limit
+
+@pytest.mark.parametrize("rate, burst, costs", [
+    (0, 60, {}),
+    (-1, 60, {}),
+    (20, 0, {}),
+    (20, 60, {"POST /api/events/batch": 61}),
+    (20, 60, {"GET /api/events": -1}),
+])
+def test_invalid_settings(rate, burst, costs):
+    with pytest.raises(ValueError):
+        validate_rate_limit(rate, burst, costs)
+    with pytest.raises(ValueError):
+        RateLimitMiddleware(None, rate=rate, burst=burst, costs=costs, rate_limit=True)
+
+def test_valid_and_disabled_settings():
+    validate_rate_limit(20, 60, {"POST /api/events/batch": 60, "GET /api/events": 0})
+    RateLimitMiddleware(None, rate=0, burst=0, costs={}, rate_limit=False)
@@ -0,0 +1,93 @@
+"""Recurrence expansion: frequencies, bounds, window clipping and the
+expansion cache."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from app.services.recurrence import RECURRENCE_CACHE_OCCURRENCES, event_occurrences, occurrences
+from tests.conftest import event_body
+
+HOUR = timedelta(hours=1)
+FAR = datetime(2100, 1, 1)
+
+def _starts(start, pattern, window_start=datetime(2000, 1, 1), window_end=FAR):
+    return [occurrence_start for occurrence_start, _ in occurrences(start, start + HOUR, pattern, window_start, window_end)]
+
+def test_daily_every_other_day():
+    start = datetime(2030, 1, 1, 9)
+    assert _starts(start, {"frequency": "daily", "interval": 2, "count": 4}) == [
+        datetime(2030, 1, 1, 9), datetime(2030, 1, 3, 9), datetime(2030, 1, 5, 9), datetime(2030, 1, 7, 9)
+    ]
+
+def test_weekly_on_weekdays_starts_at_the_first_instance():
+    # A Wednesday; the Monday of that week is before the series starts
+    start = datetime(2030, 1, 2, 9)
+    assert _starts(start, {"frequency": "weekly", "weekdays": [0, 2], "count": 4}) == [
+        datetime(2030, 1, 2, 9), datetime(2030, 1, 7, 9), datetime(2030, 1, 9, 9), datetime(2030, 1, 14, 9)
+    ]
+
+def test_monthly_keeps_the_day_of_month_where_it_exists():
+    start = datetime(2030, 1, 31, 9)
+    assert _starts(start, {"frequency": "monthly", "count": 3}) == [
+        datetime(2030, 1, 31, 9), datetime(2030, 2, 28, 9), datetime(2030, 3, 31, 9)
+    ]
+
+def test_until_and_exceptions():
+    start = datetime(2030, 1, 1, 9)
+    pattern = {"frequency": "daily", "until": "2030-01-05T09:00:00", "exceptions": ["2030-01-03T09:00:00"]}
+    assert [day.day for day in _starts(start, pattern)] == [1, 2, 4, 5]
+
+def test_window_clips_to_overlapping_occurrences():
+    start = datetime(2030, 1, 1, 9)
+    pattern = {"frequency": "daily"}
+    # The 3rd runs until 10:00 and the 5th starts at 09:00, so both overlap
+    window = (datetime(2030, 1, 3, 9, 30), datetime(2030, 1, 5, 9, 30))
+    assert [day.day for day in _starts(start, pattern, *window)] == [3, 4, 5]
+    # Half-open: touching either end is not an overlap
+    assert _starts(start, pattern, datetime(2030, 1, 3, 10), datetime(2030, 1, 4, 9)) == []
+    # Nothing before the first instance, nothing after the count runs out
+    assert _starts(start, pattern, datetime(2029, 12, 1), datetime(2030, 1, 1, 9)) == []
+    assert _starts(start, {"frequency": "daily", "count": 3}, datetime(2030, 2, 1), FAR) == []
+
+def _event(**fields):
+    return SimpleNamespace(**{
+        "id": 1,
+        "start_time": datetime(2030, 1, 1, 9),
+        "end_time": datetime(2030, 1, 1, 10),
+        "is_recurring": True,
+        "recurrence_pattern": {"frequency": "daily"},
+        "updated_at": datetime(2030, 1, 1),
+        **fields
+    })
+
+def test_cache_is_keyed_by_updated_at():
+    window = (datetime(2030, 1, 1), datetime(2030, 1, 15))
+    event = _event(id=-101)
+    assert len(list(event_occurrences(event, *window))) == 14
+
+    # The same row version is served from the cache...
+    event.recurrence_pattern = {"frequency": "weekly"}
+    assert len(list(event_occurrences(event, *window))) == 14
+    # ...and an edit, which moves updated_at, is expanded afresh
+    event.updated_at = datetime(2030, 1, 2)
+    assert len(list(event_occurrences(event, *window))) == 2
+
+def test_cache_serves_occurrences_past_its_prefix():
+    count = RECURRENCE_CACHE_OCCURRENCES + 50
+    event = _event(id=-102)
+    window = (datetime(2030, 1, 1), datetime(2030, 1, 1) + timedelta(days=count))
+    expected = list(occurrences(event.start_time, event.end_time, event.recurrence_pattern, *window))
+    assert len(expected) == count
+    assert list(event_occurrences(event, *window)) == expected
+    assert list(event_occurrences(event, *window)) == expected
+
+def test_listing_reflects_an_edited_pattern(client, auth_headers):
+    body = event_body("2036-03-02T09:00:00", "2036-03-02T10:00:00", is_recurring=True, recurrence_pattern={"frequency": "daily"})
+    event_id = client.post("/api/events/", json=body, headers=auth_headers).json()["id"]
+    window = {"start_date": "2036-03-01T00:00:00", "end_date": "2036-03-15T00:00:00"}
+
+    response = client.get("/api/events/", params=window, headers=auth_headers)
+    assert len(response.json()) == 13
+
+    response = client.put(f"/api/events/{event_id}", json={"recurrence_pattern": {"frequency": "weekly"}}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    response = client.get("/api/events/", params=window, headers=auth_headers)
+    assert [event["start_time"] for event in response.json()] == ["2036-03-02T09:00:00", "2036-03-09T09:00:00"]
@@ -0,0 +1,53 @@
+"""A new recurring event is checked for conflicts on every occurrence, not
+just its first."""
+from tests.conftest import event_body
+
+WEEKLY = {"is_recurring": True, "recurrence_pattern": {"frequency": "weekly"}}
+
+def test_weekly_series_conflicting_on_second_occurrence_is_rejected(client, auth_headers):
+    # A Tuesday one week after the series starts
+    one_off = event_body("2033-01-11T09:00:00", "2033-01-11T10:00:00")
+    assert client.post("/api/events/", json=one_off, headers=auth_headers).status_code == 200
+
+    series = event_body("2033-01-04T09:30:00", "2033-01-04T10:30:00", **WEEKLY)
+    response = client.post("/api/events/", json=series, headers=auth_headers)
+    assert response.status_code == 409, response.text
+
+    # The same series an hour later fits around the one-off event
+    series = event_body("2033-01-04T10:00:00", "2033-01-04T11:00:00", **WEEKLY)
+    response = client.post("/api/events/", json=series, headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+def test_batch_checks_every_occurrence_of_a_series(client, auth_headers):
+    one_off = event_body("2034-01-10T09:00:00", "2034-01-10T10:00:00")
+    assert client.post("/api/events/", json=one_off, headers=auth_headers).status_code == 200
+
+    body = {
+        "mode": "partial",
+        "events": [
+            # Overlaps the existing event on its second occurrence
+            event_body("2034-01-03T09:30:00", "2034-01-03T10:30:00", **WEEKLY),
+            # A series accepted earlier in the batch...
+            event_body("2034-02-06T14:00:00", "2034-02-06T15:00:00", **WEEKLY),
+            # ...whose third occurrence this item overlaps
+            event_body("2034-02-20T14:30:00", "2034-02-20T15:30:00"),
+            # Starts before the accepted series, meeting it on its first occurrence
+            event_body("2034-01-30T14:00:00", "2034-01-30T15:00:00", **WEEKLY),
+        ]
+    }
+    response = client.post("/api/events/batch", json=body, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [event["start_time"] for event in response.json()["created"]] == ["2034-02-06T14:00:00"]
+    assert [(error["index"], error["code"]) for error in response.json()["errors"]] == [
+        (0, "conflict"), (2, "conflict"), (3, "conflict")
+    ]
+
+def test_batch_update_making_an_event_recur_checks_its_occurrences(client, auth_headers):
+    first = event_body("2035-01-02T09:00:00", "2035-01-02T10:00:00")
+    second = event_body("2035-01-09T09:00:00", "2035-01-09T10:00:00")
+    first_id = client.post("/api/events/", json=first, headers=auth_headers).json()["id"]
+    assert client.post("/api/events/", json=second, headers=auth_headers).status_code == 200
+
+    body = {"events": [{"id": first_id, **WEEKLY}]}
+    response = client.patch("/api/events/batch", json=body, headers=auth_headers)
+    assert response.status_code == 409, response.text
@@ -0,0 +1,44 @@
+"""Aware datetimes in requests are stored and compared as naive UTC."""
+from datetime import datetime, timezone
+from app.schemas import EventCreate
+from app.services.conflict_index import IntervalIndex
+from tests.conftest import event_body
+
+def test_schema_converts_aware_times_to_naive_utc():
+    event = EventCreate(**event_body("2030-01-01T10:00:00+02:00", "2030-01-01T11:00:00Z"))
+    assert event.start_time == datetime(2030, 1, 1, 8, 0)
+    assert event.end_time == datetime(2030, 1, 1, 11, 0)
+    assert event.start_time.tzinfo is None
+
+def test_index_accepts_aware_bounds():
+    index = IntervalIndex([(1, datetime(2030, 1, 1, 9), datetime(2030, 1, 1, 10))])
+    index.add(2, datetime(2030, 1, 2, 9), datetime(2030, 1, 2, 10), {"frequency": "daily"})
+    utc = timezone.utc
+    assert index.overlaps(datetime(2030, 1, 1, 9, 30, tzinfo=utc), datetime(2030, 1, 1, 11, tzinfo=utc))
+    assert index.overlaps(datetime(2030, 1, 5, 9, 30, tzinfo=utc), datetime(2030, 1, 5, 11, tzinfo=utc))
+    assert not index.overlaps(datetime(2030, 1, 1, 10, tzinfo=utc), datetime(2030, 1, 1, 11, tzinfo=utc))
+
+def test_aware_event_conflicts_with_naive_one(client, auth_headers):
+    response = client.post("/api/events/", json=event_body("2030-01-01T09:00:00", "2030-01-01T10:00:00"), headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    response = client.post(
+        "/api/events/", json=event_body("2030-01-01T11:30:00+02:00", "2030-01-01T12:30:00+02:00"), headers=auth_headers
+    )
+    assert response.status_code == 409, response.text
+
+    response = client.post("/api/events/", json=event_body("2030-01-01T10:00:00Z", "2030-01-01T11:00:00Z"), headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["start_time"] == "2030-01-01T10:00:00"
+
+def test_list_window_with_aware_bounds(client, auth_headers):
+    body = event_body("2030-02-01T09:00:00", "2030-02-01T10:00:00", is_recurring=True, recurrence_pattern={"frequency": "daily"})
+    assert client.post("/api/events/", json=body, headers=auth_headers).status_code == 200
+
+    response = client.get(
+        "/api/events/",
+        params={"start_date": "2030-02-02T00:00:00Z", "end_date": "2030-02-04T00:00:00+00:00"},
+        headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    assert [event["start_time"] for event in response.json()] == ["2030-02-02T09:00:00", "2030-02-03T09:00:00"]